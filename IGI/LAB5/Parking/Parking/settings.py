@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,20 +43,28 @@ INSTALLED_APPS = [
 ]
 
 SESSION_COOKIE_AGE = 1209600  # 2 недели в секундах (по умолчанию)
-SESSION_SAVE_EVERY_REQUEST = True
+# Срок сессии продлевает parking.middleware.SessionMiddleware без записи в
+# базу на каждый запрос, см. parking/sessions.py
+SESSION_SAVE_EVERY_REQUEST = False
 
 MIDDLEWARE = [
+    'parking.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',  # Убедитесь, что middleware для сессий присутствует
+    'parking.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'parking.middleware.RoleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 # Дополнительные настройки для сессий
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+# Сессии в кэше sessions с копией в базе, которая обновляется не чаще раза в
+# SESSION_COOKIE_AGE / 2; простой по-прежнему ограничен SESSION_COOKIE_AGE.
+# Истёкшие сессии удаляются пачками командой manage.py clearsessions (cron)
+SESSION_ENGINE = 'parking.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
 SESSION_COOKIE_SECURE = False  # Для разработки, в продакшене установите True при использовании HTTPS
 SESSION_COOKIE_HTTPONLY = True
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True  # Сессия истекает при закрытии браузера
@@ -73,6 +82,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'parking.context_processors.roles',
+                'parking.context_processors.live_events',
             ],
         },
     },
@@ -84,11 +95,80 @@ WSGI_APPLICATION = 'Parking.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Профиль SQLite для нескольких воркеров (при каждом подключении, см. OPTIONS):
+# - WAL: читатели не ждут писателя и наоборот, запись — дописывание в журнал;
+# - synchronous=NORMAL: в режиме WAL без fsync на каждую транзакцию, база
+#   целостна и при сбое, теряются только последние транзакции при сбое ОС;
+# - mmap_size и cache_size (отрицательный — в КиБ): страницы читаются из
+#   памяти без лишних системных вызовов;
+# - temp_store=MEMORY: временные таблицы сортировок и группировок в памяти.
+# Сравнение с настройками по умолчанию: manage.py benchmark_sqlite.
+# Режим WAL записывается в заголовок файла базы: db.sqlite3 переводит в WAL
+# первое же подключение, дальше режим сохраняется (файлы -wal и -shm рядом
+# с базой игнорируются git).
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        # BEGIN IMMEDIATE: транзакция сразу берёт блокировку записи, поэтому
+        # проверка и запись внутри atomic() (пакетное занятие мест) не
+        # пересекаются с параллельными писателями и не получают
+        # «database is locked» при повышении блокировки
+        # timeout — busy timeout в секундах: писатель ждёт освобождения
+        # блокировки вместо немедленной ошибки «database is locked»;
+        # init_command выполняется при каждом новом подключении (SQLITE_PRAGMAS)
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+        },
+        # Постоянные подключения: PRAGMA и открытие файла не повторяются на
+        # каждый запрос. Под ASGI (основная точка входа, Parking/asgi.py)
+        # запросы выполняются в разных потоках и подключения не
+        # переиспользуются, поэтому по умолчанию 0; Parking/wsgi.py включает
+        # их для WSGI-серверов через PARKING_CONN_MAX_AGE
+        'CONN_MAX_AGE': int(os.environ.get('PARKING_CONN_MAX_AGE', 0)),
+        'CONN_HEALTH_CHECKS': True,
+        # Тестовая база в файле, а не в памяти: у общей in-memory базы SQLite
+        # блокировки табличные и не ждут busy timeout, поэтому параллельные
+        # тесты (занятие мест из нескольких потоков) падали бы с ошибкой
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    },
+    # Снимок основной базы для отчётов (parking/replica.py), обновляется
+    # online backup API. Без постоянных подключений: открытое подключение
+    # продолжало бы читать подменённый старый снимок
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'db_replica.sqlite3',
+        'OPTIONS': {
+            'init_command': 'PRAGMA query_only=1',
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+}
+
+# Отчёты и аналитика читают с реплики, запись и остальное чтение — основная база
+DATABASE_ROUTERS = ['parking.replica.ReplicaRouter']
+
+# Снимок старше REFRESH_INTERVAL секунд обновляется в фоне при отчётном чтении
+# (или командой manage.py snapshot_replica по расписанию); старше MAX_LAG
+# отчёты читают основную базу
+REPLICA = {
+    'ALIAS': 'replica',
+    'REFRESH_INTERVAL': 60,
+    'MAX_LAG': 300,
 }
 
 
@@ -133,7 +213,67 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Кэши: default — для ролей и внешнего контента, pages — для публичных страниц
+# (см. parking/page_cache.py), sessions — для сессий. Для нескольких процессов
+# на одном сервере pages можно перевести на файловый бэкенд, чтобы сброс по
+# сигналам был общим:
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#   'LOCATION': BASE_DIR / 'cache' / 'pages',
+# sessions должен быть общим для всех процессов (файлы, Redis, Memcached):
+# иначе выход в одном процессе не завершит сессию, закэшированную в другом.
+# Локальная память для него отклоняется проверкой parking.E001
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'pages': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'parking-pages',
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'sessions',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+PAGE_CACHE_ALIAS = 'pages'
+PAGE_CACHE_TIMEOUT = 3600
+
+# Кэш групп пользователя между запросами в секундах (0 — только в рамках запроса),
+# сбрасывается при изменении состава групп, см. parking/roles.py
+ROLE_CACHE_TIMEOUT = 30
+
+# Инструментирование запросов (см. parking/metrics.py): итоги по имени URL
+# отдаются на /metrics только с адресов METRICS_ALLOWED_IPS.
+# METRICS_BUDGETS — лимиты SQL-запросов и времени (с) по имени URL, '*' — для
+# остальных; превышение пишется в лог, а при METRICS_STRICT_BUDGETS = True
+# вызывает BudgetExceeded (удобно в тестах)
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+METRICS_BUDGETS = {
+    'admin_dashboard': {'queries': 13, 'seconds': 1.0},
+    'employee_dashboard': {'queries': 13, 'seconds': 1.0},
+    'client_dashboard': {'queries': 11, 'seconds': 1.0},
+    '*': {'queries': 20, 'seconds': 2.0},
+}
+METRICS_STRICT_BUDGETS = False
+
+# Индекс свободных мест в памяти процесса перечитывается из базы не реже,
+# чем раз в столько секунд (изменения из других процессов), см. parking/availability.py
+AVAILABILITY_INDEX_TTL = 60
+
+# Внешний контент для главной страницы (шутка и цитата дня), см. parking/external.py
+EXTERNAL_CONTENT = {
+    'JOKE_URL': 'https://official-joke-api.appspot.com/random_joke',
+    'QUOTE_URL': 'https://favqs.com/api/qotd',
+    'TIMEOUT': (1.0, 2.0),
+    'TTL': 300,
+    'STALE_TTL': 86400,
+}
+
 # settings.py
+# Уровень логирования задаётся переменной окружения PARKING_LOG_LEVEL
+# (например, DEBUG при отладке); записи выключенных уровней ничего не стоят,
+# см. parking/log.py
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -145,7 +285,12 @@ LOGGING = {
     'loggers': {
         '': {
             'handlers': ['console'],
-            'level': 'DEBUG',
+            'level': os.environ.get('PARKING_LOG_LEVEL', 'INFO'),
         },
     },
 }
+
+# Доля записей, которые оставляют логгеры parking.log.get_logger (1.0 — все)
+LOG_SAMPLING = {
+    'parking.templatetags.parking_tags': 0.01,
+}
@@ -27,6 +27,16 @@ urlpatterns = [
     path('admin_dashboard/', admin_dashboard, name='admin_dashboard'),
     path('update_spot_price/<int:spot_id>/', update_spot_price, name='update_spot_price'),
     path('biggest_debtor/', biggest_debtor, name='biggest_debtor'),
+    path('api/debtors/', debtors_api, name='debtors_api'),
+    path('api/dashboard/', dashboard_api, name='dashboard_api'),
+    path('events/spots/', spot_events, name='spot_events'),
+    path('api/brands/', brands_api, name='brands_api'),
+    path('api/export/<str:name>/', export_api, name='export_api'),
+    path('api/news/', news_api, name='news_api'),
+    path('api/terms/', terms_api, name='terms_api'),
+    path('api/vacancies/', vacancies_api, name='vacancies_api'),
+    path('api/reviews/', reviews_api, name='reviews_api'),
+    path('metrics', metrics, name='metrics'),
     path('cars_with_multiple_owners/', cars_with_multiple_owners, name='cars_with_multiple_owners'),
     path('car_with_min_debt/', car_with_min_debt, name='car_with_min_debt'),
     path('total_debt/', total_debt, name='total_debt'),
@@ -52,6 +62,9 @@ urlpatterns = [
     # Занятие и освобождение парковочного места
     path('parkingspots/<int:spot_id>/occupy/', occupy_spot, name='occupy_spot'),
     path('parkingspots/<int:spot_id>/free/', free_parking_spot, name='free_parking_spot'),
+    path('api/spots/free/', free_spots_api, name='free_spots_api'),
+    path('api/spots/occupy/', occupy_spots_api, name='occupy_spots_api'),
+    path('api/spots/release/', release_spots_api, name='release_spots_api'),
     # Оплата счета
     path('invoices/<int:invoice_id>/pay/', pay_invoice, name='pay_invoice'),
     path('about/', about_company, name='about_company'),
@@ -12,5 +12,8 @@ import os
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Parking.settings')
+# WSGI-сервер обслуживает запрос целиком в одном потоке, поэтому здесь
+# подключения к базе переиспользуются между запросами (см. DATABASES)
+os.environ.setdefault('PARKING_CONN_MAX_AGE', '60')
 
 application = get_wsgi_application()
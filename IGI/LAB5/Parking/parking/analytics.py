@@ -0,0 +1,127 @@
+from dataclasses import dataclass, replace
+from decimal import Decimal
+
+from django.db.models import CharField, Count, DecimalField, Sum, Value
+from django.db.models.functions import Cast, Concat
+
+from .models import Car, Invoice, ParkingSpot
+
+CENTS = Decimal('0.01')
+
+
+@dataclass(frozen=True)
+class DebtTotal:
+    """
+    Сумма долга по одному автомобилю или парковочному месту за период.
+    """
+    key: int
+    label: str
+    total: Decimal
+    invoices: int
+
+    def __str__(self):
+        return self.label
+
+
+@dataclass(frozen=True)
+class PeriodDebtReport:
+    """
+    Итоги по долгам за период issue_date: по автомобилям, по местам и в целом.
+    В by_car входят все автомобили, даже без счетов за период (с долгом 0).
+    """
+    start_date: object
+    end_date: object
+    total: Decimal
+    invoices: int
+    by_car: tuple
+    by_spot: tuple
+
+    def min_car(self):
+        return min(self.by_car, key=lambda item: (item.total, item.key), default=None)
+
+    def max_car(self):
+        return min(self.by_car, key=lambda item: (-item.total, item.key), default=None)
+
+    def top_cars(self, k, largest=True):
+        return _top(self.by_car, k, largest)
+
+    def min_spot(self):
+        return min(self.by_spot, key=lambda item: (item.total, item.key), default=None)
+
+    def max_spot(self):
+        return min(self.by_spot, key=lambda item: (-item.total, item.key), default=None)
+
+    def top_spots(self, k, largest=True):
+        return _top(self.by_spot, k, largest)
+
+
+def _top(items, k, largest):
+    sign = -1 if largest else 1
+    return sorted(items, key=lambda item: (sign * item.total, item.key))[:k]
+
+
+def period_debt_rows(start_date, end_date):
+    """
+    Один запрос (UNION ALL): подписи автомобилей и мест ('car', 'spot') и
+    счета за период, сгруппированные по автомобилям и по местам ('car_debt',
+    'spot_debt'). Строки — (вид, id, подпись, долг, счета). Счета группируются
+    одним диапазоном по invoice_issue_id_idx без соединений, а подписи
+    берутся из небольших таблиц автомобилей и мест.
+    """
+    no_debt = (Value(None, output_field=DecimalField()), Value(0))
+    cars = Car.objects.values_list(
+        Value('car'), 'id', Concat('brand', Value(' '), 'model', Value(' ('), 'license_plate', Value(')')), *no_debt,
+    ).order_by()
+    spots = ParkingSpot.objects.values_list(
+        Value('spot'), 'id', Concat(Value('Место '), Cast('number', CharField())), *no_debt,
+    ).order_by()
+    period = Invoice.objects.filter(issue_date__range=(start_date, end_date))
+    debts = [
+        period.values(field).annotate(
+            kind=Value(f'{kind}_debt'), label=Value(''), debt=Sum('debt'), invoices=Count('id'),
+        ).values_list('kind', field, 'label', 'debt', 'invoices').order_by()
+        for kind, field in [('car', 'car'), ('spot', 'parking_spot')]
+    ]
+    return cars.union(spots, *debts, all=True)
+
+
+def period_total_debt(start_date, end_date):
+    """
+    Общая сумма долгов по счетам за период: один SUM по диапазону индекса
+    invoice_issue_id_idx, без группировки по автомобилям и местам.
+    """
+    total = Invoice.objects.filter(issue_date__range=(start_date, end_date)).aggregate(total=Sum('debt'))['total']
+    return Decimal(total or 0).quantize(CENTS)
+
+
+def period_debt_report(start_date, end_date):
+    """
+    Считает долги за период одним запросом (см. period_debt_rows).
+    Общая сумма сворачивается из итогов по автомобилям без отдельного запроса.
+    """
+    labels = {'car': {}, 'spot': {}}
+    debts = {'car_debt': {}, 'spot_debt': {}}
+    for kind, key, label, debt, invoices in period_debt_rows(start_date, end_date):
+        if kind in labels:
+            labels[kind][key] = label
+        else:
+            debts[kind][key] = DebtTotal(key, '', Decimal(debt or 0).quantize(CENTS), invoices)
+
+    # Автомобили — все, в том числе без счетов за период; места — только со счетами
+    empty = DebtTotal(None, '', Decimal('0.00'), 0)
+    cars = tuple(
+        replace(debts['car_debt'].get(key, empty), key=key, label=label)
+        for key, label in sorted(labels['car'].items())
+    )
+    spots = tuple(
+        replace(total, label=labels['spot'][key])
+        for key, total in sorted(debts['spot_debt'].items())
+    )
+    return PeriodDebtReport(
+        start_date=start_date,
+        end_date=end_date,
+        total=sum((item.total for item in cars), Decimal('0.00')),
+        invoices=sum(item.invoices for item in cars),
+        by_car=cars,
+        by_spot=spots,
+    )
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ParkingAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'parking'
+
+    def ready(self):
+        from . import sessions, signals  # noqa: F401
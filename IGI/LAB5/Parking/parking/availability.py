@@ -0,0 +1,171 @@
+import bisect
+import threading
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from . import events
+from .models import ParkingSpot
+
+
+@dataclass(frozen=True)
+class FreeSpot:
+    """
+    Свободное место из индекса (без обращения к базе).
+    """
+    id: int
+    number: int
+    price: Decimal
+    is_occupied: bool = False
+
+
+class AvailabilityIndex:
+    """
+    Индекс свободных мест в памяти процесса:
+    - битовая маска по номерам мест (бит number установлен, если место свободно)
+      отвечает на «сколько свободно» и «свободные в диапазоне номеров»;
+    - отсортированный список (цена, номер) свободных мест отвечает на
+      «самые дешёвые свободные» через bisect за O(log n).
+    Индекс обновляется сигналами ParkingSpot и явными вызовами changed() из
+    операций, которые сигналы обходят (update, bulk_update), а раз в
+    AVAILABILITY_INDEX_TTL секунд перечитывается целиком, чтобы учесть
+    изменения из других процессов. Каждое изменение уже загруженного индекса
+    публикуется в поток событий (parking/events.py).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded_at = None
+        self._spots = {}
+        self._free_bits = 0
+        self._free_numbers = {}
+        self._by_price = []
+
+    def _ttl(self):
+        return getattr(settings, 'AVAILABILITY_INDEX_TTL', 60)
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self._ttl():
+            self.reload()
+
+    def clear(self):
+        with self._lock:
+            self._loaded_at = None
+
+    def reload(self):
+        rows = list(ParkingSpot.objects.values_list('id', 'number', 'price', 'is_occupied'))
+        with self._lock:
+            loaded = self._loaded_at is not None
+            before = {spot_id: self._state(spot_id) for spot_id in self._spots}
+            self._spots, self._free_bits, self._free_numbers, self._by_price = {}, 0, {}, []
+            for row in rows:
+                self._put(*row)
+            self._loaded_at = time.monotonic()
+            changes = [
+                (before.get(spot_id), self._state(spot_id)) for spot_id in before.keys() | self._spots.keys()
+            ] if loaded else []
+            free = self._free_bits.bit_count()
+        self._publish(changes, free)
+
+    def refresh(self, spot_ids):
+        """
+        Перечитывает из базы указанные места одним запросом.
+        """
+        if self._loaded_at is None:
+            return
+        spot_ids = set(spot_ids)
+        rows = list(ParkingSpot.objects.filter(pk__in=spot_ids).values_list('id', 'number', 'price', 'is_occupied'))
+        with self._lock:
+            before = {spot_id: self._state(spot_id) for spot_id in spot_ids}
+            for spot_id in spot_ids:
+                self._drop(spot_id)
+            for row in rows:
+                self._put(*row)
+            changes = [(before[spot_id], self._state(spot_id)) for spot_id in spot_ids]
+            free = self._free_bits.bit_count()
+        self._publish(changes, free)
+
+    def _state(self, spot_id):
+        spot = self._spots.get(spot_id)
+        return None if spot is None else (spot_id, *spot)
+
+    def _publish(self, changes, free):
+        for old, new in changes:
+            events.spot_changed(old, new, free)
+
+    def _put(self, spot_id, number, price, is_occupied):
+        self._spots[spot_id] = (number, price, not is_occupied)
+        if not is_occupied:
+            self._free_bits |= 1 << number
+            self._free_numbers[number] = spot_id
+            bisect.insort(self._by_price, (price, number, spot_id))
+
+    def _drop(self, spot_id):
+        spot = self._spots.pop(spot_id, None)
+        if spot is None:
+            return
+        number, price, free = spot
+        if free:
+            self._free_bits &= ~(1 << number)
+            self._free_numbers.pop(number, None)
+            i = bisect.bisect_left(self._by_price, (price, number, spot_id))
+            if i < len(self._by_price) and self._by_price[i] == (price, number, spot_id):
+                del self._by_price[i]
+
+    def _free_spot(self, spot_id):
+        number, price, _ = self._spots[spot_id]
+        return FreeSpot(id=spot_id, number=number, price=price)
+
+    def count_free(self):
+        with self._lock:
+            self._ensure_loaded()
+            return self._free_bits.bit_count()
+
+    def cheapest_free(self, limit=1, max_price=None):
+        """
+        До limit (None — все) свободных мест не дороже max_price по возрастанию
+        цены, при равной цене — номера.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            end = len(self._by_price)
+            if max_price is not None:
+                end = bisect.bisect_right(self._by_price, (Decimal(max_price), float('inf')))
+            if limit is not None:
+                end = min(limit, end)
+            return [self._free_spot(spot_id) for _, _, spot_id in self._by_price[:end]]
+
+    def free_in_range(self, low=0, high=None, limit=None):
+        """
+        Свободные места с номерами от low до high включительно по возрастанию номера.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            bits = self._free_bits >> low
+            if high is not None:
+                bits &= (1 << max(high - low + 1, 0)) - 1
+            spots = []
+            while bits and (limit is None or len(spots) < limit):
+                lowest = bits & -bits
+                spots.append(self._free_spot(self._free_numbers[low + lowest.bit_length() - 1]))
+                bits ^= lowest
+            return spots
+
+
+index = AvailabilityIndex()
+
+
+def changed(spot_ids=None):
+    """
+    Сообщает индексу об изменении мест spot_ids (None — неизвестно каких).
+    Индекс обновляется после фиксации транзакции, откат его не затрагивает.
+    """
+    def apply():
+        if spot_ids is None:
+            index.reload()
+        else:
+            index.refresh(spot_ids)
+    transaction.on_commit(apply)
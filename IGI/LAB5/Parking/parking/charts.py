@@ -0,0 +1,144 @@
+from datetime import date, timedelta
+
+from django.db.models import Case, DateField, Sum, Value, When
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import DailyParkingStats
+from .replica import reporting
+
+# Шаг графика -> количество интервалов по умолчанию
+STEPS = {
+    'day': 7,
+    'week': 8,
+    'month': 6,
+    'quarter': 4,
+}
+
+SERIES = ('profit', 'new_clients', 'all_clients', 'unpaid_invoices', 'debt')
+
+
+def bucket_start(value, step):
+    """
+    Начало интервала шага step, в который попадает дата value.
+    """
+    if step == 'day':
+        return value
+    if step == 'week':
+        return value - timedelta(days=value.weekday())
+    if step == 'month':
+        return value.replace(day=1)
+    return value.replace(month=(value.month - 1) // 3 * 3 + 1, day=1)
+
+
+def next_bucket(value, step):
+    """
+    Начало следующего интервала после value (value — начало интервала).
+    """
+    if step == 'day':
+        return value + timedelta(days=1)
+    if step == 'week':
+        return value + timedelta(weeks=1)
+    months = 1 if step == 'month' else 3
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+
+def bucket_label(value, step):
+    if step == 'day':
+        return value.strftime('%Y-%m-%d')
+    if step == 'week':
+        year, week, _ = value.isocalendar()
+        return f'{year}-W{week:02d}'
+    if step == 'month':
+        return value.strftime('%Y-%m')
+    return f'{value.year}-Q{(value.month - 1) // 3 + 1}'
+
+
+def buckets_between(start_date, end_date, step):
+    """
+    Список начал интервалов, покрывающих [start_date, end_date].
+    """
+    buckets = []
+    current = bucket_start(start_date, step)
+    while current <= end_date:
+        buckets.append(current)
+        current = next_bucket(current, step)
+    return buckets
+
+
+def default_range(step, periods=None):
+    """
+    Последние periods интервалов шага step, включая текущий.
+    """
+    end_date = timezone.localdate()
+    start_date = bucket_start(end_date, step)
+    for _ in range((periods or STEPS[step]) - 1):
+        start_date = bucket_start(start_date - timedelta(days=1), step)
+    return start_date, end_date
+
+
+def build_chart_data(step='month', start_date=None, end_date=None):
+    """
+    Строит пять рядов для Chart.js с общими метками по дневным срезам
+    DailyParkingStats одним запросом, поэтому время не зависит от объёма
+    истории счетов. Строки раскладываются по интервалам через словарь
+    {начало интервала: индекс}. Начало диапазона выравнивается по началу интервала.
+    Срезы читаются с реплики для отчётов.
+    """
+    with reporting():
+        step, buckets, rows = _chart_query(step, start_date, end_date)
+        return _chart_series(step, buckets, rows)
+
+
+async def abuild_chart_data(step='month', start_date=None, end_date=None):
+    """
+    Асинхронный вариант build_chart_data для async-представлений.
+    """
+    with reporting():
+        step, buckets, rows = _chart_query(step, start_date, end_date)
+        return _chart_series(step, buckets, [row async for row in rows.aiterator()])
+
+
+def _chart_query(step, start_date, end_date):
+    if step not in STEPS:
+        step = 'month'
+    if start_date is None or end_date is None:
+        start_date, end_date = default_range(step)
+    buckets = buckets_between(start_date, end_date, step)
+    start_date = buckets[0] if buckets else start_date
+
+    # Дни до начала диапазона попадают в интервал None
+    # и дают базу для нарастающего итога клиентов
+    rows = DailyParkingStats.objects.filter(date__lte=end_date).values(bucket=Case(
+        When(date__lt=start_date, then=Value(None)),
+        default=Trunc('date', step, output_field=DateField()),
+    )).annotate(
+        profit=Sum('profit'),
+        new_clients=Sum('new_clients'),
+        unpaid_invoices=Sum('unpaid_invoices'),
+        debt=Sum('debt'),
+    ).order_by()
+    return step, buckets, rows
+
+
+def _chart_series(step, buckets, rows):
+    index = {bucket: i for i, bucket in enumerate(buckets)}
+    labels = [bucket_label(bucket, step) for bucket in buckets]
+    values = {name: [0] * len(buckets) for name in SERIES}
+    total = 0
+    for row in rows:
+        if row['bucket'] is None:
+            total += row['new_clients'] or 0
+            continue
+        i = index.get(row['bucket'])
+        if i is not None:
+            values['profit'][i] = float(row['profit'] or 0)
+            values['new_clients'][i] = row['new_clients'] or 0
+            values['unpaid_invoices'][i] = row['unpaid_invoices'] or 0
+            values['debt'][i] = float(row['debt'] or 0)
+    for i, new_clients in enumerate(values['new_clients']):
+        total += new_clients
+        values['all_clients'][i] = total
+
+    return {name: {'labels': labels, 'values': values[name]} for name in SERIES}
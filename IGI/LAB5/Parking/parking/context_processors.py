@@ -0,0 +1,29 @@
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.functional import SimpleLazyObject
+
+from .roles import get_roles
+
+
+def roles(request):
+    """
+    Добавляет в шаблоны roles и флаги is_admin/is_client/is_employee.
+    Флаги ленивые: группы загружаются, только если шаблон их читает,
+    и не больше одного раза за запрос.
+    """
+    request_roles = getattr(request, 'roles', None)
+    if request_roles is None:
+        request_roles = SimpleLazyObject(lambda: get_roles(request.user))
+    return {
+        'roles': request_roles,
+        'is_admin': SimpleLazyObject(lambda: request_roles.is_admin),
+        'is_client': SimpleLazyObject(lambda: request_roles.is_client),
+        'is_employee': SimpleLazyObject(lambda: request_roles.is_employee),
+    }
+
+
+def live_events(request):
+    """
+    live_events — запрос обслуживает ASGI-сервер, значит, он же отдаст поток
+    событий мест (под WSGI страницы работают без живых обновлений).
+    """
+    return {'live_events': isinstance(request, ASGIRequest)}
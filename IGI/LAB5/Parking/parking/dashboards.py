@@ -0,0 +1,91 @@
+from dataclasses import dataclass
+
+from django.db.models import Prefetch, Sum
+
+from .models import Car, Client, Invoice, ParkingSpot
+
+# Планы запросов для панелей. Каждая функция возвращает queryset, которому
+# шаблон не добавляет ни одного запроса, сколько бы строк в нём ни было:
+# владельцы машин догружаются одним запросом в атрибут owners,
+# машина места берётся через JOIN. Панель выводит из каждого списка не больше
+# LIST_LIMIT строк (head), полные списки — на отдельных страницах.
+
+LIST_LIMIT = 50
+
+
+@dataclass(frozen=True)
+class ListHead:
+    """
+    Первые строки списка панели; has_more — строк в списке больше.
+    """
+    rows: list
+    has_more: bool
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def head(rows, limit=LIST_LIMIT):
+    """
+    Первые limit строк queryset или списка. Читается на одну строку больше,
+    поэтому отдельный COUNT для has_more не нужен.
+    """
+    rows = list(rows[:limit + 1])
+    return ListHead(rows[:limit], len(rows) > limit)
+
+
+def owners_prefetch(prefix=''):
+    return Prefetch(
+        f'{prefix}clients',
+        queryset=Client.objects.only('id', 'name').order_by('name', 'id'),
+        to_attr='owners',
+    )
+
+
+def client_list():
+    return Client.objects.only('id', 'name', 'email', 'age').order_by('name', 'id')
+
+
+def cars_with_owners(cars=None):
+    """
+    Машины со списком владельцев в car.owners (один дополнительный запрос).
+    """
+    if cars is None:
+        cars = Car.objects.all()
+    return cars.prefetch_related(owners_prefetch()).order_by('brand', 'model', 'id')
+
+
+def spots_with_cars():
+    return ParkingSpot.objects.select_related('car').order_by('number')
+
+
+def occupied_spots():
+    """
+    Занятые места с машиной (JOIN) и её владельцами в spot.car.owners.
+    """
+    return (
+        ParkingSpot.objects.filter(is_occupied=True)
+        .select_related('car')
+        .prefetch_related(owners_prefetch('car__'))
+        .order_by('number')
+    )
+
+
+def clients_with_debt():
+    return (
+        Client.objects.filter(cars__invoice__debt__gt=0)
+        .annotate(total_debt=Sum('cars__invoice__debt'))
+        .order_by('name', 'id')
+    )
+
+
+def invoice_list(invoices=None):
+    """
+    Счета для списков на панелях: только поля, которые выводит шаблон.
+    """
+    if invoices is None:
+        invoices = Invoice.objects.all()
+    return invoices.only('id', 'code', 'issue_date', 'spot_price', 'payment_date', 'debt').order_by('-issue_date', '-id')
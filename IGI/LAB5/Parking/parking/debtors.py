@@ -0,0 +1,55 @@
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, Max, Sum, Value
+from django.db.models.functions import Coalesce, Rank, Round
+from django.db.models.expressions import Window
+
+from .models import Client
+
+# SQLite суммирует DecimalField в float: сумма округляется до копеек ещё в
+# запросе, иначе равные долги (0.1 + 0.2 и 0.3) получают разные места и
+# по-разному проходят порог
+CENTS = Decimal('0.01')
+
+
+def _round_debt(debtor):
+    debtor.total_debt = Decimal(debtor.total_debt).quantize(CENTS)
+    return debtor
+
+
+def ranked_debtors(threshold=None):
+    """
+    Возвращает клиентов, аннотированных суммарным долгом (total_debt),
+    датой последнего платежа (last_payment) и местом в рейтинге (debt_rank).
+    Всё считается одним запросом с агрегацией по Client → Car → Invoice
+    и оконной функцией RANK() поверх суммы долга, округлённой до копеек.
+    Если задан threshold, остаются только клиенты с долгом больше порога.
+    """
+    debtors = Client.objects.annotate(
+        total_debt=Coalesce(
+            Round(Sum('cars__invoice__debt'), 2),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        last_payment=Max('cars__invoice__payment_date'),
+    )
+    if threshold is not None:
+        debtors = debtors.filter(total_debt__gt=threshold)
+    return debtors.annotate(
+        debt_rank=Window(expression=Rank(), order_by=F('total_debt').desc()),
+    ).order_by('-total_debt', 'id')
+
+
+def top_debtors(limit=10, threshold=None):
+    """
+    Возвращает список из limit крупнейших должников (см. ranked_debtors).
+    """
+    return [_round_debt(debtor) for debtor in ranked_debtors(threshold)[:limit]]
+
+
+def get_biggest_debtor():
+    """
+    Возвращает клиента с наибольшим долгом или None, если клиентов нет.
+    """
+    debtor = ranked_debtors().first()
+    return _round_debt(debtor) if debtor else None
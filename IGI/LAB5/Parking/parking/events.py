@@ -0,0 +1,145 @@
+import asyncio
+import json
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+HEARTBEAT_SECONDS = 15
+HISTORY_SIZE = 200
+QUEUE_SIZE = 100
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    type: str
+    data: dict
+
+    def encode(self):
+        data = json.dumps(self.data, cls=DjangoJSONEncoder)
+        return f'id: {self.id}\nevent: {self.type}\ndata: {data}\n\n'.encode()
+
+
+class Broker:
+    """
+    Рассылка событий подписчикам внутри процесса. Публиковать можно из любого
+    потока (например, из on_commit синхронного представления), подписчики —
+    очереди asyncio в цикле событий ASGI-сервера. Последние HISTORY_SIZE событий
+    хранятся, чтобы переподключившийся клиент получил пропущенное по Last-Event-ID.
+    При нескольких процессах каждый узнаёт о чужих изменениях при перечитывании
+    индекса доступности (AVAILABILITY_INDEX_TTL).
+    """
+
+    def __init__(self, history=HISTORY_SIZE, queue_size=QUEUE_SIZE):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._history = deque(maxlen=history)
+        self._queue_size = queue_size
+        self._last_id = 0
+
+    def publish(self, type, data):
+        with self._lock:
+            self._last_id += 1
+            event = Event(self._last_id, type, data)
+            self._history.append(event)
+            subscribers = list(self._subscribers.items())
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # Цикл событий подписчика уже закрыт
+                self.unsubscribe(queue)
+        return event
+
+    def _offer(self, queue, event):
+        if queue.full():
+            # Клиент не успевает читать: вместо потери части событий
+            # просим его перечитать состояние целиком
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(Event(event.id, 'resync', {}))
+        else:
+            queue.put_nowait(event)
+
+    def subscribe(self, last_event_id=None):
+        """
+        Возвращает очередь нового подписчика и события после last_event_id.
+        Если их уже нет в истории, вместо них отдаётся одно событие resync.
+        """
+        queue = asyncio.Queue(self._queue_size)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+            backlog = []
+            if last_event_id is not None and last_event_id != self._last_id:
+                backlog = [event for event in self._history if event.id > last_event_id]
+                # Пропущенные события вытеснены из истории или процесс перезапущен
+                if last_event_id > self._last_id or not backlog or backlog[0].id != last_event_id + 1:
+                    backlog = [Event(self._last_id, 'resync', {})]
+        return queue, backlog
+
+    def unsubscribe(self, queue):
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    @property
+    def subscribers(self):
+        return len(self._subscribers)
+
+
+broker = Broker()
+
+
+def spot_changed(old, new, free):
+    """
+    Публикует событие по изменению места в индексе доступности: old и new —
+    (id, number, price, свободно) до и после, None — места нет.
+    """
+    if old == new:
+        return
+    spot_id, number, price, is_free = new or old
+    data = {'spot': spot_id, 'number': number, 'price': price, 'free': free}
+    if new is None:
+        broker.publish('remove', data)
+        return
+    if old is None or old[3] != is_free:
+        broker.publish('free' if is_free else 'occupy', data)
+    if old is not None and old[2] != price:
+        broker.publish('price', data)
+
+
+async def stream(last_event_id=None, heartbeat=HEARTBEAT_SECONDS):
+    """
+    Асинхронный генератор потока text/event-stream. Первым идёт событие hello
+    с текущим числом свободных мест (индекс при этом загружается, и дальше
+    изменения мест приходят из него без запросов к базе на каждого клиента).
+    """
+    from .availability import index
+
+    queue, backlog = broker.subscribe(last_event_id)
+    try:
+        free = await sync_to_async(index.count_free)()
+        yield f'retry: 3000\nevent: hello\ndata: {json.dumps({"free": free})}\n\n'.encode()
+        for event in backlog:
+            yield event.encode()
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield b': ping\n\n'
+                continue
+            yield event.encode()
+    finally:
+        broker.unsubscribe(queue)
+
+
+def parse_last_event_id(value):
+    """
+    Номер последнего полученного события из заголовка Last-Event-ID.
+    """
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,225 @@
+import csv
+import io
+import json
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Client, Income, Invoice
+
+# Строк, читаемых из курсора за раз, и размер отдаваемого куска ответа
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Export:
+    """
+    Описание выгрузки: столбцы (имя в файле, поле для values_list), поле для
+    фильтра по датам и фильтры статусов.
+    """
+    model: type
+    columns: tuple
+    date_field: str
+    statuses: dict
+
+    @property
+    def header(self):
+        return [name for name, _ in self.columns]
+
+
+_has_debt = Exists(Invoice.objects.filter(car__clients=OuterRef('pk'), debt__gt=0))
+
+EXPORTS = {
+    'invoices': Export(
+        model=Invoice,
+        columns=(
+            ('id', 'id'),
+            ('code', 'code'),
+            ('car', 'car__license_plate'),
+            ('spot', 'parking_spot__number'),
+            ('spot_price', 'spot_price'),
+            ('issue_date', 'issue_date'),
+            ('payment_date', 'payment_date'),
+            ('debt', 'debt'),
+        ),
+        date_field='issue_date',
+        statuses={
+            'paid': Q(payment_date__isnull=False),
+            'unpaid': Q(payment_date__isnull=True),
+            'debt': Q(debt__gt=0),
+        },
+    ),
+    'clients': Export(
+        model=Client,
+        columns=(
+            ('id', 'id'),
+            ('name', 'name'),
+            ('email', 'email'),
+            ('age', 'age'),
+            ('timezone', 'timezone'),
+            ('joined', 'user__date_joined'),
+        ),
+        date_field='user__date_joined__date',
+        statuses={
+            'debtor': Q(_has_debt),
+            'clear': ~Q(_has_debt),
+        },
+    ),
+    'income': Export(
+        model=Income,
+        columns=(
+            ('id', 'id'),
+            ('date', 'date'),
+            ('amount', 'amount'),
+            ('description', 'description'),
+        ),
+        date_field='date',
+        statuses={},
+    ),
+}
+
+
+@dataclass
+class ExportReport:
+    rows: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return f'{self.rows} строк, {self.bytes} байт за {self.seconds:.2f} с ({self.rows_per_second:.0f} строк/с)'
+
+
+def get_export(name):
+    try:
+        return EXPORTS[name]
+    except KeyError:
+        raise ExportError(f'Неизвестная выгрузка: {name}') from None
+
+
+def parse_day(value):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ExportError(f'Некорректная дата: {value}') from None
+
+
+def rows(name, start=None, end=None, status=None):
+    """
+    values_list выгрузки name в порядке id с фильтрами по датам (включительно)
+    и статусу. Ошибки параметров — ExportError.
+    """
+    export = get_export(name)
+    queryset = export.model.objects.all()
+    if start is not None:
+        queryset = queryset.filter(**{f'{export.date_field}__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{f'{export.date_field}__lte': end})
+    if status:
+        if status not in export.statuses:
+            raise ExportError(f'Неизвестный статус: {status}')
+        queryset = queryset.filter(export.statuses[status])
+    return queryset.order_by('pk').values_list(*(field for _, field in export.columns))
+
+
+def _cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _csv_lines(header, records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(header)
+    for record in records:
+        writer.writerow([_cell(value) for value in record])
+        # Буфер переиспользуется, чтобы память не росла с размером выгрузки
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _jsonl_lines(header, records):
+    for record in records:
+        yield json.dumps(dict(zip(header, record)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+def stream(name, queryset, format='csv', report=None, finished=None):
+    """
+    Генератор байтов выгрузки name из queryset (см. rows()). Строки читаются
+    курсором порциями по CHUNK_SIZE и отдаются кусками около BUFFER_SIZE байт,
+    поэтому память не зависит от размера таблицы. В report копятся строки,
+    байты и время; finished(report) вызывается по окончании (и при обрыве).
+    """
+    if format not in FORMATS:
+        raise ExportError(f'Неизвестный формат: {format}')
+    lines = _csv_lines if format == 'csv' else _jsonl_lines
+    header = get_export(name).header
+    report = report if report is not None else ExportReport()
+
+    def records():
+        for record in queryset.iterator(chunk_size=CHUNK_SIZE):
+            report.rows += 1
+            yield record
+
+    def generate():
+        started = time.perf_counter()
+        chunk, size = [], 0
+        try:
+            for line in lines(header, records()):
+                data = line.encode()
+                chunk.append(data)
+                size += len(data)
+                if size >= BUFFER_SIZE:
+                    report.bytes += size
+                    yield b''.join(chunk)
+                    chunk, size = [], 0
+            if chunk:
+                report.bytes += size
+                yield b''.join(chunk)
+        finally:
+            report.seconds = time.perf_counter() - started
+            if finished is not None:
+                finished(report)
+
+    return generate()
+
+
+async def aiterate(chunks):
+    """
+    Асинхронный итератор по кускам stream() для ответа под ASGI. Синхронный
+    генератор в StreamingHttpResponse ASGI-обработчик сначала собрал бы в
+    список целиком; здесь каждый кусок берётся отдельным sync_to_async в
+    потоке запроса, так что курсор остаётся в одном подключении, а в памяти —
+    один кусок.
+    """
+    pull = sync_to_async(next)
+    try:
+        while (chunk := await pull(chunks, None)) is not None:
+            yield chunk
+    finally:
+        # Генератор закрывается в том же потоке: итоги пишутся и при обрыве
+        await sync_to_async(chunks.close)()
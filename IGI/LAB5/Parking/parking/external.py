@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Локальный запас на случай недоступности внешних API
+FALLBACK_JOKES = [
+    {'setup': 'Почему парковщик всегда спокоен?', 'punchline': 'Потому что у него всё на своих местах.'},
+    {'setup': 'Что сказал автомобиль свободному месту?', 'punchline': 'Я тебя так долго искал!'},
+    {'setup': 'Почему шлагбаум не ходит в спортзал?', 'punchline': 'Ему хватает подъёмов.'},
+]
+
+FALLBACK_QUOTES = [
+    {'body': 'Терпение — это умение ждать, не теряя хорошего настроения.', 'author': 'Джойс Майер'},
+    {'body': 'Лучший способ предсказать будущее — создать его.', 'author': 'Питер Друкер'},
+    {'body': 'Простота — залог надёжности.', 'author': 'Эдсгер Дейкстра'},
+]
+
+DEFAULTS = {
+    'JOKE_URL': 'https://official-joke-api.appspot.com/random_joke',
+    'QUOTE_URL': 'https://favqs.com/api/qotd',
+    'TIMEOUT': (1.0, 2.0),  # (connect, read) в секундах
+    'TTL': 300,             # сколько секунд контент считается свежим
+    'STALE_TTL': 86400,     # сколько секунд хранить устаревший контент
+}
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='external-content')
+
+
+def get_setting(name):
+    return getattr(settings, 'EXTERNAL_CONTENT', {}).get(name, DEFAULTS[name])
+
+
+def _parse_joke(data):
+    return {'setup': data['setup'], 'punchline': data['punchline']}
+
+
+def _parse_quote(data):
+    data = data['quote']
+    return {'body': data['body'], 'author': data['author']}
+
+
+# Лента -> (настройка с адресом, разбор ответа, локальный запас)
+FEEDS = {
+    'joke': ('JOKE_URL', _parse_joke, FALLBACK_JOKES),
+    'quote': ('QUOTE_URL', _parse_quote, FALLBACK_QUOTES),
+}
+
+FETCH_ERRORS = (requests.RequestException, ValueError, KeyError, TypeError)
+
+
+def _fetch(name):
+    url_setting, parse, _ = FEEDS[name]
+    response = requests.get(get_setting(url_setting), timeout=get_setting('TIMEOUT'))
+    response.raise_for_status()
+    return parse(response.json())
+
+
+async def _afetch(name):
+    """
+    Асинхронная загрузка ленты: синхронный _fetch (requests) выполняется
+    в общем пуле потоков модуля, а цикл событий в это время свободен.
+    Отменить загрузку в потоке нельзя, она завершится сама по таймауту.
+    """
+    return await asyncio.get_running_loop().run_in_executor(_executor, _fetch, name)
+
+
+def _cache_key(name):
+    return f'external_content:{name}'
+
+
+def _lock_key(name):
+    return f'external_content:{name}:refreshing'
+
+
+def _refresh(name):
+    """
+    Загружает ленту name и кладёт результат в кэш вместе со временем загрузки.
+    Возвращает контент или None при ошибке.
+    """
+    try:
+        value = _fetch(name)
+    except FETCH_ERRORS as e:
+        logger.warning("Failed to fetch external content '%s': %s", name, e)
+        return None
+    finally:
+        cache.delete(_lock_key(name))
+    cache.set(_cache_key(name), (time.time(), value), get_setting('STALE_TTL'))
+    return value
+
+
+def get_external_content():
+    """
+    Возвращает {'joke': ..., 'quote': ...} для главной страницы.
+    Свежий кэш отдаётся сразу; устаревший тоже отдаётся сразу, а обновление
+    уходит в фоновый поток. Без кэша обе ленты загружаются параллельно
+    с жёстким таймаутом, а при неудаче берётся случайный локальный вариант.
+    """
+    connect_timeout, read_timeout = get_setting('TIMEOUT')
+    lock_timeout = int(connect_timeout + read_timeout) + 1
+    now = time.time()
+    content = {}
+    pending = {}
+
+    for name in FEEDS:
+        cached = cache.get(_cache_key(name))
+        if cached is not None:
+            fetched_at, content[name] = cached
+            if now - fetched_at > get_setting('TTL') and cache.add(_lock_key(name), True, lock_timeout):
+                _executor.submit(_refresh, name)
+        elif cache.add(_lock_key(name), True, lock_timeout):
+            pending[name] = _executor.submit(_refresh, name)
+
+    if pending:
+        wait(pending.values(), timeout=connect_timeout + read_timeout)
+        for name, future in pending.items():
+            if future.done() and future.result() is not None:
+                content[name] = future.result()
+
+    return _with_fallbacks(content)
+
+
+def _with_fallbacks(content):
+    for name, (_, _, fallback) in FEEDS.items():
+        if name not in content:
+            content[name] = random.choice(fallback)
+    return content
+
+
+async def _arefresh(name):
+    """
+    Асинхронный вариант _refresh.
+    """
+    try:
+        value = await _afetch(name)
+    except FETCH_ERRORS as e:
+        logger.warning("Failed to fetch external content '%s': %s", name, e)
+        return None
+    finally:
+        await cache.adelete(_lock_key(name))
+    await cache.aset(_cache_key(name), (time.time(), value), get_setting('STALE_TTL'))
+    return value
+
+
+async def aget_external_content():
+    """
+    Асинхронный вариант get_external_content для async-представлений: ленты
+    без кэша загружаются параллельно в пуле потоков (см. _afetch), а запрос
+    ждёт их в цикле событий, не занимая поток. Фоновое обновление устаревшего контента по-прежнему
+    уходит в пул потоков: задача в цикле событий не переживёт запрос, если
+    представление выполняется под WSGI.
+    """
+    connect_timeout, read_timeout = get_setting('TIMEOUT')
+    lock_timeout = int(connect_timeout + read_timeout) + 1
+    now = time.time()
+    content = {}
+    pending = {}
+
+    for name in FEEDS:
+        cached = await cache.aget(_cache_key(name))
+        if cached is not None:
+            fetched_at, content[name] = cached
+            if now - fetched_at > get_setting('TTL') and await cache.aadd(_lock_key(name), True, lock_timeout):
+                _executor.submit(_refresh, name)
+        elif await cache.aadd(_lock_key(name), True, lock_timeout):
+            pending[name] = asyncio.ensure_future(_arefresh(name))
+
+    if pending:
+        _, late = await asyncio.wait(pending.values(), timeout=connect_timeout + read_timeout)
+        for task in late:
+            task.cancel()
+        await asyncio.gather(*late, return_exceptions=True)
+        for name, task in pending.items():
+            if task not in late and task.result() is not None:
+                content[name] = task.result()
+
+    return _with_fallbacks(content)
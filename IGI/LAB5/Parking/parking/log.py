@@ -0,0 +1,98 @@
+import logging
+import random
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+QUERY_BLOCKED = '<query blocked>'
+
+
+class QueryInLogStatement(RuntimeError):
+    pass
+
+
+def _forbid(execute, sql, params, many, context):
+    raise QueryInLogStatement(f'Запрос к базе из записи лога: {sql[:80]}')
+
+
+@contextmanager
+def no_queries():
+    """
+    Запрещает SQL-запросы внутри блока на всех подключениях.
+    """
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(_forbid))
+        yield
+
+
+class lazy:
+    """
+    Аргумент лога, который вычисляется только при форматировании записи,
+    то есть только если уровень включён. Если вычисление требует запроса
+    к базе, вместо значения выводится QUERY_BLOCKED. Значение вычисляется
+    один раз, повторное форматирование записи (другим обработчиком или
+    вне StructuredLogger) его не пересчитывает.
+    """
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+        self.value = None
+
+    def __str__(self):
+        if self.value is None:
+            try:
+                self.value = str(self.func(*self.args))
+            except QueryInLogStatement:
+                self.value = QUERY_BLOCKED
+        return self.value
+
+    __repr__ = __str__
+
+
+def _user_label(user):
+    return user.username if user.is_authenticated else 'Anonymous'
+
+
+def user_label(user):
+    return lazy(_user_label, user)
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """
+    Обёртка над logging.Logger:
+    - сообщение форматируется через %-аргументы только для включённых уровней;
+    - именованные аргументы добавляются к сообщению как key=value и попадают
+      в record.fields;
+    - sample (или LOG_SAMPLING[имя логгера] из настроек) оставляет указанную
+      долю записей;
+    - форматирование и обработчики выполняются с запретом запросов к базе.
+    """
+
+    def __init__(self, logger):
+        super().__init__(logger, {})
+
+    def sample_rate(self):
+        return getattr(settings, 'LOG_SAMPLING', {}).get(self.logger.name, 1.0)
+
+    def log(self, level, msg, *args, sample=None, exc_info=None, stack_info=False, stacklevel=1, **fields):
+        if not self.isEnabledFor(level):
+            return
+        rate = self.sample_rate() if sample is None else sample
+        if rate < 1 and random.random() >= rate:
+            return
+        if fields:
+            msg = ' '.join([msg, *(f'{key}=%s' for key in fields)])
+            args = (*args, *fields.values())
+        with no_queries():
+            # stacklevel указывает на вызов logger.debug(...) в коде приложения
+            self.logger.log(
+                level, msg, *args, exc_info=exc_info, stack_info=stack_info,
+                stacklevel=stacklevel + 1, extra={'fields': fields},
+            )
+
+
+def get_logger(name):
+    return StructuredLogger(logging.getLogger(name))
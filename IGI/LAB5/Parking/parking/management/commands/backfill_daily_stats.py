@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from parking import rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает дневные срезы DailyParkingStats для графиков панелей с нуля'
+
+    def handle(self, *args, **options):
+        days = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Дневные срезы пересчитаны: {days} дней'))
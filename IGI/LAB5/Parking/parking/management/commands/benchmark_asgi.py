@@ -0,0 +1,163 @@
+import asyncio
+import io
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+DEFAULT_PATHS = ['/', '/news/', '/contacts/', '/vacancies/']
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность синхронного WSGI (пул потоков) и '
+        'асинхронного ASGI (задачи asyncio) под одновременной нагрузкой. Запросы '
+        'проходят через обработчики Django в процессе, без сетевого сервера'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=DEFAULT_PATHS, help='Адреса для запросов')
+        parser.add_argument('--requests', type=int, default=200, help='Запросов на каждый адрес')
+        parser.add_argument('--concurrency', type=int, default=20, help='Одновременных запросов')
+        parser.add_argument('--host', default='localhost', help='Заголовок Host (должен быть в ALLOWED_HOSTS)')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests и --concurrency должны быть положительными')
+        jobs = [path for path in options['paths'] for _ in range(options['requests'])]
+        host = options['host']
+
+        results = {
+            'WSGI': run_wsgi(jobs, options['concurrency'], host),
+            'ASGI': asyncio.run(run_asgi(jobs, options['concurrency'], host)),
+        }
+        self.stdout.write(f"{len(jobs)} запросов, одновременно {options['concurrency']}")
+        self.stdout.write(f"{'':6}{'запр/с':>10}{'p50, мс':>10}{'p95, мс':>10}{'ошибки':>8}")
+        for mode, (elapsed, latencies, errors) in results.items():
+            self.stdout.write(
+                f'{mode:6}{len(jobs) / elapsed:10.1f}{percentile(latencies, 50):10.1f}'
+                f'{percentile(latencies, 95):10.1f}{errors:8}'
+            )
+
+
+def percentile(latencies, q):
+    if len(latencies) < 2:
+        return latencies[0] * 1000 if latencies else 0.0
+    return statistics.quantiles(latencies, n=100)[q - 1] * 1000
+
+
+def _split(path):
+    path, _, query = path.partition('?')
+    return path, query
+
+
+def run_wsgi(jobs, concurrency, host):
+    """
+    concurrency потоков по очереди забирают адреса из jobs, как потоки
+    WSGI-сервера. Возвращает (время, задержки запросов, число ошибок).
+    """
+    handler = WSGIHandler()
+    pending = iter(jobs)
+    lock = threading.Lock()
+    latencies, errors = [], []
+
+    def worker():
+        try:
+            while True:
+                with lock:
+                    path = next(pending, None)
+                if path is None:
+                    return
+                path, query = _split(path)
+                environ = {
+                    'REQUEST_METHOD': 'GET',
+                    'PATH_INFO': path,
+                    'QUERY_STRING': query,
+                    'SCRIPT_NAME': '',
+                    'SERVER_NAME': host,
+                    'SERVER_PORT': '80',
+                    'SERVER_PROTOCOL': 'HTTP/1.1',
+                    'HTTP_HOST': host,
+                    'REMOTE_ADDR': '127.0.0.1',
+                    'wsgi.input': io.BytesIO(),
+                    'wsgi.errors': io.StringIO(),
+                    'wsgi.url_scheme': 'http',
+                }
+                statuses = []
+                started = time.perf_counter()
+                response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+                try:
+                    b''.join(response)
+                finally:
+                    # close() отправляет request_finished, как настоящий сервер
+                    response.close()
+                latencies.append(time.perf_counter() - started)
+                if not statuses[0].startswith('200'):
+                    errors.append(statuses[0])
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for future in [executor.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return time.perf_counter() - started, latencies, len(errors)
+
+
+async def run_asgi(jobs, concurrency, host):
+    """
+    То же для ASGI: concurrency задач в одном цикле событий.
+    """
+    handler = ASGIHandler()
+    pending = iter(jobs)
+    latencies, errors = [], []
+
+    async def request(path):
+        path, query = _split(path)
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(b'host', host.encode())],
+            'client': ('127.0.0.1', 0),
+            'server': (host, 80),
+        }
+        messages = iter([{'type': 'http.request', 'body': b'', 'more_body': False}])
+        status = []
+
+        async def receive():
+            message = next(messages, None)
+            if message is None:
+                # Клиент не отключается: ждём, пока обработчик не отменит ожидание
+                await asyncio.Event().wait()
+            return message
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await handler(scope, receive, send)
+        return status[0]
+
+    async def worker():
+        for path in pending:
+            started = time.perf_counter()
+            status = await request(path)
+            latencies.append(time.perf_counter() - started)
+            if status != 200:
+                errors.append(status)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return time.perf_counter() - started, latencies, len(errors)
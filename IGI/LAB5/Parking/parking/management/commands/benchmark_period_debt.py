@@ -0,0 +1,82 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from parking.analytics import period_debt_report, period_total_debt
+from parking.models import Car, Invoice, ParkingSpot
+
+from .benchmark_asgi import percentile
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет отчёты о долгах за период (period_total_debt и '
+        'period_debt_report) на году счетов. Данные создаются в транзакции, '
+        'которая откатывается после замера'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=365, help='Дней со счетами')
+        parser.add_argument('--per-day', type=int, default=100, help='Счетов в день')
+        parser.add_argument('--cars', type=int, default=500, help='Автомобилей и мест')
+        parser.add_argument('--repeat', type=int, default=20, help='Повторов каждого отчёта')
+
+    def handle(self, *args, **options):
+        if min(options['days'], options['per_day'], options['cars'], options['repeat']) < 1:
+            raise CommandError('Все параметры должны быть положительными')
+        try:
+            with transaction.atomic():
+                start, end = seed(options['days'], options['per_day'], options['cars'])
+                reports = {
+                    'total': lambda: period_total_debt(start, end),
+                    'report': lambda: period_debt_report(start, end),
+                }
+                results = {name: measure(report, options['repeat']) for name, report in reports.items()}
+                raise _Rollback
+        except _Rollback:
+            pass
+
+        self.stdout.write(f"{options['days'] * options['per_day']} счетов за {options['days']} дн.")
+        self.stdout.write(f"{'':8}{'p50, мс':>10}{'p95, мс':>10}")
+        for name, latencies in results.items():
+            self.stdout.write(f'{name:8}{percentile(latencies, 50):10.2f}{percentile(latencies, 95):10.2f}')
+
+
+def seed(days, per_day, cars):
+    """
+    Счета по per_day в день за days дней до сегодняшнего; возвращает период.
+    """
+    end = date.today()
+    start = end - timedelta(days=days - 1)
+    new_cars = Car.objects.bulk_create(
+        Car(license_plate=f'BENCH-{i}', brand='Bench', model='Car') for i in range(cars)
+    )
+    spots = ParkingSpot.objects.bulk_create(
+        ParkingSpot(number=1_000_000 + i, price=5) for i in range(cars)
+    )
+    Invoice.objects.bulk_create(
+        (
+            Invoice(
+                code=f'B{day * per_day + i:07x}', car=new_cars[i % cars], parking_spot=spots[(day + i) % cars],
+                spot_price=5, issue_date=start + timedelta(days=day), debt=(day + i) % 7,
+            )
+            for day in range(days) for i in range(per_day)
+        ),
+        batch_size=1000,
+    )
+    return start, end
+
+
+def measure(report, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        report()
+        latencies.append(time.perf_counter() - started)
+    return latencies
@@ -0,0 +1,152 @@
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from .benchmark_asgi import percentile
+
+ROWS = 10000
+READ_RANGE = 100
+# Значения Django и SQLite по умолчанию: журнал DELETE, synchronous=FULL,
+# timeout 5 с и новое подключение на каждый запрос (CONN_MAX_AGE = 0)
+DEFAULT_PROFILE = {'pragmas': {}, 'timeout': 5, 'persistent': False}
+
+
+def tuned_profile():
+    # Подключения постоянные, как под WSGI (Parking/wsgi.py)
+    database = settings.DATABASES['default']
+    return {
+        'pragmas': getattr(settings, 'SQLITE_PRAGMAS', {}),
+        'timeout': database.get('OPTIONS', {}).get('timeout', 5),
+        'persistent': True,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite с настройками по умолчанию и с '
+        'профилем из settings (SQLITE_PRAGMAS, timeout, постоянные подключения) под '
+        'одновременными чтениями и записями. Нагрузка идёт на временную базу: '
+        'читатели выбирают диапазоны строк, писатели обновляют строку сессии '
+        'в транзакции BEGIN IMMEDIATE, как SESSION_SAVE_EVERY_REQUEST'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help='Потоков чтения')
+        parser.add_argument('--writers', type=int, default=4, help='Потоков записи')
+        parser.add_argument('--seconds', type=float, default=5.0, help='Длительность замера каждого профиля')
+
+    def handle(self, *args, **options):
+        if options['readers'] < 0 or options['writers'] < 0 or options['readers'] + options['writers'] < 1:
+            raise CommandError('Нужен хотя бы один поток чтения или записи')
+        if options['seconds'] <= 0:
+            raise CommandError('--seconds должно быть положительным')
+
+        profiles = {'default': DEFAULT_PROFILE, 'tuned': tuned_profile()}
+        self.stdout.write(
+            f"Потоков: чтение {options['readers']}, запись {options['writers']}; {options['seconds']:g} с на профиль"
+        )
+        self.stdout.write(
+            f"{'':8}{'чтений/с':>10}{'записей/с':>11}{'p95 чт, мс':>12}{'p95 зап, мс':>13}{'ошибки':>8}"
+        )
+        for name, profile in profiles.items():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                seed(path)
+                result = run(path, profile, options['readers'], options['writers'], options['seconds'])
+            reads, writes, errors = result['reads'], result['writes'], result['errors']
+            self.stdout.write(
+                f"{name:8}{len(reads) / result['elapsed']:10.1f}{len(writes) / result['elapsed']:11.1f}"
+                f'{percentile(reads, 95):12.2f}{percentile(writes, 95):13.2f}{errors:8}'
+            )
+
+
+def seed(path):
+    """
+    Таблица мест для чтения и таблица сессий для записи, по ROWS строк.
+    """
+    with sqlite3.connect(path) as db:
+        db.execute('CREATE TABLE spot (id INTEGER PRIMARY KEY, number INTEGER, price REAL, is_occupied INTEGER)')
+        db.execute('CREATE TABLE session (session_key TEXT PRIMARY KEY, session_data TEXT, expire_date TEXT)')
+        db.executemany(
+            'INSERT INTO spot VALUES (?, ?, ?, ?)',
+            ((i, i, 5 + i % 20, i % 3 == 0) for i in range(1, ROWS + 1)),
+        )
+        db.executemany(
+            'INSERT INTO session VALUES (?, ?, ?)',
+            ((f'key{i}', 'x' * 200, '') for i in range(ROWS)),
+        )
+    db.close()
+
+
+def connect(path, profile):
+    db = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None, check_same_thread=False)
+    for pragma, value in profile['pragmas'].items():
+        db.execute(f'PRAGMA {pragma}={value}')
+    return db
+
+
+def run(path, profile, readers, writers, seconds):
+    """
+    Потоки читают и пишут до истечения seconds. Без persistent каждая операция
+    открывает своё подключение, как запрос при CONN_MAX_AGE = 0.
+    """
+    reads, writes, errors = [], [], []
+    deadline = time.perf_counter() + seconds
+    # Режим WAL хранится в файле базы: включаем его до старта потоков
+    connect(path, profile).close()
+
+    def read(db, rng):
+        low = rng.randrange(1, ROWS - READ_RANGE)
+        db.execute(
+            'SELECT id, number, price FROM spot WHERE id BETWEEN ? AND ? AND is_occupied = 0',
+            (low, low + READ_RANGE),
+        ).fetchall()
+
+    def write(db, rng):
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(
+                'UPDATE session SET session_data = ?, expire_date = ? WHERE session_key = ?',
+                ('y' * 200, time.time(), f'key{rng.randrange(ROWS)}'),
+            )
+            db.execute('COMMIT')
+        except BaseException:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            raise
+
+    def worker(operation, latencies):
+        rng = random.Random()
+        db = connect(path, profile) if profile['persistent'] else None
+        try:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                current = db or connect(path, profile)
+                try:
+                    operation(current, rng)
+                except sqlite3.OperationalError:
+                    # database is locked: блокировку не дождались за timeout
+                    errors.append(1)
+                    continue
+                finally:
+                    if current is not db:
+                        current.close()
+                latencies.append(time.perf_counter() - started)
+        finally:
+            if db is not None:
+                db.close()
+
+    threads = [threading.Thread(target=worker, args=(read, reads)) for _ in range(readers)]
+    threads += [threading.Thread(target=worker, args=(write, writes)) for _ in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {'elapsed': time.perf_counter() - started, 'reads': reads, 'writes': writes, 'errors': len(errors)}
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from parking import export
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка счетов, клиентов или доходов в CSV или JSONL для бухгалтерии'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=sorted(export.EXPORTS), help='Что выгружать')
+        parser.add_argument('--format', choices=sorted(export.FORMATS), default='csv')
+        parser.add_argument('--start', help='Начальная дата ГГГГ-ММ-ДД (включительно)')
+        parser.add_argument('--end', help='Конечная дата ГГГГ-ММ-ДД (включительно)')
+        parser.add_argument('--status', help='Фильтр статуса (например, paid, unpaid, debt для счетов)')
+        parser.add_argument('--output', help='Файл для записи (по умолчанию stdout)')
+
+    def handle(self, *args, **options):
+        report = export.ExportReport()
+        try:
+            rows = export.rows(
+                options['name'],
+                start=export.parse_day(options['start']),
+                end=export.parse_day(options['end']),
+                status=options['status'],
+            )
+            content = export.stream(options['name'], rows, options['format'], report=report)
+        except export.ExportError as e:
+            raise CommandError(str(e))
+
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in content:
+                    output.write(chunk)
+        else:
+            # Куски заканчиваются на границе строки, поэтому декодируются целиком
+            for chunk in content:
+                self.stdout.write(chunk.decode(), ending='')
+        self.stderr.write(f'Выгружено: {report}')
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from parking import overdue
+
+
+class Command(BaseCommand):
+    help = (
+        'Отмечает долгом неоплаченные счета старше 30 дней порциями с сохранением '
+        'позиции (запускается по расписанию, например раз в сутки из cron)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=overdue.DEFAULT_CHUNK_SIZE, help='Счетов в одной транзакции')
+        parser.add_argument('--restart', action='store_true', help='Начать с начала, не продолжая с сохранённой позиции')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size должен быть положительным')
+
+        def report(progress):
+            if options['verbosity'] >= 1:
+                self.stdout.write(
+                    f'Просмотрено {progress.processed}/{progress.total}, '
+                    f'отмечено долгом {progress.marked} (до #{progress.last_id})'
+                )
+
+        progress = overdue.mark_overdue(chunk_size=options['chunk_size'], restart=options['restart'], report=report)
+        self.stdout.write(self.style.SUCCESS(f'Готово: отмечено долгом {progress.marked} счетов'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from parking import ownership
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает проекцию владения машинами (ключи марок и число владельцев) с нуля'
+
+    def handle(self, *args, **options):
+        cars = ownership.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Проекция владения пересчитана: {cars} машин'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from parking import stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает инкрементальную статистику (аренда, возраст клиентов, прибыль мест) с нуля'
+
+    def handle(self, *args, **options):
+        buckets = stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Статистика пересчитана: {buckets} корзин'))
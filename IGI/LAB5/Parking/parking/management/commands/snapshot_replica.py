@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from parking import replica
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу в реплику для отчётов (online backup API SQLite)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, help='Повторять каждые столько секунд, пока не прервут')
+
+    def handle(self, *args, **options):
+        if replica.is_mirror():
+            raise CommandError('Реплика не настроена или совпадает с основной базой')
+        interval = options['interval']
+        if interval is not None and interval <= 0:
+            raise CommandError('--interval должен быть положительным')
+        while True:
+            started = time.perf_counter()
+            replica.snapshot()
+            self.stdout.write(f'Снимок обновлён за {time.perf_counter() - started:.2f} с')
+            if interval is None:
+                return
+            time.sleep(max(interval - (time.perf_counter() - started), 0))
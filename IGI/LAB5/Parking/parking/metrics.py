@@ -0,0 +1,178 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.template.backends.django import Template
+
+logger = logging.getLogger(__name__)
+
+# Метрика Prometheus -> (поле RequestMetrics, тип, описание)
+METRICS = {
+    'parking_requests_total': ('requests', 'counter', 'Количество запросов'),
+    'parking_sql_queries_total': ('queries', 'counter', 'Количество SQL-запросов'),
+    'parking_sql_seconds_total': ('sql_seconds', 'counter', 'Время SQL-запросов, с'),
+    'parking_template_seconds_total': ('template_seconds', 'counter', 'Время рендеринга шаблонов без SQL, с'),
+    'parking_python_seconds_total': ('python_seconds', 'counter', 'Время Python без SQL и шаблонов, с'),
+    'parking_request_seconds_total': ('seconds', 'counter', 'Полное время обработки запроса, с'),
+}
+
+_current = ContextVar('parking_request_metrics', default=None)
+_lock = threading.Lock()
+_totals = {}
+
+
+class BudgetExceeded(AssertionError):
+    pass
+
+
+@dataclass
+class RequestMetrics:
+    view: str = 'unresolved'
+    requests: int = 1
+    queries: int = 0
+    sql_seconds: float = 0.0
+    template_seconds: float = 0.0
+    seconds: float = 0.0
+    rendering: bool = False
+
+    @property
+    def python_seconds(self):
+        return max(self.seconds - self.sql_seconds - self.template_seconds, 0.0)
+
+
+def current():
+    """
+    Метрики текущего запроса или None вне InstrumentationMiddleware.
+    """
+    return _current.get()
+
+
+def _execute(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.sql_seconds += time.perf_counter() - started
+
+
+def _track(connection, **kwargs):
+    """
+    Ставит на подключение постоянную обёртку execute. Подключения свои у
+    каждого потока (в том числе у потоков sync_to_async под ASGI), а метрики
+    запроса обёртка берёт из контекстной переменной, которая в эти потоки
+    копируется, поэтому учитываются запросы из любого потока запроса.
+    """
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+_render = Template.render
+
+
+def _timed_render(self, context=None, request=None):
+    metrics = _current.get()
+    # Вложенные render_to_string уже учтены во внешнем рендеринге
+    if metrics is None or metrics.rendering:
+        return _render(self, context, request)
+    metrics.rendering = True
+    started, sql_before = time.perf_counter(), metrics.sql_seconds
+    try:
+        return _render(self, context, request)
+    finally:
+        metrics.rendering = False
+        # Ленивые queryset выполняются во время рендеринга, их время уже в sql_seconds
+        metrics.template_seconds += time.perf_counter() - started - (metrics.sql_seconds - sql_before)
+
+
+def install():
+    if Template.render is not _timed_render:
+        Template.render = _timed_render
+    connection_created.connect(_track, dispatch_uid='parking.metrics')
+
+
+@contextmanager
+def measure():
+    """
+    Собирает количество и время SQL-запросов (на всех подключениях),
+    время рендеринга шаблонов и полное время блока.
+    """
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    # Подключения, открытые до install(), сигнал connection_created не застал
+    for connection in connections.all(initialized_only=True):
+        _track(connection)
+    started = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        metrics.seconds = time.perf_counter() - started
+        _current.reset(token)
+
+
+def record(metrics):
+    with _lock:
+        totals = _totals.setdefault(metrics.view, dict.fromkeys((field for field, _, _ in METRICS.values()), 0))
+        for field in totals:
+            totals[field] += getattr(metrics, field)
+
+
+def reset():
+    with _lock:
+        _totals.clear()
+
+
+def snapshot():
+    with _lock:
+        return {view: dict(totals) for view, totals in _totals.items()}
+
+
+def check_budget(metrics):
+    """
+    Сравнивает запрос с бюджетом из METRICS_BUDGETS (по имени URL, '*' — для
+    остальных). При METRICS_STRICT_BUDGETS превышение — ошибка, иначе предупреждение.
+    """
+    budgets = getattr(settings, 'METRICS_BUDGETS', {})
+    budget = budgets.get(metrics.view, budgets.get('*'))
+    if not budget:
+        return
+    problems = []
+    if 'queries' in budget and metrics.queries > budget['queries']:
+        problems.append(f"{metrics.queries} SQL-запросов при бюджете {budget['queries']}")
+    if 'seconds' in budget and metrics.seconds > budget['seconds']:
+        problems.append(f"{metrics.seconds:.3f} с при бюджете {budget['seconds']} с")
+    if not problems:
+        return
+    message = f"View {metrics.view} exceeded its budget: {'; '.join(problems)}"
+    if getattr(settings, 'METRICS_STRICT_BUDGETS', False):
+        raise BudgetExceeded(message)
+    logger.warning(message)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus():
+    """
+    Накопленные метрики в текстовом формате Prometheus.
+    """
+    totals = snapshot()
+    lines = []
+    for name, (field, kind, description) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for view in sorted(totals):
+            value = totals[view][field]
+            value = value if isinstance(value, int) else f'{value:.6f}'
+            lines.append(f'{name}{{view="{_escape(view)}"}} {value}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,85 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.sessions.middleware import SessionMiddleware as BaseSessionMiddleware
+from django.utils.functional import SimpleLazyObject
+
+from . import metrics
+from .roles import get_roles
+
+
+class RoleMiddleware:
+    """
+    Добавляет ленивый request.roles: группы пользователя загружаются
+    только при первом обращении и не больше одного раза за запрос.
+    Под ASGI работает без переключения в поток (get_response — корутина).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.roles = SimpleLazyObject(lambda: get_roles(request.user))
+        return self.get_response(request)
+
+
+class SessionMiddleware(BaseSessionMiddleware):
+    """
+    SessionMiddleware, который вместо сохранения сессии на каждый запрос
+    (SESSION_SAVE_EVERY_REQUEST) даёт хранилищу решить, нужна ли запись:
+    parking.sessions.SessionStore пишет в базу не чаще раза в пол-срока.
+    """
+
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        touch = getattr(session, 'touch', None)
+        if touch is not None and not session.modified and not session.is_empty() and response.status_code != 500:
+            touch()
+        return super().process_response(request, response)
+
+
+class InstrumentationMiddleware:
+    """
+    Считает для каждого запроса SQL-запросы и их время, время шаблонов и
+    Python, копит итоги по имени URL (отдаются на /metrics) и проверяет
+    бюджеты из METRICS_BUDGETS. Ставится первой, чтобы учитывать запросы
+    сессий и аутентификации.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        metrics.install()
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        with metrics.measure() as measured:
+            response = self.get_response(request)
+        return self.finish(request, measured, response)
+
+    async def __acall__(self, request):
+        # Подключения к базе общие для контекста запроса, поэтому обёртка
+        # execute видит и запросы из sync_to_async
+        with metrics.measure() as measured:
+            response = await self.get_response(request)
+        return self.finish(request, measured, response)
+
+    def finish(self, request, measured, response):
+        match = request.resolver_match
+        if match is not None:
+            measured.view = match.view_name
+        metrics.record(measured)
+        response['Server-Timing'] = ', '.join((
+            f'sql;dur={measured.sql_seconds * 1000:.1f};desc="{measured.queries} queries"',
+            f'tpl;dur={measured.template_seconds * 1000:.1f}',
+            f'py;dur={measured.python_seconds * 1000:.1f}',
+        ))
+        metrics.check_budget(measured)
+        return response
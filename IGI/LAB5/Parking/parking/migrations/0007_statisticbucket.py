@@ -0,0 +1,48 @@
+# Generated by Django 5.2.1 on 2026-10-17 19:57
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_buckets(apps, schema_editor):
+    # Начальное заполнение по существующим счетам и клиентам, как stats.rebuild()
+    StatisticBucket = apps.get_model('parking', 'StatisticBucket')
+    Invoice = apps.get_model('parking', 'Invoice')
+    Client = apps.get_model('parking', 'Client')
+    sources = [
+        ('rental', Invoice.objects.values_list('spot_price').annotate(count=Count('id'), total=Sum('spot_price'))),
+        ('spot', Invoice.objects.values_list('parking_spot').annotate(count=Count('id'), total=Sum('spot_price'))),
+        ('age', Client.objects.values_list('age').annotate(count=Count('id'), total=Sum('age'))),
+    ]
+    StatisticBucket.objects.bulk_create(
+        [
+            StatisticBucket(metric=metric, key=key, count=count, total=total)
+            for metric, rows in sources
+            for key, count, total in rows.order_by()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0006_article_employeecontact_jobvacancy_term_review'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatisticBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('rental', 'Стоимость аренды'), ('age', 'Возраст клиента'), ('spot', 'Прибыль парковочного места')], max_length=20)),
+                ('key', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('metric', 'key'), name='unique_statistic_bucket')],
+            },
+        ),
+        migrations.RunPython(fill_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:00
+
+from django.db import migrations, models
+
+
+def fill_rollups(apps, schema_editor):
+    from parking import rollups
+
+    rollups.rebuild(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0007_statisticbucket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyParkingStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('profit', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('new_clients', models.IntegerField(default=0)),
+                ('unpaid_invoices', models.IntegerField(default=0)),
+                ('debt', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+        ),
+        migrations.RunPython(fill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0010_overdue_checkpoints'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['-issue_date', '-id'], name='invoice_issue_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['car', '-issue_date', '-id'], name='invoice_car_issue_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('payment_date__isnull', True)), fields=['issue_date'], name='invoice_unpaid_issue_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('payment_date__isnull', True)), fields=['parking_spot'], name='invoice_unpaid_spot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(condition=models.Q(('debt__gt', 0)), fields=['car', 'debt'], name='invoice_debt_car_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingspot',
+            index=models.Index(condition=models.Q(('is_occupied', True)), fields=['number', 'car'], name='spot_occupied_number_car_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='parkingspot',
+            index=models.Index(condition=models.Q(('is_occupied', True)), fields=['car'], name='spot_parked_car_idx'),
+        ),
+    ]
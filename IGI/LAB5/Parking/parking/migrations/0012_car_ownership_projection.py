@@ -0,0 +1,47 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:42
+
+from django.db import migrations, models
+from django.db.models import Count
+
+from parking.models import normalize_brand
+
+
+def fill_projection(apps, schema_editor):
+    Car = apps.get_model('parking', 'Car')
+    counts = dict(
+        Car.clients.through.objects.values('car').annotate(count=Count('pk')).values_list('car', 'count').order_by()
+    )
+    cars = list(Car.objects.only('id', 'brand'))
+    for car in cars:
+        car.brand_key = normalize_brand(car.brand)
+        car.owner_count = counts.get(car.pk, 0)
+    Car.objects.bulk_update(cars, ['brand_key', 'owner_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0011_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='car',
+            name='brand_key',
+            field=models.CharField(default='', editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='car',
+            name='owner_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(fields=['brand_key', 'license_plate'], name='car_brand_key_plate_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='car',
+            index=models.Index(condition=models.Q(('owner_count__gt', 1)), fields=['-owner_count', 'id'], name='car_multi_owner_idx'),
+        ),
+        migrations.RunPython(fill_projection, migrations.RunPython.noop),
+    ]
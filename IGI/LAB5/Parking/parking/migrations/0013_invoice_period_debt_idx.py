@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0012_car_ownership_projection'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['issue_date', 'car', 'parking_spot', 'debt'], name='invoice_period_debt_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:05
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def fill_summaries(apps, schema_editor):
+    # Итоги по уже заполненным корзинам, как stats.rebuild(): строка есть у
+    # каждой метрики, поэтому учёт значений обходится одним UPDATE
+    StatisticBucket = apps.get_model('parking', 'StatisticBucket')
+    StatisticSummary = apps.get_model('parking', 'StatisticSummary')
+    totals = dict.fromkeys(['rental', 'age', 'spot'], (0, 0))
+    rows = StatisticBucket.objects.filter(count__gt=0).values_list('metric').annotate(count=Sum('count'), total=Sum('total'))
+    totals.update((metric, (count, total)) for metric, count, total in rows.order_by())
+    StatisticSummary.objects.bulk_create(
+        StatisticSummary(metric=metric, count=count, total=total) for metric, (count, total) in totals.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parking', '0013_invoice_period_debt_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatisticSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('rental', 'Стоимость аренды'), ('age', 'Возраст клиента'), ('spot', 'Прибыль парковочного места')], max_length=20, unique=True)),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='statisticbucket',
+            index=models.Index(fields=['metric', '-count', 'key'], name='statistic_bucket_mode_idx'),
+        ),
+        migrations.RunPython(fill_summaries, migrations.RunPython.noop),
+    ]
@@ -29,21 +29,63 @@ class Employee(models.Model):
     def __str__(self):
         return self.name
 
+def normalize_brand(brand):
+    # Ключ марки для поиска: без лишних пробелов и регистра (в том числе
+    # для кириллицы, которую LIKE в SQLite сравнивает с учётом регистра)
+    return ' '.join(brand.split()).casefold()
+
+
 class Car(models.Model):
     license_plate = models.CharField(max_length=20, unique=True)
     brand = models.CharField(max_length=50)
     model = models.CharField(max_length=50)
     clients = models.ManyToManyField(Client, related_name='cars')
+    # Проекция для отчётов (parking/ownership.py): ключ марки пишется в save(),
+    # число владельцев — сигналом m2m_changed на clients
+    brand_key = models.CharField(max_length=50, default='', editable=False)
+    owner_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Машины марки по номеру и поиск марок по префиксу ключа
+            models.Index(fields=['brand_key', 'license_plate'], name='car_brand_key_plate_idx'),
+            # Машины с несколькими владельцами, сначала с наибольшим числом
+            models.Index(
+                fields=['-owner_count', 'id'], name='car_multi_owner_idx',
+                condition=models.Q(owner_count__gt=1),
+            ),
+        ]
 
     def __str__(self):
         return f"{self.brand} {self.model} ({self.license_plate})"
 
+    def save(self, *args, **kwargs):
+        self.brand_key = normalize_brand(self.brand)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'brand' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'brand_key'}
+        super().save(*args, **kwargs)
+
 class ParkingSpot(models.Model):
     number = models.PositiveIntegerField(unique=True, validators=[MaxValueValidator(999)])
     price = models.DecimalField(max_digits=10, decimal_places=2)
     is_occupied = models.BooleanField(default=False)
     car = models.ForeignKey(Car, on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        # Django сравнивает is_occupied=True как голый столбец ("is_occupied"),
+        # а по такому условию SQLite не использует индекс с ведущим булевым
+        # полем, поэтому индексы по занятым местам частичные
+        indexes = [
+            # Занятые места по номеру с машиной (панели)
+            models.Index(
+                fields=['number', 'car'], name='spot_occupied_number_car_idx',
+                condition=models.Q(is_occupied=True),
+            ),
+            # «Стоит ли машина уже на каком-то месте» при занятии места
+            models.Index(fields=['car'], name='spot_parked_car_idx', condition=models.Q(is_occupied=True)),
+        ]
+
     def __str__(self):
         return f"Место {self.number}"
 
@@ -58,6 +100,36 @@ class Invoice(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)  # Дата создания
     updated_at = models.DateTimeField(auto_now=True)     # Дата последнего изменения
 
+    class Meta:
+        indexes = [
+            # Кандидаты в долги для пакетной обработки (parking/overdue.py):
+            # отмеченные и оплаченные счета в индекс не попадают
+            models.Index(
+                fields=['id'], name='invoice_unpaid_no_debt_idx',
+                condition=models.Q(payment_date__isnull=True, debt=0),
+            ),
+            # Списки счетов на панелях (новые сверху) и отчёты за период issue_date
+            models.Index(fields=['-issue_date', '-id'], name='invoice_issue_id_idx'),
+            models.Index(fields=['car', '-issue_date', '-id'], name='invoice_car_issue_id_idx'),
+            # Долги за период (parking/analytics.py): суммы по диапазону
+            # issue_date читаются из индекса, без обращения к строкам таблицы
+            models.Index(fields=['issue_date', 'car', 'parking_spot', 'debt'], name='invoice_period_debt_idx'),
+            # Неоплаченные счета: по дате выставления и по месту (освобождение места)
+            models.Index(
+                fields=['issue_date'], name='invoice_unpaid_issue_idx',
+                condition=models.Q(payment_date__isnull=True),
+            ),
+            models.Index(
+                fields=['parking_spot'], name='invoice_unpaid_spot_idx',
+                condition=models.Q(payment_date__isnull=True),
+            ),
+            # Долги по машинам (должники на панелях)
+            models.Index(
+                fields=['car', 'debt'], name='invoice_debt_car_idx',
+                condition=models.Q(debt__gt=0),
+            ),
+        ]
+
     def __str__(self):
         return f"Invoice {self.code}"
 
@@ -106,6 +178,11 @@ class Article(models.Model):
     image_url = models.URLField(blank=True, null=True)
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='article_created_id_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -114,6 +191,11 @@ class Term(models.Model):
     definition = models.TextField()
     added_date = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-added_date', '-id'], name='term_added_id_idx'),
+        ]
+
     def __str__(self):
         return self.term
 
@@ -132,6 +214,11 @@ class JobVacancy(models.Model):
     description = models.TextField()
     posted_date = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-posted_date', '-id'], name='jobvacancy_posted_id_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -141,5 +228,81 @@ class Review(models.Model):
     text = models.TextField()
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='review_created_id_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='review_user_created_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.rating} stars"
+
+class StatisticBucket(models.Model):
+    """
+    Корзина гистограммы для инкрементальной статистики (см. parking/stats.py):
+    сколько раз встретилось значение key метрики metric и их сумма.
+    """
+    RENTAL = 'rental'
+    AGE = 'age'
+    SPOT = 'spot'
+    METRIC_CHOICES = [
+        (RENTAL, 'Стоимость аренды'),
+        (AGE, 'Возраст клиента'),
+        (SPOT, 'Прибыль парковочного места'),
+    ]
+
+    metric = models.CharField(max_length=20, choices=METRIC_CHOICES)
+    key = models.DecimalField(max_digits=12, decimal_places=2)
+    count = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['metric', 'key'], name='unique_statistic_bucket'),
+        ]
+        indexes = [
+            # Мода метрики — первая запись индекса, без просмотра всех корзин
+            models.Index(fields=['metric', '-count', 'key'], name='statistic_bucket_mode_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.metric}[{self.key}] = {self.count}"
+
+class StatisticSummary(models.Model):
+    """
+    Нарастающие итоги метрики по всем её корзинам: количество значений и их
+    сумма (см. parking/stats.py), чтобы среднее не требовало чтения корзин.
+    """
+    metric = models.CharField(max_length=20, choices=StatisticBucket.METRIC_CHOICES, unique=True)
+    count = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.metric}: {self.count}"
+
+class DailyParkingStats(models.Model):
+    """
+    Дневной срез для графиков панелей (см. parking/rollups.py): прибыль по оплаченным
+    счетам, новые клиенты, неоплаченные счета и долги за дату выставления счёта.
+    """
+    date = models.DateField(unique=True)
+    profit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    new_clients = models.IntegerField(default=0)
+    unpaid_invoices = models.IntegerField(default=0)
+    debt = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"Статистика за {self.date}"
+
+class BatchCheckpoint(models.Model):
+    """
+    Позиция пакетной задачи (см. parking/overdue.py): после сбоя задача
+    продолжает с last_id, если дата отсечения cutoff не изменилась.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    cutoff = models.DateField()
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
     def __str__(self):
-        return f"{self.user.username} - {self.rating} stars"
\ No newline at end of file
+        return f"{self.name}: {self.cutoff} после #{self.last_id}"
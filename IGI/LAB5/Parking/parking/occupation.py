@@ -0,0 +1,273 @@
+from dataclasses import dataclass, replace
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from . import availability, overdue, rollups, stats
+from .models import Car, Invoice, ParkingSpot
+
+CODE_LENGTH = 8
+CODE_ATTEMPTS = 5
+# Максимальное число элементов в одном пакетном запросе
+BATCH_LIMIT = 200
+
+
+class OccupationError(Exception):
+    message = 'Не удалось занять место'
+
+    def __init__(self, message=None):
+        super().__init__(message or self.message)
+        self.message = message or self.message
+
+
+class NotCarOwner(OccupationError):
+    message = 'Этот автомобиль вам не принадлежит'
+
+
+class SpotTaken(OccupationError):
+    message = 'Место уже занято'
+
+
+class CarAlreadyParked(OccupationError):
+    message = 'Этот автомобиль уже занимает парковочное место'
+
+
+class SpotNotFound(OccupationError):
+    message = 'Место не найдено'
+
+
+class NotCarSpot(OccupationError):
+    message = 'Это место не занято вашим автомобилем'
+
+
+# Ошибка для корректных элементов пакета, отменённого целиком
+BATCH_ABORTED = 'Пакет отменён из-за ошибок в других элементах'
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    """
+    Результат одного элемента пакетной операции.
+    """
+    spot_id: int
+    car_id: int = None
+    ok: bool = False
+    invoice: str = None
+    error: str = None
+
+
+def new_invoice_code():
+    return get_random_string(length=CODE_LENGTH)
+
+
+def create_invoice(car, spot, attempts=CODE_ATTEMPTS):
+    """
+    Создаёт неоплаченный счёт за место. Случайный код может совпасть с уже
+    существующим — тогда попытка повторяется с новым кодом в своей точке
+    сохранения, не затрагивая остальную транзакцию.
+    """
+    for attempt in range(attempts):
+        try:
+            with transaction.atomic():
+                return Invoice.objects.create(
+                    code=new_invoice_code(),
+                    car=car,
+                    parking_spot=spot,
+                    spot_price=spot.price,
+                    issue_date=timezone.now().date(),
+                    payment_date=None,
+                    debt=0,
+                )
+        except IntegrityError:
+            if attempt == attempts - 1:
+                raise
+
+
+def occupy(spot_id, car_id, client=None):
+    """
+    Занимает место spot_id автомобилем car_id и выставляет счёт в одной
+    транзакции. Место захватывается условным UPDATE (только если оно свободно,
+    а автомобиль не стоит на другом месте), поэтому из параллельных запросов
+    на одно место успешен ровно один; остальные получают SpotTaken без
+    частичных изменений. Если задан client, автомобиль должен ему принадлежать.
+    """
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            # Блокировка строки автомобиля не даёт одной машине занять
+            # два разных места параллельно (на SQLite запись и так последовательна)
+            list(Car.objects.select_for_update().filter(pk=car_id).values_list('pk'))
+        candidates = ParkingSpot.objects.filter(pk=spot_id, is_occupied=False).exclude(
+            Exists(ParkingSpot.objects.filter(car_id=car_id, is_occupied=True))
+        )
+        if client is not None:
+            candidates = candidates.filter(
+                Exists(Car.clients.through.objects.filter(car_id=car_id, client=client))
+            )
+        if not candidates.update(is_occupied=True, car_id=car_id):
+            raise _rejection(spot_id, car_id, client)
+        availability.changed([spot_id])
+        spot = ParkingSpot.objects.select_related('car').get(pk=spot_id)
+        return create_invoice(spot.car, spot)
+
+
+def _rejection(spot_id, car_id, client):
+    if client is not None and not Car.clients.through.objects.filter(car_id=car_id, client=client).exists():
+        return NotCarOwner()
+    if ParkingSpot.objects.filter(car_id=car_id, is_occupied=True).exists():
+        return CarAlreadyParked()
+    return SpotTaken()
+
+
+def _locked_spots(spot_ids):
+    spots = ParkingSpot.objects.filter(pk__in=spot_ids)
+    if connection.features.has_select_for_update:
+        spots = spots.select_for_update()
+    return {spot.pk: spot for spot in spots}
+
+
+def _aborted(results):
+    # В режиме «всё или ничего» ничего не записано, корректные элементы тоже отклоняются
+    return [replace(result, ok=False, error=result.error or BATCH_ABORTED) for result in results]
+
+
+def create_invoices(invoices, attempts=CODE_ATTEMPTS):
+    """
+    bulk_create для счетов с уникальными случайными кодами: занятые коды
+    отсеиваются одним запросом, а гонка с параллельной вставкой повторяется
+    с новыми кодами.
+    """
+    for attempt in range(attempts):
+        codes = set()
+        while len(codes) < len(invoices):
+            codes.add(new_invoice_code())
+        taken = set(Invoice.objects.filter(code__in=codes).values_list('code', flat=True))
+        codes = list(codes - taken)
+        if len(codes) < len(invoices):
+            continue
+        for invoice, code in zip(invoices, codes):
+            invoice.code = code
+        try:
+            with transaction.atomic():
+                return Invoice.objects.bulk_create(invoices)
+        except IntegrityError:
+            if attempt == attempts - 1:
+                raise
+    raise IntegrityError('Не удалось подобрать уникальные коды счетов')
+
+
+def occupy_many(pairs, client=None, atomic=True):
+    """
+    Пакетно занимает места: pairs — список (car_id, spot_id). Владение всеми
+    автомобилями проверяется одним запросом, места обновляются bulk_update,
+    счета создаются bulk_create. При atomic=True ошибка в любом элементе
+    отменяет весь пакет, иначе выполняются только корректные элементы.
+    Возвращает BatchResult для каждой пары в исходном порядке.
+    """
+    car_ids = {car_id for car_id, _ in pairs}
+    with transaction.atomic():
+        spots = _locked_spots({spot_id for _, spot_id in pairs})
+        if client is not None:
+            allowed = Car.clients.through.objects.filter(client=client, car_id__in=car_ids).values_list('car_id', flat=True)
+        else:
+            allowed = Car.objects.filter(pk__in=car_ids).values_list('pk', flat=True)
+        allowed = set(allowed)
+        parked = set(
+            ParkingSpot.objects.filter(car_id__in=car_ids, is_occupied=True).values_list('car_id', flat=True)
+        )
+
+        results, claimed = [], []
+        for car_id, spot_id in pairs:
+            spot = spots.get(spot_id)
+            if car_id not in allowed:
+                error = NotCarOwner.message
+            elif spot is None:
+                error = SpotNotFound.message
+            elif spot.is_occupied:
+                error = SpotTaken.message
+            elif car_id in parked:
+                error = CarAlreadyParked.message
+            else:
+                error = None
+                spot.is_occupied, spot.car_id = True, car_id
+                parked.add(car_id)
+                claimed.append(spot)
+            results.append(BatchResult(spot_id=spot_id, car_id=car_id, ok=error is None, error=error))
+
+        if atomic and not all(result.ok for result in results):
+            return _aborted(results)
+
+        ParkingSpot.objects.bulk_update(claimed, ['is_occupied', 'car'])
+        availability.changed([spot.pk for spot in claimed])
+        today = timezone.now().date()
+        invoices = create_invoices([
+            Invoice(car_id=spot.car_id, parking_spot=spot, spot_price=spot.price, issue_date=today, debt=0)
+            for spot in claimed
+        ])
+        # bulk_create не отправляет сигналы, поэтому статистика и дневные
+        # срезы обновляются здесь
+        stats.track_invoices(invoices, 1)
+        rollups.track_invoices(invoices, 1)
+
+        codes = {invoice.parking_spot_id: invoice.code for invoice in invoices}
+        return [replace(result, invoice=codes[result.spot_id]) if result.ok else result for result in results]
+
+
+def release_many(spot_ids, client=None, atomic=True):
+    """
+    Пакетно освобождает места. Просроченный неоплаченный счёт места
+    (overdue.is_overdue) превращается в долг, более свежий удаляется
+    (как при освобождении одного места). Режимы atomic — как в occupy_many.
+    """
+    with transaction.atomic():
+        spots = _locked_spots(set(spot_ids))
+        if client is not None:
+            owned = set(
+                Car.clients.through.objects.filter(
+                    client=client, car_id__in={spot.car_id for spot in spots.values()},
+                ).values_list('car_id', flat=True)
+            )
+
+        results, released = [], []
+        for spot_id in spot_ids:
+            spot = spots.get(spot_id)
+            if spot is None:
+                error = SpotNotFound.message
+            elif not spot.is_occupied or spot.car_id is None or (client is not None and spot.car_id not in owned):
+                error = NotCarSpot.message
+            else:
+                error = None
+                spot.is_occupied = False
+                released.append(spot)
+            results.append(BatchResult(spot_id=spot_id, car_id=spot and spot.car_id, ok=error is None, error=error))
+
+        if atomic and not all(result.ok for result in results):
+            return _aborted(results)
+
+        # Первый неоплаченный счёт каждого места, как в free_parking_spot
+        invoices = {}
+        unpaid = Invoice.objects.filter(parking_spot__in=released, payment_date__isnull=True).order_by('pk')
+        for invoice in unpaid:
+            invoices.setdefault(invoice.parking_spot_id, invoice)
+
+        late, fresh = [], []
+        for invoice in invoices.values():
+            (late if overdue.is_overdue(invoice) else fresh).append(invoice)
+
+        for spot in released:
+            spot.car = None
+        ParkingSpot.objects.bulk_update(released, ['is_occupied', 'car'])
+        availability.changed([spot.pk for spot in released])
+
+        # bulk_update не отправляет сигналы: вклад счёта в срезы пересчитывается вручную
+        rollups.track_invoices(late, -1)
+        for invoice in late:
+            invoice.debt = invoice.spot_price
+        Invoice.objects.bulk_update(late, ['debt'])
+        rollups.track_invoices(late, 1)
+
+        if fresh:
+            # delete() отправляет сигналы удаления, они и обновляют статистику
+            Invoice.objects.filter(pk__in=[invoice.pk for invoice in fresh]).delete()
+        return results
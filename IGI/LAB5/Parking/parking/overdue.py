@@ -0,0 +1,86 @@
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import rollups
+from .models import BatchCheckpoint, Invoice
+
+# Через сколько полных дней неоплаченный счёт становится долгом
+OVERDUE_DAYS = 30
+DEFAULT_CHUNK_SIZE = 1000
+JOB_NAME = 'mark_overdue_invoices'
+
+
+def cutoff(now=None):
+    """
+    Счета, выставленные раньше этой даты, просрочены: с начала дня
+    выставления прошло больше OVERDUE_DAYS полных дней.
+    """
+    return timezone.localdate(now) - timedelta(days=OVERDUE_DAYS)
+
+
+def is_overdue(invoice, now=None):
+    return invoice.payment_date is None and invoice.issue_date < cutoff(now)
+
+
+def pending(cutoff_date):
+    """
+    Неоплаченные счета до cutoff_date, которые ещё не отмечены долгом.
+    Отмеченный счёт из выборки выпадает, поэтому повторный проход ничего не меняет.
+    """
+    return Invoice.objects.filter(payment_date__isnull=True, debt=0, spot_price__gt=0, issue_date__lt=cutoff_date)
+
+
+@dataclass
+class Progress:
+    """
+    Состояние прохода: просмотрено счетов из total, из них отмечено долгом.
+    """
+    total: int
+    processed: int = 0
+    marked: int = 0
+    last_id: int = 0
+
+
+def mark_overdue(chunk_size=DEFAULT_CHUNK_SIZE, now=None, restart=False, report=None):
+    """
+    Отмечает долгом (debt = spot_price) просроченные неоплаченные счета
+    порциями по chunk_size в порядке id. Каждая порция — один UPDATE по
+    диапазону id и обновление дневных срезов в той же транзакции, что и
+    сохранение позиции в BatchCheckpoint. После сбоя проход продолжается
+    с сохранённой позиции; для новой даты отсечения — с начала.
+    report(progress) вызывается после каждой порции.
+    """
+    limit = cutoff(now)
+    checkpoint, _ = BatchCheckpoint.objects.get_or_create(name=JOB_NAME, defaults={'cutoff': limit})
+    if restart or checkpoint.cutoff != limit:
+        checkpoint.cutoff, checkpoint.last_id = limit, 0
+        checkpoint.save(update_fields=['cutoff', 'last_id', 'updated_at'])
+
+    candidates = pending(limit)
+    progress = Progress(total=candidates.filter(pk__gt=checkpoint.last_id).count(), last_id=checkpoint.last_id)
+    while True:
+        with transaction.atomic():
+            ids = list(
+                candidates.filter(pk__gt=progress.last_id).order_by('pk').values_list('pk', flat=True)[:chunk_size]
+            )
+            if not ids:
+                break
+            chunk = candidates.filter(pk__gt=progress.last_id, pk__lte=ids[-1])
+            if connection.features.has_select_for_update:
+                # Счёт, оплаченный между подсчётом срезов и UPDATE, исказил бы срезы
+                list(chunk.select_for_update().values_list('pk'))
+            # update() не отправляет сигналы: вклад долгов в срезы добавляется здесь
+            for row in chunk.values('issue_date').annotate(debt=Sum('spot_price')).order_by():
+                rollups.bump(row['issue_date'], debt=row['debt'])
+            marked = chunk.update(debt=F('spot_price'), updated_at=timezone.now())
+            BatchCheckpoint.objects.filter(pk=checkpoint.pk).update(last_id=ids[-1], updated_at=timezone.now())
+        progress.processed += len(ids)
+        progress.marked += marked
+        progress.last_id = ids[-1]
+        if report is not None:
+            report(progress)
+    return progress
@@ -0,0 +1,78 @@
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .dashboards import owners_prefetch
+from .models import Car, normalize_brand
+
+# Верхняя граница диапазона ключей с заданным префиксом
+_PREFIX_END = '\U0010ffff'
+
+
+def _owner_count():
+    owners = (
+        Car.clients.through.objects.filter(car=OuterRef('pk'))
+        .order_by().values('car').annotate(count=Count('pk')).values('count')
+    )
+    return Coalesce(Subquery(owners, output_field=IntegerField()), Value(0))
+
+
+def recount(car_ids):
+    """
+    Пересчитывает owner_count машин car_ids одним UPDATE по таблице связей.
+    """
+    car_ids = list(car_ids)
+    if car_ids:
+        Car.objects.filter(pk__in=car_ids).update(owner_count=_owner_count())
+
+
+def rebuild():
+    """
+    Пересчитывает проекцию (ключи марок и число владельцев) для всех машин.
+    """
+    cars = list(Car.objects.only('id', 'brand', 'brand_key'))
+    for car in cars:
+        car.brand_key = normalize_brand(car.brand)
+    Car.objects.bulk_update(cars, ['brand_key'], batch_size=500)
+    Car.objects.update(owner_count=_owner_count())
+    return len(cars)
+
+
+def multi_owner_cars():
+    """
+    Машины с несколькими владельцами (сначала с наибольшим числом) и
+    владельцами в car.owners: два запроса, первый — по частичному индексу.
+    """
+    return (
+        Car.objects.filter(owner_count__gt=1)
+        .prefetch_related(owners_prefetch())
+        .order_by('-owner_count', 'id')
+    )
+
+
+def cars_of_brand(brand):
+    """
+    Машины марки brand без учёта регистра и лишних пробелов по номеру,
+    с владельцами в car.owners.
+    """
+    return (
+        Car.objects.filter(brand_key=normalize_brand(brand))
+        .prefetch_related(owners_prefetch())
+        .order_by('brand_key', 'license_plate')
+    )
+
+
+def find_brands(prefix, limit=10):
+    """
+    Марки, ключ которых начинается с prefix, по алфавиту: ключ, написание
+    марки и число машин. Префикс ищется диапазоном по индексу, а не LIKE,
+    который SQLite по индексу не выполняет.
+    """
+    key = normalize_brand(prefix)
+    cars = Car.objects.filter(brand_key__gte=key)
+    if key:
+        cars = cars.filter(brand_key__lt=key + _PREFIX_END)
+    return (
+        cars.values('brand_key')
+        .annotate(brand=Min('brand'), cars=Count('id'))
+        .order_by('brand_key')[:limit]
+    )
@@ -0,0 +1,161 @@
+import hashlib
+import re
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Max
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+from .roles import aload_user, get_roles
+
+# Токен CSRF в кэшированной странице заменяется заглушкой и подставляется
+# заново для каждого запроса, поэтому одну страницу можно отдавать всем
+# пользователям с одинаковой ролью
+CSRF_INPUT = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+CSRF_PLACEHOLDER = '__parking_csrf_token__'
+
+
+def page_cache():
+    return caches[getattr(settings, 'PAGE_CACHE_ALIAS', 'default')]
+
+
+def page_cache_timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', 3600)
+
+
+def role_variant(request):
+    user = request.user
+    if not user.is_authenticated:
+        return 'anonymous'
+    roles = get_roles(user)
+    if roles.is_admin:
+        return 'admin'
+    if roles.is_client:
+        return 'client'
+    if roles.is_employee:
+        return 'employee'
+    return 'user'
+
+
+def _version_key(section):
+    return f'page:{section}:version'
+
+
+def section_version(section):
+    """
+    Текущая версия раздела. Меняется при любом изменении его данных,
+    поэтому старые записи кэша просто перестают использоваться.
+    """
+    cache = page_cache()
+    version = cache.get(_version_key(section))
+    if version is None:
+        cache.add(_version_key(section), str(time.time_ns()), None)
+        version = cache.get(_version_key(section))
+    return version
+
+
+def invalidate_section(section):
+    page_cache().set(_version_key(section), str(time.time_ns()), None)
+
+
+def _digest(*parts):
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def _lookup(request, section):
+    variant = role_variant(request)
+    version = section_version(section)
+    path = request.get_full_path()
+    key = f'page:{section}:{version}:{variant}:{_digest(path)}'
+    return variant, version, path, key
+
+
+def _entry(response, last_modified):
+    content = response.content.decode(response.charset)
+    return {
+        'content': CSRF_INPUT.sub(rf'\g<1>{CSRF_PLACEHOLDER}\g<2>', content),
+        'content_type': response['Content-Type'],
+        'last_modified': last_modified.timestamp() if last_modified else None,
+    }
+
+
+def _cacheable(response):
+    return response.status_code == 200 and not response.streaming
+
+
+def _respond(request, entry, version, variant, path):
+    # Для вошедших пользователей страница содержит токен CSRF,
+    # поэтому ETag зависит и от их CSRF-куки
+    csrf_cookie = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '') if variant != 'anonymous' else ''
+    etag = quote_etag(_digest(version, variant, path, csrf_cookie))
+    last_modified = entry['last_modified']
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        content = entry['content']
+        if CSRF_PLACEHOLDER in content:
+            content = content.replace(CSRF_PLACEHOLDER, get_token(request))
+        response = HttpResponse(content, content_type=entry['content_type'])
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def cached_page(section, model=None, date_field=None):
+    """
+    Кэширует GET-ответы представления целиком с вариантами по роли пользователя
+    и поддерживает условные запросы (ETag по версии раздела, Last-Modified по
+    самой свежей дате date_field модели model). Работает и с async-представлениями:
+    кэш и база тогда используются через асинхронный API.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapped(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+
+                await aload_user(request)
+                # Группы пользователя и версия раздела загружаются синхронным API
+                variant, version, path, key = await sync_to_async(_lookup)(request, section)
+                cache = page_cache()
+                entry = await cache.aget(key)
+                if entry is None:
+                    response = await view(request, *args, **kwargs)
+                    if not _cacheable(response):
+                        return response
+                    latest = None
+                    if model is not None and date_field is not None:
+                        latest = (await model.objects.aaggregate(latest=Max(date_field)))['latest']
+                    entry = _entry(response, latest)
+                    await cache.aset(key, entry, page_cache_timeout())
+                return _respond(request, entry, version, variant, path)
+            return wrapped
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            variant, version, path, key = _lookup(request, section)
+            cache = page_cache()
+            entry = cache.get(key)
+            if entry is None:
+                response = view(request, *args, **kwargs)
+                if not _cacheable(response):
+                    return response
+                latest = None
+                if model is not None and date_field is not None:
+                    latest = model.objects.aggregate(latest=Max(date_field))['latest']
+                entry = _entry(response, latest)
+                cache.set(key, entry, page_cache_timeout())
+            return _respond(request, entry, version, variant, path)
+        return wrapped
+    return decorator
@@ -0,0 +1,86 @@
+import base64
+from dataclasses import dataclass
+from datetime import datetime
+
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class KeysetPage:
+    """
+    Страница keyset-пагинации: элементы и курсор следующей страницы (или None).
+    """
+    items: list
+    next_cursor: str
+    cursor: str
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(value, pk):
+    raw = f'{value.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        value, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(value), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(f'Некорректный курсор: {cursor}') from e
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    try:
+        return min(max(int(value), 1), MAX_PAGE_SIZE)
+    except (TypeError, ValueError):
+        return default
+
+
+def _after_cursor(queryset, date_field, cursor):
+    queryset = queryset.order_by(f'-{date_field}', '-id')
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__lt': value}) | Q(**{date_field: value, 'id__lt': pk})
+        )
+    return queryset
+
+
+def _page(items, date_field, cursor, per_page):
+    next_cursor = None
+    if len(items) > per_page:
+        items = items[:per_page]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, date_field), last.pk)
+    return KeysetPage(items=items, next_cursor=next_cursor, cursor=cursor)
+
+
+def keyset_paginate(queryset, date_field, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    """
+    Возвращает страницу queryset в порядке (date_field, id) по убыванию,
+    начиная после курсора. Вместо OFFSET используется условие
+    (date_field, id) < (значение, id) по составному индексу, поэтому
+    глубокие страницы стоят столько же, сколько первая.
+    """
+    queryset = _after_cursor(queryset, date_field, cursor)
+    return _page(list(queryset[:per_page + 1]), date_field, cursor, per_page)
+
+
+async def akeyset_paginate(queryset, date_field, cursor=None, per_page=DEFAULT_PAGE_SIZE):
+    """
+    Асинхронный вариант keyset_paginate для async-представлений.
+    """
+    queryset = _after_cursor(queryset, date_field, cursor)
+    items = [item async for item in queryset[:per_page + 1].aiterator()]
+    return _page(items, date_field, cursor, per_page)
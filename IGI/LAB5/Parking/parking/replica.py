@@ -0,0 +1,154 @@
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ALIAS': 'replica',
+    'REFRESH_INTERVAL': 60,  # реплика старше — обновляется в фоне
+    'MAX_LAG': 300,          # реплика старше — чтение идёт с основной базы
+}
+
+_reporting = ContextVar('parking_replica_reporting', default=False)
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='replica-snapshot')
+_lock = threading.Lock()
+_pending = None
+
+
+def get_setting(name):
+    return getattr(settings, 'REPLICA', {}).get(name, DEFAULTS[name])
+
+
+def _path(alias):
+    return str(connections[alias].settings_dict['NAME'])
+
+
+def is_mirror():
+    """
+    Реплики нет или это та же база (TEST MIRROR в тестах): читать с основной.
+    """
+    alias = get_setting('ALIAS')
+    return alias not in settings.DATABASES or _path(alias) == _path(DEFAULT_DB_ALIAS)
+
+
+def lag():
+    """
+    Возраст снимка в секундах, None — снимка ещё нет.
+    """
+    try:
+        return time.time() - os.stat(_path(get_setting('ALIAS'))).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def snapshot(source=None, target=None):
+    """
+    Копирует основную базу в реплику через online backup API SQLite. Копия
+    пишется во временный файл рядом и подменяет реплику атомарно, поэтому
+    читатели видят либо старый снимок, либо новый целиком. Копирование идёт
+    одним шагом в одной читающей транзакции: в режиме WAL оно не блокирует
+    писателей и не перезапускается от их записей.
+    """
+    source = source or _path(DEFAULT_DB_ALIAS)
+    target = target or _path(get_setting('ALIAS'))
+    fd, temporary = tempfile.mkstemp(prefix='.snapshot-', dir=os.path.dirname(os.path.abspath(target)))
+    os.close(fd)
+    try:
+        src = sqlite3.connect(source, timeout=connections[DEFAULT_DB_ALIAS].settings_dict['OPTIONS'].get('timeout', 5))
+        dst = sqlite3.connect(temporary)
+        try:
+            src.backup(dst)
+            # Реплика открывается только на чтение, поэтому без файлов WAL
+            dst.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            dst.close()
+            src.close()
+        os.replace(temporary, target)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def _refresh():
+    global _pending
+    try:
+        started = time.perf_counter()
+        snapshot()
+        logger.info('Снимок реплики обновлён за %.2f с', time.perf_counter() - started)
+    except Exception:
+        logger.exception('Не удалось обновить снимок реплики')
+    finally:
+        with _lock:
+            _pending = None
+
+
+def refresh_in_background():
+    """
+    Запускает обновление снимка, если оно ещё не идёт в этом процессе.
+    """
+    global _pending
+    with _lock:
+        if _pending is None:
+            _pending = _executor.submit(_refresh)
+        return _pending
+
+
+def read_alias():
+    """
+    База для отчётного чтения: реплика, если снимок не старше MAX_LAG, иначе
+    основная. Снимок старше REFRESH_INTERVAL обновляется в фоне, так что
+    реплика догоняет основную базу периодически, пока отчёты запрашивают.
+    """
+    if is_mirror():
+        return DEFAULT_DB_ALIAS
+    age = lag()
+    if age is None or age > get_setting('REFRESH_INTERVAL'):
+        refresh_in_background()
+    if age is None or age > get_setting('MAX_LAG'):
+        return DEFAULT_DB_ALIAS
+    return get_setting('ALIAS')
+
+
+@contextmanager
+def reporting():
+    """
+    Чтение моделей внутри блока (или декорированного синхронного
+    представления) идёт с реплики. Подходит только для отчётов, которым
+    не нужно видеть только что сделанные изменения.
+    """
+    token = _reporting.set(True)
+    try:
+        yield
+    finally:
+        _reporting.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Запись и обычное чтение — в основную базу, чтение внутри reporting() —
+    в реплику (см. read_alias). Миграции к реплике не применяются: её схема
+    приходит вместе со снимком.
+    """
+
+    def db_for_read(self, model, **hints):
+        if _reporting.get():
+            return read_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == get_setting('ALIAS'):
+            return False
+        return None
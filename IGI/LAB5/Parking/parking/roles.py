@@ -0,0 +1,79 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import cached_property
+
+CLIENT_GROUP = 'Client'
+EMPLOYEE_GROUP = 'Employee'
+
+
+def _cache_key(user_id):
+    return f'parking:roles:{user_id}'
+
+
+def cache_timeout():
+    # 0 отключает кэширование ролей между запросами
+    return getattr(settings, 'ROLE_CACHE_TIMEOUT', 0)
+
+
+class Roles:
+    """
+    Роли пользователя. Имена групп загружаются одним запросом при первом
+    обращении и дальше переиспользуются в рамках запроса.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def group_names(self):
+        if not self.user.is_authenticated:
+            return frozenset()
+        timeout = cache_timeout()
+        if timeout:
+            names = cache.get(_cache_key(self.user.pk))
+            if names is not None:
+                return names
+        names = frozenset(self.user.groups.values_list('name', flat=True))
+        if timeout:
+            cache.set(_cache_key(self.user.pk), names, timeout)
+        return names
+
+    @property
+    def is_admin(self):
+        return self.user.is_authenticated and self.user.is_superuser
+
+    @property
+    def is_client(self):
+        return CLIENT_GROUP in self.group_names
+
+    @property
+    def is_employee(self):
+        return EMPLOYEE_GROUP in self.group_names
+
+
+def get_roles(user):
+    """
+    Возвращает Roles, закреплённый за объектом пользователя: повторные проверки
+    в одном запросе (декораторы, представление, шаблон) не ходят в базу.
+    """
+    roles = getattr(user, '_parking_roles', None)
+    if roles is None:
+        roles = Roles(user)
+        user._parking_roles = roles
+    return roles
+
+
+async def aload_user(request):
+    """
+    Загружает пользователя в async-представлении и подставляет его
+    в request.user, чтобы шаблоны и проверки ролей не загружали его повторно.
+    """
+    request.user = await request.auser()
+    return request.user
+
+
+def invalidate(*user_ids):
+    """
+    Сбрасывает кэш ролей между запросами для указанных пользователей.
+    """
+    cache.delete_many([_cache_key(user_id) for user_id in user_ids])
@@ -0,0 +1,104 @@
+from decimal import Decimal
+
+from django.apps import apps as global_apps
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyParkingStats
+
+ZERO = Decimal('0')
+ROLLUP_FIELDS = ('profit', 'new_clients', 'unpaid_invoices', 'debt')
+
+
+def bump(day, **deltas):
+    """
+    Атомарно прибавляет deltas к строке DailyParkingStats за день day,
+    создавая её при необходимости.
+    """
+    deltas = {field: value for field, value in deltas.items() if value}
+    if not deltas:
+        return
+    rows = DailyParkingStats.objects.filter(date=day)
+    if rows.update(**{field: F(field) + value for field, value in deltas.items()}):
+        return
+    try:
+        with transaction.atomic():
+            DailyParkingStats.objects.create(date=day, **deltas)
+    except IntegrityError:
+        # Строку за этот день успел создать параллельный запрос
+        rows.update(**{field: F(field) + value for field, value in deltas.items()})
+
+
+def track_invoice(issue_date, payment_date, debt, spot_price, delta):
+    """
+    Учитывает (delta=1) или убирает (delta=-1) вклад счёта в срез за issue_date.
+    """
+    debt = Decimal(str(debt))
+    bump(
+        issue_date,
+        profit=Decimal(str(spot_price)) * delta if payment_date is not None else ZERO,
+        unpaid_invoices=delta if payment_date is None else 0,
+        debt=debt * delta if debt > 0 else ZERO,
+    )
+
+
+def track_invoices(invoices, delta):
+    """
+    Учитывает вклад нескольких счетов (например, созданных bulk_create,
+    который не отправляет сигналы) одним обновлением на каждый день.
+    """
+    days = {}
+    for invoice in invoices:
+        totals = days.setdefault(invoice.issue_date, dict.fromkeys(ROLLUP_FIELDS, ZERO))
+        debt = Decimal(str(invoice.debt))
+        if invoice.payment_date is not None:
+            totals['profit'] += Decimal(str(invoice.spot_price)) * delta
+        else:
+            totals['unpaid_invoices'] += delta
+        if debt > 0:
+            totals['debt'] += debt * delta
+    for day, totals in days.items():
+        totals['unpaid_invoices'] = int(totals['unpaid_invoices'])
+        bump(day, **{field: value for field, value in totals.items() if field != 'new_clients'})
+
+
+def track_client(client, delta):
+    bump(timezone.localdate(client.user.date_joined), new_clients=delta)
+
+
+def rebuild(apps=global_apps):
+    """
+    Пересчитывает все дневные срезы с нуля по таблицам Invoice и Client.
+    apps — реестр моделей; миграция 0008 передаёт исторический.
+    """
+    invoices = apps.get_model('parking', 'Invoice')
+    clients = apps.get_model('parking', 'Client')
+    daily = apps.get_model('parking', 'DailyParkingStats')
+    days = {}
+
+    def day(date):
+        return days.setdefault(date, daily(date=date))
+
+    invoice_rows = invoices.objects.values('issue_date').annotate(
+        profit=Sum('spot_price', filter=Q(payment_date__isnull=False)),
+        unpaid_invoices=Count('id', filter=Q(payment_date__isnull=True)),
+        debt=Sum('debt', filter=Q(debt__gt=0)),
+    ).order_by()
+    for row in invoice_rows:
+        stats = day(row['issue_date'])
+        stats.profit = row['profit'] or ZERO
+        stats.unpaid_invoices = row['unpaid_invoices']
+        stats.debt = row['debt'] or ZERO
+
+    client_rows = clients.objects.values(joined=TruncDate('user__date_joined')).annotate(
+        new_clients=Count('id'),
+    ).order_by()
+    for row in client_rows:
+        day(row['joined']).new_clients = row['new_clients']
+
+    with transaction.atomic():
+        daily.objects.all().delete()
+        daily.objects.bulk_create(days.values(), batch_size=500)
+    return len(days)
@@ -0,0 +1,89 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+from django.utils import timezone
+
+# Время последней записи сессии в базу (секунды эпохи), хранится в самой сессии
+REFRESHED_KEY = '_session_refreshed'
+CLEAR_CHUNK_SIZE = 1000
+
+
+def lifetime():
+    return settings.SESSION_COOKIE_AGE
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Кэш сессий в памяти процесса не виден другим воркерам: выход в одном
+    процессе не завершил бы сессию в остальных, а touch() продлевал бы её.
+    """
+    if settings.SESSION_ENGINE != __name__:
+        return []
+    if isinstance(caches[settings.SESSION_CACHE_ALIAS], LocMemCache):
+        return [Error(
+            f'Кэш сессий {settings.SESSION_CACHE_ALIAS!r} хранится в памяти процесса',
+            hint='Укажите общий для процессов бэкенд: файловый, Redis или Memcached.',
+            id='parking.E001',
+        )]
+    return []
+
+
+class SessionStore(CachedDBStore):
+    """
+    Сессии в кэше SESSION_CACHE_ALIAS с копией в базе (cached_db), которая
+    пишется только при изменении данных или когда до её истечения осталось
+    меньше половины срока. Между записями таймер простоя ведёт запись кэша:
+    touch() после каждого запроса продлевает её на SESSION_COOKIE_AGE, поэтому
+    сессия по-прежнему истекает через SESSION_COOKIE_AGE без запросов. Без
+    записи в кэше (другой процесс, вытеснение) сессия читается из базы, где
+    срок не позже, чем по кэшу.
+    """
+
+    def touch(self):
+        """
+        Вызывается после запроса, не изменившего сессию (см.
+        parking.middleware.SessionMiddleware).
+        """
+        if self.get('_session_expiry') is not None:
+            # Свой срок через set_expiry(): продлеваем, как раньше, каждым запросом
+            self.modified = True
+            return
+        if time.time() - self.get(REFRESHED_KEY, 0) > lifetime() / 2:
+            self.modified = True
+            return
+        try:
+            if not self._cache.touch(self.cache_key, lifetime()):
+                self._cache.set(self.cache_key, self._session, lifetime())
+        except Exception:
+            # Кэш недоступен: сессия истечёт по сроку из базы
+            pass
+
+    def save(self, must_create=False):
+        self._get_session(no_load=must_create)[REFRESHED_KEY] = int(time.time())
+        super().save(must_create)
+
+    async def asave(self, must_create=False):
+        (await self._aget_session(no_load=must_create))[REFRESHED_KEY] = int(time.time())
+        await super().asave(must_create)
+
+    @classmethod
+    def clear_expired(cls):
+        """
+        Удаляет истёкшие сессии порциями по CLEAR_CHUNK_SIZE (блокировка записи
+        SQLite держится недолго). Запись в кэше может пережить срок в базе не
+        больше чем на половину срока жизни, поэтому строки удаляются с таким
+        запасом: иначе продление живой сессии не нашло бы её в базе.
+        """
+        model = cls.get_model_class()
+        expired = model.objects.filter(expire_date__lt=timezone.now() - timedelta(seconds=lifetime() / 2))
+        while True:
+            keys = list(expired.values_list('pk', flat=True)[:CLEAR_CHUNK_SIZE])
+            if not keys:
+                break
+            model.objects.filter(pk__in=keys).delete()
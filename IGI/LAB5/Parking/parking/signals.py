@@ -0,0 +1,180 @@
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import availability, ownership, page_cache, roles, rollups, stats
+from .models import Article, Car, Client, EmployeeContact, Invoice, JobVacancy, ParkingSpot, Term
+
+# Поля, которые нужно помнить для каждой модели, и производные хранилища:
+# (поля, от которых зависит хранилище, функция обновления)
+TRACKED = {
+    Invoice: (
+        ('spot_price', 'parking_spot_id', 'issue_date', 'payment_date', 'debt'),
+        [
+            (('spot_price', 'parking_spot_id'), stats.track_invoice),
+            (('issue_date', 'payment_date', 'debt', 'spot_price'), rollups.track_invoice),
+        ],
+    ),
+    Client: (
+        ('age',),
+        [
+            (('age',), stats.track_client),
+        ],
+    ),
+}
+
+_DEFERRED = object()
+
+
+# Значения отслеживаемых полей объекта. Отложенные поля (.only/.defer)
+# не читаются, чтобы не вызывать лишних запросов.
+def _snapshot(instance, fields, fallback=None):
+    values = {field: instance.__dict__.get(field, _DEFERRED) for field in fields}
+    if fallback is not None:
+        values = {field: fallback[field] if value is _DEFERRED else value for field, value in values.items()}
+    return None if _DEFERRED in values.values() else values
+
+
+def _apply(sender, previous, current):
+    _, handlers = TRACKED[sender]
+    for keys, track in handlers:
+        old = tuple(previous[key] for key in keys) if previous else None
+        new = tuple(current[key] for key in keys) if current else None
+        if old == new:
+            continue
+        if old is not None:
+            track(*old, delta=-1)
+        if new is not None:
+            track(*new, delta=1)
+
+
+def _stored(sender, pk):
+    fields, _ = TRACKED[sender]
+    return sender.objects.filter(pk=pk).values(*fields).first()
+
+
+# Учтённые значения читаются только перед записью: снимок при каждой загрузке
+# (post_init) стоил бы работы на каждый объект любого запроса
+@receiver(pre_save, sender=Invoice)
+@receiver(pre_save, sender=Client)
+def load_snapshot(sender, instance, **kwargs):
+    instance._tracked_snapshot = _stored(sender, instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=Client)
+def track_save(sender, instance, created, **kwargs):
+    fields, _ = TRACKED[sender]
+    previous = None if created else instance._tracked_snapshot
+    # Отложенные поля save() не записывает, для них берём прежние значения
+    current = _snapshot(instance, fields, fallback=previous)
+    _apply(sender, previous, current)
+
+
+# Удаляемые каскадом и через queryset.delete() объекты только что загружены
+# из базы, поэтому их значения совпадают с учтёнными (instance.delete() после
+# несохранённых изменений не поддерживается). В базу идём, только если поля отложены
+@receiver(pre_delete, sender=Invoice)
+@receiver(pre_delete, sender=Client)
+def remember_deleted(sender, instance, **kwargs):
+    fields, _ = TRACKED[sender]
+    instance._tracked_snapshot = _snapshot(instance, fields) or _stored(sender, instance.pk)
+
+
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=Client)
+def track_delete(sender, instance, **kwargs):
+    _apply(sender, instance._tracked_snapshot, None)
+
+
+@receiver(post_save, sender=Client)
+def track_new_client(sender, instance, created, **kwargs):
+    if created:
+        rollups.track_client(instance, delta=1)
+
+
+@receiver(post_delete, sender=Client)
+def track_removed_client(sender, instance, **kwargs):
+    rollups.track_client(instance, delta=-1)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_roles_on_membership_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            instance.__dict__.pop('_parking_roles', None)
+            roles.invalidate(instance.pk)
+        return
+    # Изменение со стороны группы: group.user_set.add(...) / clear()
+    if action == 'pre_clear':
+        instance._cleared_user_ids = list(instance.user_set.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        roles.invalidate(*pk_set)
+    elif action == 'post_clear':
+        roles.invalidate(*getattr(instance, '_cleared_user_ids', []))
+
+
+@receiver(post_save, sender=Group)
+@receiver(pre_delete, sender=Group)
+def invalidate_roles_on_group_change(sender, instance, created=False, **kwargs):
+    if not created:
+        roles.invalidate(*instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(m2m_changed, sender=Car.clients.through)
+def recount_owners(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            ownership.recount([instance.pk])
+        return
+    # Изменение со стороны клиента: client.cars.add(...) / clear()
+    if action == 'pre_clear':
+        instance._cleared_car_ids = list(instance.cars.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        ownership.recount(pk_set)
+    elif action == 'post_clear':
+        ownership.recount(getattr(instance, '_cleared_car_ids', []))
+
+
+# Связи удалённого клиента удаляются каскадом без m2m_changed
+@receiver(pre_delete, sender=Client)
+def remember_owned_cars(sender, instance, **kwargs):
+    instance._owned_car_ids = list(instance.cars.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Client)
+def recount_owned_cars(sender, instance, **kwargs):
+    ownership.recount(getattr(instance, '_owned_car_ids', []))
+
+
+# Разделы кэша публичных страниц, зависящие от моделей
+PAGE_SECTIONS = {
+    Article: 'news',
+    Term: 'terms',
+    EmployeeContact: 'contacts',
+    JobVacancy: 'vacancies',
+}
+
+
+@receiver(post_save, sender=Article)
+@receiver(post_save, sender=Term)
+@receiver(post_save, sender=EmployeeContact)
+@receiver(post_save, sender=JobVacancy)
+@receiver(post_delete, sender=Article)
+@receiver(post_delete, sender=Term)
+@receiver(post_delete, sender=EmployeeContact)
+@receiver(post_delete, sender=JobVacancy)
+def invalidate_page_cache(sender, **kwargs):
+    page_cache.invalidate_section(PAGE_SECTIONS[sender])
+
+
+@receiver(post_save, sender=ParkingSpot)
+@receiver(post_delete, sender=ParkingSpot)
+def refresh_availability(sender, instance, **kwargs):
+    availability.changed([instance.pk])
+
+
+@receiver(post_delete, sender=Car)
+def reload_availability(sender, instance, **kwargs):
+    # Места удалённой машины обновляются через SET_NULL без сигналов
+    availability.changed()
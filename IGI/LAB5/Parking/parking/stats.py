@@ -0,0 +1,255 @@
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum, Window
+
+from .models import Client, Invoice, StatisticBucket, StatisticSummary
+
+ZERO = Decimal('0')
+
+
+@dataclass(frozen=True)
+class Distribution:
+    """
+    Сводка по метрике: количество, сумма, среднее, медиана и мода.
+    """
+    count: int
+    total: Decimal
+    mean: Decimal
+    median: Decimal
+    mode: Decimal
+
+
+def _as_key(value):
+    return Decimal(str(value))
+
+
+def _add_summary(metric, count, total):
+    """
+    Сдвигает итоги метрики metric на count значений с суммой total.
+    """
+    summaries = StatisticSummary.objects.filter(metric=metric)
+    if summaries.update(count=F('count') + count, total=F('total') + total):
+        return
+    try:
+        with transaction.atomic():
+            StatisticSummary.objects.create(metric=metric, count=count, total=total)
+    except IntegrityError:
+        # Итоги успел создать параллельный запрос
+        summaries.update(count=F('count') + count, total=F('total') + total)
+
+
+def _add_bucket(metric, key, count, total):
+    """
+    Добавляет в корзину key метрики metric count значений (count > 0) с суммой
+    total, создавая корзину, если её ещё нет.
+    """
+    buckets = StatisticBucket.objects.filter(metric=metric, key=key)
+    if buckets.update(count=F('count') + count, total=F('total') + total):
+        return
+    try:
+        with transaction.atomic():
+            StatisticBucket.objects.create(metric=metric, key=key, count=count, total=total)
+    except IntegrityError:
+        # Корзину успел создать параллельный запрос
+        buckets.update(count=F('count') + count, total=F('total') + total)
+
+
+def track(metric, key, amount, delta):
+    """
+    Добавляет (delta=1) или убирает (delta=-1) одно значение key метрики metric
+    с весом amount. Корзина и итоги метрики обновляются атомарно через F-выражения.
+    """
+    key = _as_key(key)
+    amount = _as_key(amount) * delta
+    if delta > 0:
+        _add_bucket(metric, key, delta, amount)
+    else:
+        buckets = StatisticBucket.objects.filter(metric=metric, key=key)
+        if not buckets.update(count=F('count') + delta, total=F('total') + amount):
+            # Убирать нечего: значение не было учтено
+            return
+        buckets.filter(count__lte=0).delete()
+    _add_summary(metric, delta, amount)
+
+
+def track_invoice(spot_price, parking_spot_id, delta):
+    track(StatisticBucket.RENTAL, spot_price, spot_price, delta)
+    track(StatisticBucket.SPOT, parking_spot_id, spot_price, delta)
+
+
+def track_many(metric, values, delta):
+    """
+    То же, что track для каждого (key, amount) из values, но одним запросом
+    на чтение и одним bulk_update/bulk_create вместо запроса на каждое значение.
+    """
+    changes = {}
+    for key, amount in values:
+        count, total = changes.get(_as_key(key), (0, ZERO))
+        changes[_as_key(key)] = (count + delta, total + _as_key(amount) * delta)
+    if not changes:
+        return
+    buckets = StatisticBucket.objects.filter(metric=metric, key__in=changes)
+    existing = list(buckets)
+    applied_count, applied_total = 0, ZERO
+    for bucket in existing:
+        count, total = changes.pop(bucket.key)
+        bucket.count = F('count') + count
+        bucket.total = F('total') + total
+        applied_count, applied_total = applied_count + count, applied_total + total
+    StatisticBucket.objects.bulk_update(existing, ['count', 'total'])
+    if delta < 0:
+        buckets.filter(count__lte=0).delete()
+    elif changes:
+        try:
+            with transaction.atomic():
+                StatisticBucket.objects.bulk_create(
+                    StatisticBucket(metric=metric, key=key, count=count, total=total)
+                    for key, (count, total) in changes.items()
+                )
+        except IntegrityError:
+            # Часть корзин успел создать параллельный запрос
+            for key, (count, total) in changes.items():
+                _add_bucket(metric, key, count, total)
+        applied_count += sum(count for count, _ in changes.values())
+        applied_total += sum((total for _, total in changes.values()), ZERO)
+    # Итоги метрики — одним запросом на все учтённые значения
+    if applied_count:
+        _add_summary(metric, applied_count, applied_total)
+
+
+def track_invoices(invoices, delta):
+    track_many(StatisticBucket.RENTAL, [(invoice.spot_price, invoice.spot_price) for invoice in invoices], delta)
+    track_many(StatisticBucket.SPOT, [(invoice.parking_spot_id, invoice.spot_price) for invoice in invoices], delta)
+
+
+def track_client(age, delta):
+    track(StatisticBucket.AGE, age, age, delta)
+
+
+EMPTY = Distribution(count=0, total=ZERO, mean=ZERO, median=ZERO, mode=ZERO)
+
+
+def _summary(metric):
+    return StatisticSummary.objects.filter(metric=metric, count__gt=0).values_list('count', 'total')
+
+
+def _mode(metric):
+    # Самое частое значение (при равенстве — меньшее) по statistic_bucket_mode_idx
+    return StatisticBucket.objects.filter(metric=metric, count__gt=0).order_by('-count', 'key').values_list('key', flat=True)
+
+
+def _median_buckets(metric, count):
+    """
+    Корзины, в которые попадают позиции (count - 1) // 2 и count // 2 значений
+    по возрастанию: первые две, где нарастающее число значений больше нижней позиции.
+    """
+    return (
+        StatisticBucket.objects.filter(metric=metric, count__gt=0)
+        .annotate(seen=Window(Sum('count'), order_by=F('key').asc()))
+        .filter(seen__gt=(count - 1) // 2)
+        .order_by('key').values_list('key', 'seen')[:2]
+    )
+
+
+def _distribution(count, total, mode, median_buckets):
+    (lower, seen), *rest = median_buckets
+    # Нижняя корзина покрывает и верхнюю позицию count // 2 или следующая
+    upper = lower if seen > count // 2 else rest[0][0]
+    return Distribution(count=count, total=total, mean=total / count, median=(lower + upper) / 2, mode=mode)
+
+
+def distribution(metric):
+    """
+    Сводка по метрике тремя запросами. Количество, сумма и среднее берутся из
+    нарастающих итогов StatisticSummary, мода — первой записью индекса, то есть
+    не зависят от числа различных значений. Медиана считается нарастающей
+    суммой по корзинам до середины и остаётся O(числа различных значений):
+    без дерева порядковых статистик её не поддержать при удалениях, а
+    различных цен и возрастов немного.
+    """
+    summary = _summary(metric).first()
+    if summary is None:
+        return EMPTY
+    count, total = summary
+    return _distribution(count, total, _mode(metric).first(), list(_median_buckets(metric, count)))
+
+
+async def adistribution(metric):
+    summary = await _summary(metric).afirst()
+    if summary is None:
+        return EMPTY
+    count, total = summary
+    median_buckets = [bucket async for bucket in _median_buckets(metric, count)]
+    return _distribution(count, total, await _mode(metric).afirst(), median_buckets)
+
+
+def rental_distribution():
+    return distribution(StatisticBucket.RENTAL)
+
+
+def age_distribution():
+    return distribution(StatisticBucket.AGE)
+
+
+async def arental_distribution():
+    return await adistribution(StatisticBucket.RENTAL)
+
+
+async def aage_distribution():
+    return await adistribution(StatisticBucket.AGE)
+
+
+def _most_profitable_spot():
+    return (
+        StatisticBucket.objects.filter(metric=StatisticBucket.SPOT, count__gt=0)
+        .order_by('-total', 'key').values_list('key', 'total')
+    )
+
+
+def _spot_profit(bucket):
+    if bucket is None:
+        return None, 0
+    return int(bucket[0]), bucket[1]
+
+
+def get_most_profitable_spot():
+    """
+    Возвращает (id парковочного места, прибыль) или (None, 0), если счетов нет.
+    """
+    return _spot_profit(_most_profitable_spot().first())
+
+
+async def aget_most_profitable_spot():
+    return _spot_profit(await _most_profitable_spot().afirst())
+
+
+def rebuild():
+    """
+    Пересчитывает все корзины и итоги метрик с нуля по таблицам Invoice и Client.
+    """
+    buckets = [
+        StatisticBucket(metric=StatisticBucket.RENTAL, key=row['spot_price'], count=row['count'], total=row['total'])
+        for row in Invoice.objects.values('spot_price').annotate(count=Count('id'), total=Sum('spot_price')).order_by()
+    ]
+    buckets += [
+        StatisticBucket(metric=StatisticBucket.SPOT, key=row['parking_spot'], count=row['count'], total=row['total'])
+        for row in Invoice.objects.values('parking_spot').annotate(count=Count('id'), total=Sum('spot_price')).order_by()
+    ]
+    buckets += [
+        StatisticBucket(metric=StatisticBucket.AGE, key=row['age'], count=row['count'], total=row['total'])
+        for row in Client.objects.values('age').annotate(count=Count('id'), total=Sum('age')).order_by()
+    ]
+    summaries = {metric: (0, ZERO) for metric, _ in StatisticBucket.METRIC_CHOICES}
+    for bucket in buckets:
+        count, total = summaries.get(bucket.metric, (0, ZERO))
+        summaries[bucket.metric] = (count + bucket.count, total + bucket.total)
+    with transaction.atomic():
+        StatisticBucket.objects.all().delete()
+        StatisticBucket.objects.bulk_create(buckets, batch_size=500)
+        StatisticSummary.objects.all().delete()
+        StatisticSummary.objects.bulk_create(
+            StatisticSummary(metric=metric, count=count, total=total) for metric, (count, total) in summaries.items()
+        )
+    return len(buckets)
@@ -2,16 +2,20 @@ from django import template
 from django.utils import timezone
 from datetime import datetime, timedelta, time
 import pytz
-import logging
 
-logger = logging.getLogger(__name__)
+from parking.log import get_logger
+from parking.overdue import OVERDUE_DAYS
+
+# Фильтры вызываются для каждой строки шаблона, поэтому их записи
+# прореживаются через LOG_SAMPLING в настройках
+logger = get_logger(__name__)
 
 register = template.Library()
 
 @register.filter
 def timeuntil(value):
     """
-    Вычисляет оставшееся время до истечения 30 дней с момента value (даты).
+    Вычисляет оставшееся время до истечения OVERDUE_DAYS дней с момента value (даты).
     Учитывает часовой пояс через timezone.now().
     """
     if not value:
@@ -19,7 +23,7 @@ def timeuntil(value):
     
     # Преобразуем date в datetime с началом дня в текущем часовом поясе
     issue_datetime = timezone.make_aware(datetime.combine(value, time.min), timezone.get_current_timezone())
-    deadline = issue_datetime + timedelta(days=30)
+    deadline = issue_datetime + timedelta(days=OVERDUE_DAYS)
     now = timezone.now()
     
     # Вычисляем оставшееся время
@@ -62,7 +66,7 @@ def to_utc(value):
         # Если время не осведомлено о часовом поясе, предполагаем, что это UTC
         value = timezone.make_aware(value, pytz.UTC)
     utc_time = value.astimezone(pytz.UTC)
-    logger.debug(f"to_utc: Converted {value} to {utc_time}")
+    logger.debug("to_utc: Converted %s to %s", value, utc_time)
     return utc_time
 
 @register.filter
@@ -78,7 +82,7 @@ def local_time(value):
         value = timezone.make_aware(value, pytz.UTC)
     local_tz = timezone.get_current_timezone()
     local_time = value.astimezone(local_tz)
-    logger.debug(f"local_time: Converted {value} to {local_time} in {local_tz}")
+    logger.debug("local_time: Converted %s to %s in %s", value, local_time, local_tz)
     return local_time
 
 @register.simple_tag
@@ -87,7 +91,7 @@ def get_utc_now():
     Возвращает текущее время в UTC.
     """
     utc_now = timezone.now()  # Время в UTC
-    logger.debug(f"get_utc_now: Returning {utc_now}")
+    logger.debug("get_utc_now: Returning %s", utc_now)
     return utc_now
 
 @register.filter
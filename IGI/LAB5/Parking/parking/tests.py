@@ -1,3 +1,1399 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 
-# Create your tests here.
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections
+from django.test import Client as TestClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import analytics, availability, charts, dashboards, debtors, events, export, external, log, metrics, occupation, overdue, ownership, pagination, replica, roles, rollups, sessions, stats
+from .models import Article, BatchCheckpoint, Car, Client, DailyParkingStats, Employee, Income, Invoice, ParkingSpot, StatisticBucket, StatisticSummary
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    delay = 0
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        if self.path.startswith('/joke'):
+            body = {'setup': 'stub setup', 'punchline': 'stub punchline'}
+        elif self.path.startswith('/quote'):
+            body = {'quote': {'body': 'stub quote', 'author': 'stub author'}}
+        else:
+            self.send_response(404)
+            self.end_headers()
+            return
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+    def log_error(self, format, *args):
+        pass
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Клиент закрыл соединение по таймауту (BrokenPipe, ConnectionReset)
+        # — ожидаемо в тестах, трассировку не печатаем
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class ExternalContentTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = _StubServer(('127.0.0.1', 0), _StubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        _StubHandler.delay = 0
+
+    def settings_for(self, **overrides):
+        config = {
+            'JOKE_URL': f'{self.base_url}/joke',
+            'QUOTE_URL': f'{self.base_url}/quote',
+            'TIMEOUT': (0.5, 0.5),
+            'TTL': 60,
+            'STALE_TTL': 600,
+        }
+        config.update(overrides)
+        return override_settings(EXTERNAL_CONTENT=config)
+
+    def test_fetches_both_feeds(self):
+        with self.settings_for():
+            content = external.get_external_content()
+        self.assertEqual(content['joke']['setup'], 'stub setup')
+        self.assertEqual(content['quote']['author'], 'stub author')
+
+    def test_feeds_are_fetched_concurrently(self):
+        # Обе загрузки должны начаться до того, как закончится любая из них:
+        # при последовательной загрузке барьер не дождался бы второй
+        both_started = threading.Barrier(2, timeout=5)
+
+        def fetch(name):
+            both_started.wait()
+            return external.FEEDS[name][1](self.stub_payload(name))
+
+        with self.settings_for(TIMEOUT=(5, 5)), mock.patch.object(external, '_fetch', fetch):
+            content = external.get_external_content()
+        self.assertEqual(content['joke']['setup'], 'stub setup')
+        self.assertEqual(content['quote']['author'], 'stub author')
+
+    def test_timeout_falls_back_to_local_pool(self):
+        started, release = threading.Barrier(3, timeout=5), threading.Event()
+
+        def fetch(name):
+            started.wait()
+            release.wait(5)
+            raise external.requests.Timeout(name)
+
+        executor = ThreadPoolExecutor(max_workers=2)
+        with self.settings_for(TIMEOUT=(0.05, 0.05)), mock.patch.object(external, '_fetch', fetch), \
+                mock.patch.object(external, '_executor', executor), self.assertLogs('parking.external', 'WARNING'):
+            content = external.get_external_content()
+            # Загрузки не пройдут барьер, пока тест не дошёл до него: ответ
+            # отдан по таймауту, пока обе ещё висят
+            started.wait()
+            release.set()
+            executor.shutdown(wait=True)
+        self.assertIn(content['joke'], external.FALLBACK_JOKES)
+        self.assertIn(content['quote'], external.FALLBACK_QUOTES)
+
+    def test_unreachable_host_falls_back_to_local_pool(self):
+        with self.settings_for(JOKE_URL='http://127.0.0.1:9/joke'), self.assertLogs('parking.external', 'WARNING'):
+            content = external.get_external_content()
+        self.assertIn(content['joke'], external.FALLBACK_JOKES)
+        self.assertEqual(content['quote']['body'], 'stub quote')
+
+    def test_async_feeds_are_fetched_concurrently(self):
+        async def scenario():
+            started = []
+            both_started = asyncio.Event()
+
+            async def afetch(name):
+                started.append(name)
+                if len(started) == len(external.FEEDS):
+                    both_started.set()
+                await asyncio.wait_for(both_started.wait(), 5)
+                return external.FEEDS[name][1](self.stub_payload(name))
+
+            with mock.patch.object(external, '_afetch', afetch):
+                return await external.aget_external_content()
+
+        with self.settings_for(TIMEOUT=(5, 5)):
+            content = async_to_sync(scenario)()
+        self.assertEqual(content['joke']['setup'], 'stub setup')
+        self.assertEqual(content['quote']['author'], 'stub author')
+
+    def test_async_timeout_cancels_fetches_and_falls_back(self):
+        cancelled = []
+
+        async def afetch(name):
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.append(name)
+                raise
+
+        with self.settings_for(TIMEOUT=(0.05, 0.05)), mock.patch.object(external, '_afetch', afetch):
+            content = async_to_sync(external.aget_external_content)()
+        self.assertCountEqual(cancelled, external.FEEDS)
+        self.assertIn(content['joke'], external.FALLBACK_JOKES)
+        self.assertIn(content['quote'], external.FALLBACK_QUOTES)
+
+    def stub_payload(self, name):
+        return {
+            'joke': {'setup': 'stub setup', 'punchline': 'stub punchline'},
+            'quote': {'quote': {'body': 'stub quote', 'author': 'stub author'}},
+        }[name]
+
+    def test_stale_content_is_served_while_revalidating(self):
+        stale_joke = {'setup': 'old', 'punchline': 'old'}
+        cache.set(external._cache_key('joke'), (time.time() - 120, stale_joke), 600)
+        _StubHandler.delay = 0.2
+        with self.settings_for():
+            content = external.get_external_content()
+            self.assertEqual(content['joke'], stale_joke)
+            for _ in range(50):
+                fetched_at, joke = cache.get(external._cache_key('joke'))
+                if joke != stale_joke:
+                    break
+                time.sleep(0.05)
+        self.assertEqual(joke['setup'], 'stub setup')
+
+
+class PeriodDebtTests(TestCase):
+    def setUp(self):
+        self.start, self.end = date(2025, 1, 1), date(2025, 12, 31)
+        self.cars = [Car.objects.create(license_plate=f'P-{i}', brand='Lada', model='Vesta') for i in range(3)]
+        self.spots = [ParkingSpot.objects.create(number=i + 1, price=5) for i in range(3)]
+        rows = [
+            # (автомобиль, место, дата, долг); третий автомобиль без счетов за период
+            (0, 0, self.start, '10.50'),
+            (0, 1, self.end, '4.25'),
+            (1, 1, date(2025, 6, 1), '20'),
+            (1, 2, date(2024, 12, 31), '100'),
+            (2, 2, date(2026, 1, 1), '100'),
+        ]
+        Invoice.objects.bulk_create(
+            Invoice(code=f'D{i}', car=self.cars[car], parking_spot=self.spots[spot], spot_price=5,
+                    issue_date=issued, debt=Decimal(debt))
+            for i, (car, spot, issued, debt) in enumerate(rows)
+        )
+
+    def test_total_debt_is_one_aggregate_over_the_period(self):
+        with self.assertNumQueries(1):
+            total = analytics.period_total_debt(self.start, self.end)
+        self.assertEqual(total, Decimal('34.75'))
+        self.assertEqual(analytics.period_total_debt(date(2020, 1, 1), date(2020, 12, 31)), Decimal('0.00'))
+
+    def test_report_totals_by_car_and_spot_in_one_query(self):
+        with self.assertNumQueries(1):
+            report = analytics.period_debt_report(self.start, self.end)
+        self.assertEqual(report.total, analytics.period_total_debt(self.start, self.end))
+        self.assertEqual(report.invoices, 3)
+        self.assertEqual(
+            [(item.key, item.label, item.total, item.invoices) for item in report.by_car],
+            [
+                (self.cars[0].pk, 'Lada Vesta (P-0)', Decimal('14.75'), 2),
+                (self.cars[1].pk, 'Lada Vesta (P-1)', Decimal('20.00'), 1),
+                (self.cars[2].pk, 'Lada Vesta (P-2)', Decimal('0.00'), 0),
+            ],
+        )
+        # Места без счетов за период в отчёт не попадают
+        self.assertEqual(
+            [(item.key, item.label, item.total) for item in report.by_spot],
+            [(self.spots[0].pk, 'Место 1', Decimal('10.50')), (self.spots[1].pk, 'Место 2', Decimal('24.25'))],
+        )
+
+    def test_min_max_and_top_selection(self):
+        report = analytics.period_debt_report(self.start, self.end)
+        self.assertEqual(report.min_car().key, self.cars[2].pk)
+        self.assertEqual(report.max_car().key, self.cars[1].pk)
+        self.assertEqual([item.key for item in report.top_cars(2)], [self.cars[1].pk, self.cars[0].pk])
+        self.assertEqual([item.key for item in report.top_cars(2, largest=False)], [self.cars[2].pk, self.cars[0].pk])
+        self.assertEqual(report.min_spot().key, self.spots[0].pk)
+        self.assertEqual(report.max_spot().key, self.spots[1].pk)
+
+    def test_total_debt_view(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.post('/total_debt/', {'start_date': '2025-01-01', 'end_date': '2025-12-31'})
+        self.assertContains(response, 'Сумма долгов: 34.75 руб.')
+
+    def test_benchmark_leaves_no_data(self):
+        out = io.StringIO()
+        call_command('benchmark_period_debt', days=30, per_day=10, cars=5, repeat=2, stdout=out)
+        rows = [line.split() for line in out.getvalue().splitlines()[2:]]
+        self.assertEqual([row[0] for row in rows], ['total', 'report'])
+        self.assertEqual(Invoice.objects.count(), 5)
+        self.assertFalse(Car.objects.filter(brand='Bench').exists())
+
+
+class DebtorRankingTests(TestCase):
+    def setUp(self):
+        self.spot = ParkingSpot.objects.create(number=1, price=5)
+        self.clients = {}
+        self.invoices = 0
+        # Общая машина считается в долг обоим владельцам
+        shared = self.car('shared', '5')
+        for name, debts in [('alice', ['0.1', '0.2']), ('bob', ['0.3']), ('carol', ['7']), ('dave', [])]:
+            client = Client.objects.create(
+                user=User.objects.create(username=name), name=name, email=f'{name}@example.com',
+            )
+            for debt in debts:
+                client.cars.add(self.car(name, debt))
+            self.clients[name] = client
+        self.clients['carol'].cars.add(shared)
+
+    def car(self, name, debt):
+        self.invoices += 1
+        car = Car.objects.create(license_plate=f'{name}-{self.invoices}', brand='Lada', model='Vesta')
+        Invoice.objects.create(
+            code=f'R{self.invoices}', car=car, parking_spot=self.spot, spot_price=5,
+            issue_date=date(2025, 1, 1), debt=Decimal(debt),
+        )
+        return car
+
+    def test_equal_debts_share_a_rank(self):
+        ranking = [(debtor.name, debtor.debt_rank) for debtor in debtors.ranked_debtors()]
+        # RANK(): после двух вторых мест следующее — четвёртое
+        self.assertEqual(ranking, [('carol', 1), ('alice', 2), ('bob', 2), ('dave', 4)])
+
+    def test_threshold_keeps_debts_strictly_above_it(self):
+        self.assertEqual([debtor.name for debtor in debtors.top_debtors(threshold=Decimal('0.3'))], ['carol'])
+        self.assertEqual(
+            [debtor.name for debtor in debtors.top_debtors(threshold=Decimal('0'))], ['carol', 'alice', 'bob'],
+        )
+
+    def test_debts_are_quantized_to_cents(self):
+        totals = {debtor.name: debtor.total_debt for debtor in debtors.top_debtors()}
+        self.assertEqual(totals, {
+            'carol': Decimal('12.00'), 'alice': Decimal('0.30'), 'bob': Decimal('0.30'), 'dave': Decimal('0.00'),
+        })
+        self.assertEqual([str(total) for total in totals.values()], ['12.00', '0.30', '0.30', '0.00'])
+        self.assertEqual(debtors.get_biggest_debtor().total_debt, Decimal('12.00'))
+
+    def test_api_ranks_in_constant_queries(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        self.client.get('/api/debtors/')
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/api/debtors/?limit=3').json()
+        self.assertEqual(
+            [(row['rank'], row['name'], row['total_debt']) for row in data['debtors']],
+            [(1, 'carol', '12.00'), (2, 'alice', '0.30'), (2, 'bob', '0.30')],
+        )
+        for i in range(20):
+            client = Client.objects.create(user=User.objects.create(username=f'extra{i}'), name=f'extra{i}', email=f'x{i}@example.com')
+            client.cars.add(self.car(f'extra{i}', '1'))
+        with self.assertNumQueries(len(queries)):
+            data = self.client.get('/api/debtors/?limit=100&threshold=0.5').json()
+        self.assertEqual(len(data['debtors']), 21)
+
+    def test_api_rejects_bad_parameters(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        for query in ['limit=x', 'threshold=abc']:
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/api/debtors/?{query}').status_code, 400)
+
+
+class OwnershipProjectionTests(TestCase):
+    def setUp(self):
+        self.clients = [
+            Client.objects.create(user=User.objects.create(username=name), name=name, email=f'{name}@example.com')
+            for name in ('anna', 'boris', 'vera')
+        ]
+        self.car = Car.objects.create(license_plate='AA-1', brand='  Лада  Веста ', model='Vesta')
+
+    def owner_count(self, car=None):
+        return Car.objects.get(pk=(car or self.car).pk).owner_count
+
+    def test_owner_count_follows_both_sides_of_relation(self):
+        anna, boris, vera = self.clients
+        self.car.clients.add(anna, boris)
+        self.assertEqual(self.owner_count(), 2)
+        vera.cars.add(self.car)
+        self.assertEqual(self.owner_count(), 3)
+        self.car.clients.remove(anna)
+        self.assertEqual(self.owner_count(), 2)
+        vera.cars.clear()
+        self.assertEqual(self.owner_count(), 1)
+        boris.delete()
+        self.assertEqual(self.owner_count(), 0)
+        self.car.clients.set(self.clients[:1])
+        self.car.clients.clear()
+        self.assertEqual(self.owner_count(), 0)
+
+    def test_brand_key_normalized_on_save(self):
+        self.assertEqual(self.car.brand_key, 'лада веста')
+        self.car.brand = 'TOYOTA'
+        self.car.save(update_fields=['brand'])
+        self.assertEqual(Car.objects.get(pk=self.car.pk).brand_key, 'toyota')
+
+    def test_rebuild_restores_projection(self):
+        self.car.clients.add(*self.clients)
+        Car.objects.update(owner_count=0, brand_key='')
+        self.assertEqual(ownership.rebuild(), 1)
+        car = Car.objects.get(pk=self.car.pk)
+        self.assertEqual((car.owner_count, car.brand_key), (3, 'лада веста'))
+
+    def test_reports_run_in_two_queries(self):
+        self.car.clients.add(*self.clients[:2])
+        other = Car.objects.create(license_plate='BB-2', brand='лада веста', model='Vesta')
+        other.clients.add(self.clients[2])
+        with self.assertNumQueries(2):
+            cars = [(car, [owner.name for owner in car.owners]) for car in ownership.multi_owner_cars()]
+        self.assertEqual(cars, [(self.car, ['anna', 'boris'])])
+        with self.assertNumQueries(2):
+            plates = [car.license_plate for car in ownership.cars_of_brand('ЛАДА веста')]
+        self.assertEqual(plates, ['AA-1', 'BB-2'])
+
+    def test_brands_api_searches_by_prefix(self):
+        Car.objects.create(license_plate='CC-3', brand='Toyota', model='Camry')
+        Car.objects.create(license_plate='DD-4', brand='toyota', model='Corolla')
+        Car.objects.create(license_plate='EE-5', brand='Tesla', model='3')
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        response = self.client.get('/api/brands/', {'q': 'TO'})
+        self.assertEqual(response.json(), {'brands': [{'brand': 'Toyota', 'key': 'toyota', 'cars': 2}]})
+        keys = [brand['key'] for brand in self.client.get('/api/brands/', {'limit': 2}).json()['brands']]
+        self.assertEqual(keys, ['tesla', 'toyota'])
+
+
+class StatisticsStoreTests(TestCase):
+    def setUp(self):
+        self.car = Car.objects.create(license_plate='AA-1', brand='Lada', model='Vesta')
+        self.spots = [ParkingSpot.objects.create(number=n, price=n) for n in (1, 2)]
+
+    def create_invoice(self, code, price, spot):
+        return Invoice.objects.create(
+            code=code, car=self.car, parking_spot=spot, spot_price=price, issue_date=date.today(),
+        )
+
+    def test_signals_keep_distribution_current(self):
+        first = self.create_invoice('A', 10, self.spots[0])
+        self.create_invoice('B', 20, self.spots[1])
+        self.create_invoice('C', 20, self.spots[1])
+        first.spot_price = 30
+        first.save()
+        Invoice.objects.get(code='C').delete()
+
+        rentals = stats.rental_distribution()
+        self.assertEqual(rentals.count, 2)
+        self.assertEqual(rentals.total, Decimal('50'))
+        self.assertEqual(rentals.median, Decimal('25'))
+        self.assertEqual(stats.get_most_profitable_spot(), (self.spots[0].id, Decimal('30')))
+
+    def test_client_age_is_tracked(self):
+        for age, name in ((20, 'a'), (30, 'b'), (30, 'c')):
+            user = User.objects.create(username=name)
+            Client.objects.create(user=user, name=name, email=f'{name}@example.com', age=age)
+        ages = stats.age_distribution()
+        self.assertEqual((ages.median, ages.mode), (Decimal('30'), Decimal('30')))
+
+    def test_rebuild_matches_incremental_state(self):
+        self.create_invoice('A', 10, self.spots[0])
+        self.create_invoice('B', 15, self.spots[1])
+        before = stats.rental_distribution()
+        summaries = list(StatisticSummary.objects.order_by('metric').values_list('metric', 'count', 'total'))
+        stats.rebuild()
+        self.assertEqual(stats.rental_distribution(), before)
+        self.assertEqual(list(StatisticSummary.objects.order_by('metric').values_list('metric', 'count', 'total')), summaries)
+
+    def test_distribution_takes_three_queries_for_any_distinct_values(self):
+        for distinct in (3, 300):
+            stats.track_many(StatisticBucket.AGE, [(age, age) for age in range(distinct)] + [(1, 1)], 1)
+            with self.subTest(distinct=distinct), self.assertNumQueries(3):
+                ages = stats.age_distribution()
+            self.assertEqual(ages.mode, Decimal('1'))
+        self.assertEqual(ages.count, 305)
+        self.assertEqual(ages.total, Decimal(sum(range(3)) + sum(range(300)) + 2))
+        # 0 и 2 — по два раза, 1 — четыре: значение v ≥ 3 стоит на позиции v + 5
+        self.assertEqual(ages.median, Decimal('147'))
+        self.assertEqual(async_to_sync(stats.adistribution)(StatisticBucket.AGE), ages)
+
+    def test_track_many_falls_back_to_exact_bucket_updates(self):
+        stats.track(StatisticBucket.SPOT, 1, 1, 1)
+        # Корзину успел создать параллельный запрос: bulk_create падает целиком
+        with mock.patch.object(StatisticBucket.objects, 'bulk_create', side_effect=IntegrityError):
+            stats.track_many(StatisticBucket.SPOT, [(1, 2), (2, 1), (2, 1), (2, 2), (3, 5)], 1)
+        buckets = StatisticBucket.objects.filter(metric=StatisticBucket.SPOT).values_list('key', 'count', 'total')
+        self.assertEqual(sorted(buckets), [(1, 2, 3), (2, 3, 4), (3, 1, 5)])
+        summary = StatisticSummary.objects.get(metric=StatisticBucket.SPOT)
+        self.assertEqual((summary.count, summary.total), (6, Decimal('12')))
+
+    def test_median_of_even_count_spans_two_buckets(self):
+        stats.track_many(StatisticBucket.AGE, [(20, 20), (20, 20), (40, 40), (50, 50)], 1)
+        self.assertEqual(stats.age_distribution().median, Decimal('30'))
+        stats.track(StatisticBucket.AGE, 50, 50, -1)
+        stats.track(StatisticBucket.AGE, 50, 50, -1)
+        ages = stats.age_distribution()
+        self.assertEqual((ages.count, ages.total, ages.median), (3, Decimal('80'), Decimal('20')))
+
+    def test_snapshot_is_taken_only_when_writing(self):
+        self.create_invoice('A', 10, self.spots[0])
+        with self.assertNumQueries(1):
+            invoice = Invoice.objects.get(code='A')
+        self.assertFalse(hasattr(invoice, '_tracked_snapshot'))
+        # Объект без нужных полей: прежние значения читаются из базы
+        partial = Invoice.objects.only('id', 'code').get(code='A')
+        partial.delete()
+        self.assertEqual(stats.rental_distribution(), stats.EMPTY)
+        self.assertEqual(stats.get_most_profitable_spot(), (None, 0))
+
+
+class DailyRollupTests(TestCase):
+    def test_incremental_rollup_matches_backfill(self):
+        car = Car.objects.create(license_plate='AA-1', brand='Lada', model='Vesta')
+        spot = ParkingSpot.objects.create(number=1, price=5)
+        today = timezone.localdate()
+        paid = Invoice.objects.create(code='A', car=car, parking_spot=spot, spot_price=5, issue_date=today)
+        Invoice.objects.create(code='B', car=car, parking_spot=spot, spot_price=5, issue_date=today, debt=5)
+        paid.payment_date = timezone.now()
+        paid.save()
+        user = User.objects.create(username='client')
+        Client.objects.create(user=user, name='client', email='client@example.com')
+
+        row = DailyParkingStats.objects.get(date=today)
+        self.assertEqual(
+            (row.profit, row.new_clients, row.unpaid_invoices, row.debt),
+            (Decimal('5'), 1, 1, Decimal('5')),
+        )
+        incremental = charts.build_chart_data('day')
+        rollups.rebuild()
+        self.assertEqual(charts.build_chart_data('day'), incremental)
+        self.assertEqual(incremental['all_clients']['values'][-1], 1)
+
+
+class ChartSeriesTests(TestCase):
+    def setUp(self):
+        days = {
+            date(2024, 12, 28): {'new_clients': 2},
+            date(2024, 12, 30): {'profit': 10, 'new_clients': 1},
+            date(2025, 1, 5): {'profit': 5, 'unpaid_invoices': 1, 'debt': 3},
+            date(2025, 1, 6): {'new_clients': 1},
+            date(2025, 3, 31): {'profit': 7},
+            date(2025, 4, 1): {'debt': 4},
+        }
+        DailyParkingStats.objects.bulk_create(DailyParkingStats(date=day, **values) for day, values in days.items())
+
+    def test_calendar_arithmetic(self):
+        self.assertEqual(charts.bucket_start(date(2025, 1, 1), 'week'), date(2024, 12, 30))
+        self.assertEqual(charts.bucket_start(date(2025, 5, 31), 'quarter'), date(2025, 4, 1))
+        self.assertEqual(charts.next_bucket(date(2024, 12, 1), 'month'), date(2025, 1, 1))
+        self.assertEqual(charts.next_bucket(date(2024, 10, 1), 'quarter'), date(2025, 1, 1))
+        self.assertEqual(charts.bucket_label(date(2024, 12, 30), 'week'), '2025-W01')
+        self.assertEqual(charts.bucket_label(date(2025, 10, 1), 'quarter'), '2025-Q4')
+        self.assertEqual(
+            charts.buckets_between(date(2025, 1, 31), date(2025, 3, 1), 'month'),
+            [date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)],
+        )
+
+    def test_default_range_ends_today_and_starts_on_a_bucket(self):
+        with mock.patch('parking.charts.timezone.localdate', return_value=date(2025, 2, 15)):
+            self.assertEqual(charts.default_range('quarter'), (date(2024, 4, 1), date(2025, 2, 15)))
+            self.assertEqual(charts.default_range('week', 2), (date(2025, 2, 3), date(2025, 2, 15)))
+            self.assertEqual(charts.default_range('month', 1), (date(2025, 2, 1), date(2025, 2, 15)))
+
+    def test_week_buckets_align_range_start_to_monday(self):
+        # 1 января 2025 — среда: диапазон начинается с понедельника 30 декабря
+        data = charts.build_chart_data('week', date(2025, 1, 1), date(2025, 1, 12))
+        self.assertEqual(data['profit']['labels'], ['2025-W01', '2025-W02'])
+        self.assertEqual(data['profit']['values'], [15.0, 0])
+        self.assertEqual(data['new_clients']['values'], [1, 1])
+        # Клиенты до начала диапазона — база нарастающего итога
+        self.assertEqual(data['all_clients']['values'], [3, 4])
+        self.assertEqual(data['unpaid_invoices']['values'], [1, 0])
+        self.assertEqual(data['debt']['values'], [3.0, 0])
+
+    def test_quarter_buckets(self):
+        data = charts.build_chart_data('quarter', date(2025, 2, 15), date(2025, 6, 30))
+        self.assertEqual(data['debt']['labels'], ['2025-Q1', '2025-Q2'])
+        self.assertEqual(data['profit']['values'], [12.0, 0])
+        self.assertEqual(data['new_clients']['values'], [1, 0])
+        self.assertEqual(data['all_clients']['values'], [4, 4])
+        self.assertEqual(data['debt']['values'], [3.0, 4.0])
+        self.assertTrue(all(len(series['values']) == 2 for series in data.values()))
+
+    def test_unknown_step_falls_back_to_month(self):
+        self.assertEqual(
+            charts.build_chart_data('year', date(2025, 1, 1), date(2025, 2, 28))['profit']['labels'],
+            ['2025-01', '2025-02'],
+        )
+
+    def test_both_dashboards_offer_every_step(self):
+        admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        worker = User.objects.create(username='worker')
+        worker.groups.add(Group.objects.create(name=roles.EMPLOYEE_GROUP))
+        for url, user in [('/admin_dashboard/', admin), ('/employee/', worker)]:
+            with self.subTest(url=url):
+                self.client.force_login(user)
+                response = self.client.get(url, {'step': 'quarter'})
+                self.assertEqual(response.context['step'], 'quarter')
+                for step in charts.STEPS:
+                    self.assertContains(response, f'<option value="{step}"')
+                self.assertContains(response, '<option value="quarter" selected>')
+                self.assertContains(response, 'id="debtChart"')
+                # Скрипт графиков подключается вместе с разметкой, а не только на одной панели
+                self.assertContains(response, 'function updateCharts()', count=1)
+                self.assertContains(response, 'function initializeCharts()', count=1)
+                self.assertContains(response, f"const chartData = {response.context['chart_data']};", html=False)
+
+
+class OverdueProcessorTests(TestCase):
+    def setUp(self):
+        car = Car.objects.create(license_plate='AA-1', brand='Lada', model='Vesta')
+        spot = ParkingSpot.objects.create(number=1, price=5)
+        today = timezone.localdate()
+        old = today - timedelta(days=overdue.OVERDUE_DAYS + 1)
+        self.late = [
+            Invoice.objects.create(code=f'L{i}', car=car, parking_spot=spot, spot_price=5 + i, issue_date=old - timedelta(days=i))
+            for i in range(5)
+        ]
+        Invoice.objects.create(code='F', car=car, parking_spot=spot, spot_price=5, issue_date=today - timedelta(days=overdue.OVERDUE_DAYS))
+        Invoice.objects.create(code='P', car=car, parking_spot=spot, spot_price=5, issue_date=old, payment_date=timezone.now())
+        Invoice.objects.create(code='D', car=car, parking_spot=spot, spot_price=5, issue_date=old, debt=5)
+
+    def indebted(self):
+        return set(Invoice.objects.filter(debt__gt=0).values_list('code', flat=True))
+
+    def test_marks_overdue_invoices_and_keeps_rollups_in_sync(self):
+        progress = overdue.mark_overdue(chunk_size=2)
+        self.assertEqual((progress.total, progress.processed, progress.marked), (5, 5, 5))
+        self.assertEqual(self.indebted(), {'L0', 'L1', 'L2', 'L3', 'L4', 'D'})
+        self.assertTrue(all(invoice.debt == invoice.spot_price for invoice in Invoice.objects.filter(code__startswith='L')))
+        incremental = charts.build_chart_data('day', *charts.default_range('day', 40))
+        rollups.rebuild()
+        self.assertEqual(charts.build_chart_data('day', *charts.default_range('day', 40)), incremental)
+        self.assertEqual(overdue.mark_overdue().marked, 0)
+
+    def test_resumes_from_checkpoint(self):
+        def crash(progress):
+            raise RuntimeError('сбой')
+
+        with self.assertRaises(RuntimeError):
+            overdue.mark_overdue(chunk_size=2, report=crash)
+        self.assertEqual(BatchCheckpoint.objects.get().last_id, self.late[1].pk)
+        progress = overdue.mark_overdue(chunk_size=2)
+        self.assertEqual((progress.total, progress.marked), (3, 3))
+        self.assertEqual(len(self.indebted()), 6)
+
+    def test_command_reports_progress(self):
+        out = io.StringIO()
+        call_command('mark_overdue_invoices', chunk_size=3, stdout=out)
+        self.assertIn('Просмотрено 3/5', out.getvalue())
+        self.assertIn('отмечено долгом 5 счетов', out.getvalue())
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        car = Car.objects.create(license_plate='AA-1', brand='Lada', model='Vesta')
+        spot = ParkingSpot.objects.create(number=1, price=5)
+        user = User.objects.create(username='client')
+        client = Client.objects.create(user=user, name='client', email='client@example.com')
+        car.clients.add(client)
+        for code, day, paid, debt in (('A', 1, True, 0), ('B', 2, False, 0), ('C', 3, False, 5)):
+            Invoice.objects.create(
+                code=code, car=car, parking_spot=spot, spot_price=5, issue_date=date(2025, 1, day),
+                payment_date=timezone.now() if paid else None, debt=debt,
+            )
+        Income.objects.bulk_create([Income(amount=i, date=date(2025, 1, 1), description=f'Доход {i}') for i in range(50)])
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+
+    def download(self, url):
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_with_date_range_and_status(self):
+        content = self.download('/api/export/invoices/?status=unpaid&start=2025-01-02&end=2025-01-02')
+        self.assertEqual(content.splitlines(), [
+            'id,code,car,spot,spot_price,issue_date,payment_date,debt',
+            f'{Invoice.objects.get(code="B").pk},B,AA-1,1,5.00,2025-01-02,,0.00',
+        ])
+
+    def test_jsonl(self):
+        lines = self.download('/api/export/clients/?format=jsonl&status=debtor').splitlines()
+        self.assertEqual([json.loads(line)['name'] for line in lines], ['client'])
+        self.assertEqual(self.download('/api/export/clients/?format=jsonl&status=clear'), '')
+
+    def test_invalid_parameters(self):
+        for query in ('invoices/?status=lost', 'invoices/?start=2025-13-01', 'invoices/?format=xml', 'users/'):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/api/export/{query}').status_code, 400)
+
+    def test_report_counts_rows_and_bytes_across_chunks(self):
+        report = export.ExportReport()
+        with mock.patch.object(export, 'BUFFER_SIZE', 100):
+            chunks = list(export.stream('income', export.rows('income'), 'jsonl', report=report))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual((report.rows, report.bytes), (50, sum(len(chunk) for chunk in chunks)))
+
+    async def test_asgi_response_is_streamed_asynchronously(self):
+        await self.async_client.aforce_login(await User.objects.aget(username='admin'))
+        response = await self.async_client.get('/api/export/income/?format=csv')
+        # Синхронный генератор под ASGI был бы собран в список целиком
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(len(content.splitlines()), 51)
+
+    async def test_async_iteration_pulls_one_chunk_at_a_time(self):
+        report = export.ExportReport()
+        finished = []
+        with mock.patch.object(export, 'BUFFER_SIZE', 100):
+            chunks = export.aiterate(export.stream('income', export.rows('income'), 'jsonl', report, finished.append))
+            await anext(chunks)
+            self.assertLess(report.rows, 50)
+            await chunks.aclose()
+        self.assertEqual(finished, [report])
+
+    def test_command(self):
+        out, err = io.StringIO(), io.StringIO()
+        call_command('export_data', 'income', format='csv', stdout=out, stderr=err)
+        self.assertEqual(len(out.getvalue().splitlines()), 51)
+        self.assertIn('Выгружено: 50 строк', err.getvalue())
+
+
+@override_settings(ROLE_CACHE_TIMEOUT=60)
+class RoleResolutionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='client')
+        self.user.groups.add(Group.objects.get_or_create(name=roles.CLIENT_GROUP)[0])
+        self.user = User.objects.get(pk=self.user.pk)
+
+    def test_groups_are_loaded_once_per_user_object(self):
+        with self.assertNumQueries(1):
+            user_roles = roles.get_roles(self.user)
+            for _ in range(5):
+                self.assertTrue(user_roles.is_client)
+                self.assertFalse(roles.get_roles(self.user).is_employee)
+
+    def test_cross_request_cache_is_invalidated_on_membership_change(self):
+        self.assertTrue(roles.get_roles(self.user).is_client)
+        with self.assertNumQueries(0):
+            self.assertTrue(roles.get_roles(User(pk=self.user.pk)).is_client)
+
+        self.user.groups.add(Group.objects.get_or_create(name=roles.EMPLOYEE_GROUP)[0])
+        self.assertTrue(roles.get_roles(self.user).is_employee)
+        fresh = User.objects.get(pk=self.user.pk)
+        self.assertTrue(roles.get_roles(fresh).is_employee)
+
+        Group.objects.get(name=roles.EMPLOYEE_GROUP).user_set.clear()
+        self.assertFalse(roles.get_roles(User.objects.get(pk=self.user.pk)).is_employee)
+
+
+class RoleContextProcessorTests(TestCase):
+    def setUp(self):
+        caches['pages'].clear()
+
+    def test_static_pages_make_no_queries_for_anonymous_users(self):
+        for url in ('/about/', '/privacy/'):
+            with self.subTest(url=url), self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_flags_are_resolved_lazily_once_per_request(self):
+        user = User.objects.create(username='client')
+        user.groups.add(Group.objects.get_or_create(name=roles.CLIENT_GROUP)[0])
+        self.client.force_login(user)
+        response = self.client.get('/about/')
+        self.assertContains(response, 'Личный кабинет')
+        self.assertTrue(response.context['is_client'])
+        self.assertFalse(response.context['is_employee'])
+
+
+class SessionWriteTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Файловый кэш сессий — во временном каталоге, чтобы clear() в тестах
+        # не удалял настоящий BASE_DIR/cache/sessions
+        directory = cls.enterClassContext(tempfile.TemporaryDirectory())
+        sessions_cache = {**settings.CACHES['sessions'], 'LOCATION': directory}
+        cls.enterClassContext(override_settings(CACHES={**settings.CACHES, 'sessions': sessions_cache}))
+        super().setUpClass()
+
+    def setUp(self):
+        caches['sessions'].clear()
+        self.user = User.objects.create(username='client')
+        self.client.force_login(self.user)
+
+    def session_writes(self, requests):
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(requests):
+                self.assertEqual(self.client.get('/about/').status_code, 200)
+        return [q['sql'] for q in queries if 'django_session' in q['sql'] and not q['sql'].startswith('SELECT')]
+
+    def test_requests_do_not_write_fresh_session(self):
+        self.assertEqual(self.session_writes(20), [])
+
+    def test_session_refreshed_after_half_lifetime(self):
+        key = self.client.session.session_key
+        expires = Session.objects.get(pk=key).expire_date
+        later = time.time() + settings.SESSION_COOKIE_AGE * 0.6
+        with mock.patch('parking.sessions.time.time', return_value=later):
+            self.assertEqual(len(self.session_writes(3)), 1)
+        self.assertGreater(Session.objects.get(pk=key).expire_date, expires)
+
+    def test_session_restored_from_database_without_cache(self):
+        caches['sessions'].clear()
+        response = self.client.get('/about/')
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+    def test_local_memory_cache_is_rejected(self):
+        self.assertEqual(sessions.check_shared_cache(None), [])
+        local = {**settings.CACHES, 'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=local):
+            self.assertEqual([error.id for error in sessions.check_shared_cache(None)], ['parking.E001'])
+
+    def test_clear_expired_keeps_grace_period(self):
+        now = timezone.now()
+        age = settings.SESSION_COOKIE_AGE
+        Session.objects.create(session_key='old', session_data='', expire_date=now - timedelta(seconds=age))
+        Session.objects.create(session_key='grace', session_data='', expire_date=now - timedelta(seconds=age / 4))
+        with mock.patch.object(sessions, 'CLEAR_CHUNK_SIZE', 1):
+            sessions.SessionStore.clear_expired()
+        self.assertFalse(Session.objects.filter(pk='old').exists())
+        self.assertTrue(Session.objects.filter(pk='grace').exists())
+
+
+class PublicPageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['pages'].clear()
+        Article.objects.create(title='Первая новость', summary='...')
+
+    def test_repeated_hits_are_served_from_cache(self):
+        first = self.client.get('/news/')
+        with self.assertNumQueries(0):
+            second = self.client.get('/news/')
+        self.assertEqual(first.content, second.content)
+        self.assertContains(second, 'Первая новость')
+
+    def test_saving_an_article_invalidates_the_page(self):
+        self.client.get('/news/')
+        Article.objects.create(title='Вторая новость', summary='...')
+        self.assertContains(self.client.get('/news/'), 'Вторая новость')
+
+    def test_conditional_get(self):
+        response = self.client.get('/news/')
+        self.assertTrue(response.has_header('Last-Modified'))
+        not_modified = self.client.get('/news/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        Article.objects.create(title='Вторая новость', summary='...')
+        self.assertEqual(self.client.get('/news/', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_cached_page_gets_a_fresh_csrf_token_per_user(self):
+        group = Group.objects.get_or_create(name=roles.CLIENT_GROUP)[0]
+        for username in ('first', 'second'):
+            user = User.objects.create(username=username)
+            user.groups.add(group)
+            browser = TestClient(enforce_csrf_checks=True)
+            browser.force_login(user)
+            page = browser.get('/news/').content.decode()
+            self.assertNotIn('__parking_csrf_token__', page)
+            token = page.split('name="csrfmiddlewaretoken" value="')[1].split('"')[0]
+            self.assertEqual(browser.post('/logout/', {'csrfmiddlewaretoken': token}).status_code, 302)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        caches['pages'].clear()
+        moment = timezone.now()
+        # Одинаковые даты у соседних статей проверяют разрешение по id
+        Article.objects.bulk_create(
+            Article(title=f'Новость {i}', summary='...', created_at=moment - timedelta(minutes=i // 2))
+            for i in range(45)
+        )
+
+    def test_pages_cover_all_rows_in_order(self):
+        expected = list(Article.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        seen, cursor = [], None
+        while True:
+            page = pagination.keyset_paginate(Article.objects.all(), 'created_at', cursor, per_page=10)
+            seen += [article.id for article in page.items]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+
+    def test_deep_page_is_a_single_query(self):
+        cursor = pagination.keyset_paginate(Article.objects.all(), 'created_at', per_page=40).next_cursor
+        with self.assertNumQueries(1):
+            page = pagination.keyset_paginate(Article.objects.all(), 'created_at', cursor, per_page=10)
+        self.assertEqual(len(page.items), 5)
+        self.assertFalse(page.has_next)
+
+    def test_json_api(self):
+        data = self.client.get('/api/news/?limit=20').json()
+        self.assertEqual(len(data['results']), 20)
+        rest = self.client.get('/api/news/', {'cursor': data['next_cursor'], 'limit': 100}).json()
+        self.assertEqual(len(rest['results']), 25)
+        self.assertIsNone(rest['next_cursor'])
+        self.assertEqual(self.client.get('/api/news/?cursor=garbage').status_code, 400)
+        self.assertEqual(self.client.get('/news/?cursor=garbage').status_code, 400)
+
+
+class DashboardQueryCountTests(TestCase):
+    # Максимальное число запросов на панель независимо от объёма данных
+    BUDGETS = {
+        '/admin_dashboard/': 13,
+        '/employee/': 13,
+        '/client/': 11,
+    }
+
+    def setUp(self):
+        cache.clear()
+        availability.index.clear()
+        admin = User.objects.create(username='admin', is_superuser=True)
+        worker = User.objects.create(username='worker')
+        worker.groups.add(Group.objects.create(name=roles.EMPLOYEE_GROUP))
+        Employee.objects.create(user=worker, name='worker', email='worker@example.com')
+        owner = User.objects.create(username='owner')
+        owner.groups.add(Group.objects.create(name=roles.CLIENT_GROUP))
+        self.owner = Client.objects.create(user=owner, name='owner', email='owner@example.com')
+        self.users = {'/admin_dashboard/': admin, '/employee/': worker, '/client/': owner}
+        self.rows = 0
+
+    def seed(self, rows):
+        """
+        Догружает данные до rows клиентов, машин, мест и счетов; каждая вторая
+        машина принадлежит ещё и клиенту, чья панель проверяется.
+        """
+        new = range(self.rows, rows)
+        users = User.objects.bulk_create(User(username=f'user{i}') for i in new)
+        clients = Client.objects.bulk_create(
+            Client(user=user, name=user.username, email=f'{user.username}@example.com') for user in users
+        )
+        cars = Car.objects.bulk_create(Car(license_plate=f'CAR-{i}', brand='Lada', model='Vesta') for i in new)
+        owners = Car.clients.through
+        owners.objects.bulk_create(
+            [owners(car=car, client=client) for car, client in zip(cars, clients)]
+            + [owners(car=car, client=self.owner) for car in cars[::2]]
+        )
+        spots = ParkingSpot.objects.bulk_create(
+            ParkingSpot(number=i, price=5, is_occupied=i % 2 == 0, car=car if i % 2 == 0 else None)
+            for i, car in zip(new, cars)
+        )
+        Invoice.objects.bulk_create(
+            Invoice(code=f'I{i}', car=car, parking_spot=spot, spot_price=5, issue_date=date.today(), debt=i % 3)
+            for i, car, spot in zip(new, cars, spots)
+        )
+        self.rows = rows
+
+    def test_query_count_does_not_grow_with_data(self):
+        # Списки панелей ограничены LIST_LIMIT, поэтому данных в несколько раз
+        # больше лимита достаточно: дальше объём страницы уже не растёт
+        for rows in (10, dashboards.LIST_LIMIT * 4):
+            self.seed(rows)
+            for url, user in self.users.items():
+                with self.subTest(rows=rows, url=url):
+                    self.client.force_login(user)
+                    with CaptureQueriesContext(connection) as queries:
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertLessEqual(len(queries), self.BUDGETS[url])
+
+    def test_lists_are_capped(self):
+        self.seed(dashboards.LIST_LIMIT * 4)
+        lists = {
+            '/admin_dashboard/': ['clients', 'cars', 'parking_spots', 'occupied_spots', 'clients_with_debt'],
+            '/employee/': ['clients', 'invoices', 'occupied_spots', 'clients_with_debt'],
+            '/client/': ['cars', 'invoices', 'parking_spots'],
+        }
+        for url, names in lists.items():
+            self.client.force_login(self.users[url])
+            response = self.client.get(url)
+            for name in names:
+                with self.subTest(url=url, name=name):
+                    self.assertEqual(len(response.context[name]), dashboards.LIST_LIMIT)
+                    self.assertTrue(response.context[name].has_more)
+            self.assertContains(response, f'Показаны первые {dashboards.LIST_LIMIT}')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Планы запросов проверяются для SQLite')
+class QueryPlanTests(TestCase):
+    HOT_TABLES = ('parking_invoice', 'parking_parkingspot')
+
+    def assertUsesIndexes(self, queryset, *indexes):
+        plan = queryset.explain()
+        for index in indexes:
+            self.assertIn(f'INDEX {index}', plan)
+        for table in self.HOT_TABLES:
+            # SCAN без USING INDEX — полный просмотр таблицы
+            self.assertNotRegex(plan, rf'SCAN {table}\s*(\n|$)')
+
+    def test_dashboard_and_report_queries_use_indexes(self):
+        client = Client.objects.create(user=User.objects.create(username='client'), name='client', email='c@example.com')
+        start, end = date(2025, 1, 1), date(2025, 3, 31)
+        queries = {
+            'occupied_spots': (dashboards.occupied_spots(), ['spot_occupied_number_car_idx']),
+            'clients_with_debt': (dashboards.clients_with_debt(), ['invoice_debt_car_idx']),
+            'employee_invoices': (dashboards.invoice_list(), ['invoice_issue_id_idx']),
+            'client_invoices': (dashboards.invoice_list(Invoice.objects.filter(car__clients=client)), []),
+            'debtors': (debtors.ranked_debtors()[:10], []),
+            'period_debt': (analytics.period_debt_rows(start, end), ['invoice_period_debt_idx']),
+            'period_total_debt': (
+                Invoice.objects.filter(issue_date__range=(start, end)).values('debt'), ['invoice_period_debt_idx'],
+            ),
+            'overdue_chunk': (
+                overdue.pending(overdue.cutoff()).filter(pk__gt=0).order_by('pk').values_list('pk', flat=True)[:100],
+                ['invoice_unpaid_no_debt_idx'],
+            ),
+            'unpaid_by_spot': (Invoice.objects.filter(parking_spot__in=[1, 2], payment_date__isnull=True), ['invoice_unpaid_spot_idx']),
+            'parked_car': (ParkingSpot.objects.filter(car_id=1, is_occupied=True), ['spot_parked_car_idx']),
+            'unpaid_export': (export.rows('invoices', start, end, 'unpaid'), ['invoice_unpaid_issue_idx']),
+        }
+        for name, (queryset, indexes) in queries.items():
+            with self.subTest(query=name):
+                self.assertUsesIndexes(queryset, *indexes)
+
+    def test_ownership_reports_use_indexes(self):
+        queries = {
+            'multi_owner_cars': (ownership.multi_owner_cars(), 'car_multi_owner_idx'),
+            'cars_of_brand': (ownership.cars_of_brand(' Toyota '), 'car_brand_key_plate_idx'),
+            'brand_prefix': (ownership.find_brands('to'), 'car_brand_key_plate_idx'),
+        }
+        for name, (queryset, index) in queries.items():
+            with self.subTest(query=name):
+                plan = queryset.explain()
+                self.assertIn(f'INDEX {index}', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+
+class ReplicaTests(SimpleTestCase):
+    def test_snapshot_copies_database(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source, target = os.path.join(directory, 'db.sqlite3'), os.path.join(directory, 'replica.sqlite3')
+            with sqlite3.connect(source) as db:
+                db.execute('PRAGMA journal_mode=WAL')
+                db.execute('CREATE TABLE spot (id INTEGER PRIMARY KEY)')
+                db.executemany('INSERT INTO spot VALUES (?)', [(i,) for i in range(50)])
+            db.close()
+            replica.snapshot(source, target)
+            copy = sqlite3.connect(target)
+            self.assertEqual(copy.execute('SELECT count(*) FROM spot').fetchone()[0], 50)
+            self.assertEqual(copy.execute('PRAGMA journal_mode').fetchone()[0], 'delete')
+            copy.close()
+            # Временный файл подменил реплику, файлов WAL у неё нет
+            self.assertEqual([name for name in os.listdir(directory) if name.startswith(('.snapshot-', 'replica.sqlite3-'))], [])
+
+    def test_router_sends_only_reporting_reads_to_fresh_replica(self):
+        router = replica.ReplicaRouter()
+        with mock.patch.object(replica, 'is_mirror', return_value=False), \
+                mock.patch.object(replica, 'refresh_in_background') as refresh:
+            self.assertIsNone(router.db_for_read(Car))
+            with replica.reporting():
+                self.assertEqual(router.db_for_write(Car), 'default')
+                for age, alias, refreshed in [(None, 'default', True), (10, 'replica', False),
+                                              (120, 'replica', True), (1000, 'default', True)]:
+                    refresh.reset_mock()
+                    with self.subTest(age=age), mock.patch.object(replica, 'lag', return_value=age):
+                        self.assertEqual(router.db_for_read(Car), alias)
+                        self.assertEqual(refresh.called, refreshed)
+            self.assertIsNone(router.db_for_read(Car))
+
+    def test_mirror_reads_primary(self):
+        self.assertTrue(replica.is_mirror())
+        with replica.reporting():
+            self.assertEqual(replica.ReplicaRouter().db_for_read(Car), 'default')
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        caches['pages'].clear()
+        metrics.reset()
+
+    def test_requests_are_recorded_per_url_name(self):
+        Article.objects.create(title='Новость', summary='...')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/news/')
+        count = len(queries)
+        self.assertIn('sql;dur=', response['Server-Timing'])
+        totals = metrics.snapshot()['news']
+        self.assertEqual(totals['requests'], 1)
+        self.assertEqual(totals['queries'], count)
+
+        body = self.client.get('/metrics').content.decode()
+        self.assertIn(f'parking_sql_queries_total{{view="news"}} {count}', body)
+        self.assertIn('# TYPE parking_request_seconds_total counter', body)
+
+    def test_metrics_are_local_only(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.1').status_code, 404)
+
+    @override_settings(METRICS_STRICT_BUDGETS=True, METRICS_BUDGETS={'news': {'queries': 0}})
+    def test_exceeded_budget_fails_the_request(self):
+        with self.assertRaises(metrics.BudgetExceeded):
+            self.client.get('/news/')
+
+
+class LazyLoggingTests(TestCase):
+    def setUp(self):
+        self.logger = log.get_logger('parking.tests.lazy')
+
+    def test_disabled_level_does_not_evaluate_arguments(self):
+        calls = []
+        self.logger.logger.setLevel(logging.INFO)
+        self.logger.debug('value: %s', log.lazy(calls.append, 1))
+        self.assertEqual(calls, [])
+
+    def test_log_statement_cannot_query(self):
+        with self.assertLogs('parking.tests.lazy', 'DEBUG') as logs:
+            self.logger.debug('users: %s', log.lazy(lambda: list(User.objects.all())))
+        self.assertEqual(logs.output, [f'DEBUG:parking.tests.lazy:users: {log.QUERY_BLOCKED}'])
+
+    def test_fields_and_sampling(self):
+        with self.assertLogs('parking.tests.lazy', 'DEBUG') as logs:
+            self.logger.debug('dropped', sample=0)
+            self.logger.info('spot occupied', spot=7)
+        record, = logs.records
+        self.assertEqual((record.getMessage(), record.fields), ('spot occupied spot=7', {'spot': 7}))
+        self.assertEqual(record.funcName, 'test_fields_and_sampling')
+
+    def test_debug_logging_adds_no_queries(self):
+        user = User.objects.create(username='worker')
+        user.groups.add(Group.objects.create(name=roles.EMPLOYEE_GROUP))
+        Employee.objects.create(user=user, name='worker', email='worker@example.com')
+        self.client.force_login(user)
+        counts = []
+        for level in ('INFO', 'DEBUG'):
+            cache.clear()
+            with self.assertLogs('parking', level), CaptureQueriesContext(connection) as queries:
+                logging.getLogger('parking').info('start')
+                self.client.get('/employee/')
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class SpotOccupationTests(TransactionTestCase):
+    THREADS = 16
+
+    def setUp(self):
+        self.spot = ParkingSpot.objects.create(number=1, price=5)
+        self.cars = [
+            Car.objects.create(license_plate=f'CAR-{i}', brand='Lada', model='Vesta')
+            for i in range(self.THREADS)
+        ]
+
+    def race(self, target, args):
+        """
+        Запускает target одновременно во всех потоках и возвращает их результаты.
+        """
+        barrier = threading.Barrier(len(args))
+        results = [None] * len(args)
+
+        def worker(i):
+            barrier.wait()
+            try:
+                results[i] = target(*args[i])
+            except Exception as e:
+                results[i] = e
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(args))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_only_one_car_takes_a_contended_spot(self):
+        results = self.race(occupation.occupy, [(self.spot.id, car.id) for car in self.cars])
+        winners = [result for result in results if isinstance(result, Invoice)]
+        self.assertEqual(len(winners), 1, results)
+        self.assertTrue(all(isinstance(result, (Invoice, occupation.SpotTaken)) for result in results), results)
+        self.spot.refresh_from_db()
+        self.assertEqual(self.spot.car_id, winners[0].car_id)
+        self.assertEqual(Invoice.objects.count(), 1)
+
+    def test_one_car_cannot_take_two_spots(self):
+        spots = [self.spot] + [ParkingSpot.objects.create(number=n, price=5) for n in range(2, self.THREADS + 1)]
+        results = self.race(occupation.occupy, [(spot.id, self.cars[0].id) for spot in spots])
+        self.assertEqual(sum(isinstance(result, Invoice) for result in results), 1, results)
+        self.assertEqual(ParkingSpot.objects.filter(car=self.cars[0], is_occupied=True).count(), 1)
+
+    def test_code_collision_is_retried(self):
+        other = ParkingSpot.objects.create(number=2, price=5)
+        codes = iter(['SAMECODE', 'SAMECODE', 'NEWCODE1'])
+        with mock.patch.object(occupation, 'new_invoice_code', lambda: next(codes)):
+            occupation.occupy(self.spot.id, self.cars[0].id)
+            invoice = occupation.occupy(other.id, self.cars[1].id)
+        self.assertEqual(invoice.code, 'NEWCODE1')
+
+    def test_owner_is_checked(self):
+        user = User.objects.create(username='owner')
+        client = Client.objects.create(user=user, name='owner', email='owner@example.com')
+        with self.assertRaises(occupation.NotCarOwner):
+            occupation.occupy(self.spot.id, self.cars[0].id, client=client)
+        self.assertFalse(ParkingSpot.objects.get(pk=self.spot.pk).is_occupied)
+
+
+class BatchOccupationTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='fleet')
+        user.groups.add(Group.objects.create(name=roles.CLIENT_GROUP))
+        self.owner = Client.objects.create(user=user, name='fleet', email='fleet@example.com')
+        self.cars = [Car.objects.create(license_plate=f'FL-{i}', brand='Lada', model='Largus') for i in range(20)]
+        for car in self.cars:
+            car.clients.add(self.owner)
+        self.stranger = Car.objects.create(license_plate='OTHER', brand='Lada', model='Niva')
+        self.spots = [ParkingSpot.objects.create(number=n, price=5 + n % 3) for n in range(1, 22)]
+        self.client.force_login(user)
+
+    def post(self, url, payload):
+        return self.client.post(url, json.dumps(payload), content_type='application/json')
+
+    def test_fleet_is_parked_with_a_fixed_number_of_queries(self):
+        items = [{'car': car.id, 'spot': spot.id} for car, spot in zip(self.cars, self.spots)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post('/api/spots/occupy/', {'items': items})
+        self.assertLess(len(queries), 30)
+        self.assertTrue(response.json()['ok'])
+        self.assertEqual(Invoice.objects.count(), 20)
+        self.assertEqual(len({result['invoice'] for result in response.json()['results']}), 20)
+
+        # bulk-операции обходят сигналы, но статистика и срезы совпадают с пересчётом
+        incremental = (stats.rental_distribution(), list(DailyParkingStats.objects.values(*rollups.ROLLUP_FIELDS)))
+        stats.rebuild()
+        rollups.rebuild()
+        self.assertEqual(incremental, (stats.rental_distribution(), list(DailyParkingStats.objects.values(*rollups.ROLLUP_FIELDS))))
+
+    def test_atomic_batch_rolls_back_on_any_error(self):
+        items = [{'car': self.cars[0].id, 'spot': self.spots[0].id}, {'car': self.stranger.id, 'spot': self.spots[1].id}]
+        response = self.post('/api/spots/occupy/', {'items': items})
+        self.assertEqual(response.status_code, 409)
+        errors = [result['error'] for result in response.json()['results']]
+        self.assertEqual(errors, [occupation.BATCH_ABORTED, occupation.NotCarOwner.message])
+        self.assertFalse(ParkingSpot.objects.filter(is_occupied=True).exists())
+
+    def test_partial_batch_applies_valid_items(self):
+        items = [
+            {'car': self.cars[0].id, 'spot': self.spots[0].id},
+            {'car': self.cars[1].id, 'spot': self.spots[0].id},
+            {'car': self.cars[0].id, 'spot': self.spots[1].id},
+        ]
+        results = self.post('/api/spots/occupy/', {'items': items, 'mode': 'partial'}).json()['results']
+        self.assertEqual(
+            [result['error'] for result in results],
+            [None, occupation.SpotTaken.message, occupation.CarAlreadyParked.message],
+        )
+
+    def test_release(self):
+        occupation.occupy_many([(car.id, spot.id) for car, spot in zip(self.cars[:3], self.spots)])
+        Invoice.objects.filter(parking_spot=self.spots[0]).update(issue_date=date.today() - timedelta(days=40))
+        response = self.post('/api/spots/release/', {'spots': [spot.id for spot in self.spots[:3]]})
+        self.assertTrue(response.json()['ok'])
+        self.assertFalse(ParkingSpot.objects.filter(is_occupied=True).exists())
+        overdue, = Invoice.objects.all()
+        self.assertEqual(overdue.debt, overdue.spot_price)
+        self.assertEqual(self.post('/api/spots/release/', {'spots': 'all'}).status_code, 400)
+
+
+class AvailabilityIndexTests(TestCase):
+    def setUp(self):
+        availability.index.clear()
+        self.spots = {n: ParkingSpot.objects.create(number=n, price=price) for n, price in ((5, 3), (7, 1), (9, 2), (900, 1))}
+
+    def test_queries_are_answered_from_memory(self):
+        availability.index.reload()
+        with self.assertNumQueries(0):
+            self.assertEqual(availability.index.count_free(), 4)
+            self.assertEqual([spot.number for spot in availability.index.cheapest_free(3)], [7, 900, 9])
+            self.assertEqual([spot.number for spot in availability.index.cheapest_free(None, max_price=1)], [7, 900])
+            self.assertEqual([spot.number for spot in availability.index.free_in_range(6, 899)], [7, 9])
+
+    def test_index_follows_saves_and_bulk_occupation(self):
+        availability.index.reload()
+        car = Car.objects.create(license_plate='AA-1', brand='Lada', model='Vesta')
+        with self.captureOnCommitCallbacks(execute=True):
+            occupation.occupy(self.spots[7].id, car.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            spot = self.spots[5]
+            spot.price = 0
+            spot.save()
+        self.assertEqual([spot.number for spot in availability.index.cheapest_free(2)], [5, 900])
+        self.assertEqual(availability.index.count_free(), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            occupation.release_many([self.spots[7].id])
+        self.assertEqual(availability.index.count_free(), 4)
+
+    def test_json_endpoint(self):
+        data = self.client.get('/api/spots/free/?order=number&from=6&limit=2').json()
+        self.assertEqual(data['free'], 4)
+        self.assertEqual([spot['number'] for spot in data['spots']], [7, 9])
+        self.assertEqual(self.client.get('/api/spots/free/?from=x').status_code, 400)
+
+
+class SpotEventStreamTests(TestCase):
+    def setUp(self):
+        availability.index.clear()
+        self.spot = ParkingSpot.objects.create(number=1, price=5)
+        self.car = Car.objects.create(license_plate='AA-1', brand='Lada', model='Vesta')
+
+    def published(self, since):
+        return [(event.type, event.data['spot']) for event in events.broker._history if event.id > since]
+
+    def test_occupancy_and_price_changes_are_published(self):
+        availability.index.reload()
+        since = events.broker._last_id
+        with self.captureOnCommitCallbacks(execute=True):
+            occupation.occupy(self.spot.id, self.car.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            occupation.release_many([self.spot.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.spot.refresh_from_db()
+            self.spot.price = 7
+            self.spot.save()
+        self.assertEqual(self.published(since), [('occupy', self.spot.id), ('free', self.spot.id), ('price', self.spot.id)])
+
+    def test_missed_events_are_replayed(self):
+        async def backlog(last_event_id):
+            queue, events_ = events.broker.subscribe(last_event_id)
+            events.broker.unsubscribe(queue)
+            return [event.type for event in events_]
+
+        first = events.broker.publish('free', {'spot': 1})
+        events.broker.publish('occupy', {'spot': 1})
+        self.assertEqual(async_to_sync(backlog)(first.id), ['occupy'])
+        self.assertEqual(async_to_sync(backlog)(first.id + 100), ['resync'])
+
+    async def test_stream_requires_login(self):
+        response = await self.async_client.get(reverse('spot_events'))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(events.broker.subscribers, 0)
+
+    async def test_asgi_stream(self):
+        worker = await User.objects.acreate(username='worker')
+        await worker.groups.aadd(await Group.objects.acreate(name=roles.EMPLOYEE_GROUP))
+        await self.async_client.aforce_login(worker)
+        # Запрос проходит через middleware Django (сессия, аутентификация, роли)
+        response = await self.async_client.get(reverse('spot_events'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream; charset=utf-8')
+        self.assertTrue(response.is_async)
+        # Поток читается в задаче, как в ASGI-обработчике Django
+        chunks = asyncio.Queue()
+
+        async def read():
+            async for chunk in response.streaming_content:
+                await chunks.put(chunk.decode())
+
+        reader = asyncio.create_task(read())
+        hello = await asyncio.wait_for(chunks.get(), 5)
+        self.assertIn('event: hello\ndata: {"free": 1}', hello)
+
+        # Публикация из другого потока, как из on_commit синхронного представления
+        await sync_to_async(events.broker.publish, thread_sensitive=False)('occupy', {'spot': self.spot.id, 'free': 0})
+        body = await asyncio.wait_for(chunks.get(), 5)
+        self.assertIn('event: occupy', body)
+        # При отключении клиента обработчик отменяет задачу, и подписка снимается
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+        self.assertEqual(events.broker.subscribers, 0)
+
+    def test_wsgi_pages_skip_the_stream(self):
+        worker = User.objects.create(username='worker')
+        worker.groups.add(Group.objects.create(name=roles.EMPLOYEE_GROUP))
+        Employee.objects.create(user=worker, name='worker', email='worker@example.com')
+        self.client.force_login(worker)
+        self.assertEqual(self.client.get(reverse('spot_events')).status_code, 204)
+        self.assertNotContains(self.client.get('/employee/'), 'EventSource')
+
+        async_client = self.async_client_class()
+        async_to_sync(async_client.aforce_login)(worker)
+        self.assertContains(async_to_sync(async_client.get)('/employee/'), f"new EventSource('{reverse('spot_events')}')")
+
+
+@override_settings(EXTERNAL_CONTENT={'JOKE_URL': 'http://127.0.0.1:9/joke', 'QUOTE_URL': 'http://127.0.0.1:9/quote'})
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['pages'].clear()
+        availability.index.clear()
+        Article.objects.create(title='Первая новость', summary='...')
+        ParkingSpot.objects.create(number=1, price=5)
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+
+    async def test_public_pages(self):
+        for url in ('/', '/news/', '/contacts/', '/vacancies/'):
+            with self.subTest(url=url):
+                self.assertEqual((await self.async_client.get(url)).status_code, 200)
+        self.assertContains(await self.async_client.get('/news/'), 'Первая новость')
+
+    async def test_dashboard_api(self):
+        self.assertEqual((await self.async_client.get('/api/dashboard/')).status_code, 302)
+        await self.async_client.aforce_login(self.admin)
+        data = (await self.async_client.get('/api/dashboard/?step=week')).json()
+        self.assertEqual(data['step'], 'week')
+        self.assertEqual(data['summary']['free_spots'], 1)
+        self.assertEqual(data['summary']['occupied_spots'], 0)
+        self.assertEqual(data['charts'], await sync_to_async(charts.build_chart_data)('week'))
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+    def test_reports_wsgi_and_asgi(self):
+        out = io.StringIO()
+        call_command('benchmark_asgi', '/contacts/', requests=3, concurrency=2, host='testserver', stdout=out)
+        rows = [line.split() for line in out.getvalue().splitlines()[2:]]
+        self.assertEqual([row[0] for row in rows], ['WSGI', 'ASGI'])
+        self.assertEqual([row[-1] for row in rows], ['0', '0'])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Профиль PRAGMA только для SQLite')
+class SQLiteProfileTests(TestCase):
+    def test_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            values = {}
+            for pragma in ['journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size']:
+                cursor.execute(f'PRAGMA {pragma}')
+                values[pragma] = cursor.fetchone()[0]
+        self.assertEqual(values['journal_mode'], 'wal')
+        self.assertEqual(values['synchronous'], 1)  # NORMAL
+        self.assertEqual(values['busy_timeout'], 20000)
+        self.assertEqual(values['cache_size'], -64 * 1024)
+        self.assertGreater(values['mmap_size'], 0)
+
+    def test_benchmark_compares_profiles(self):
+        out = io.StringIO()
+        call_command('benchmark_sqlite', readers=2, writers=1, seconds=0.2, stdout=out)
+        rows = [line.split() for line in out.getvalue().splitlines()[2:]]
+        self.assertEqual([row[0] for row in rows], ['default', 'tuned'])
+        self.assertTrue(all(float(row[1]) > 0 and float(row[2]) > 0 for row in rows))
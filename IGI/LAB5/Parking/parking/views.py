@@ -2,47 +2,87 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.views import LoginView
 from django.views.generic import CreateView, ListView, UpdateView, DeleteView
-from django.db.models import Sum, Count, Q
-from django.http import HttpResponse, Http404
+from django.views.decorators.http import require_POST
+from django.db.models import Sum
+from django.http import HttpResponse, HttpResponseBadRequest, Http404, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from datetime import datetime, timedelta, time
+from django.conf import settings
+from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 import calendar
-import logging
-import requests
+from decimal import Decimal, InvalidOperation
+from dataclasses import asdict
+import asyncio
+import json
+from asgiref.sync import sync_to_async
 from django.contrib.auth import logout
+from django.core.handlers.asgi import ASGIRequest
 from .models import Service, ServiceCategory, PromoCode, Coupon, Client, Car, Invoice, ParkingSpot, Employee, Article, Term, EmployeeContact, JobVacancy, Review
 from django.urls import reverse_lazy
 from .forms import SignUpForm
 from django.contrib.auth import login
-from django.db.models.functions import TruncDate
-
-# Настройка логирования
-logger = logging.getLogger(__name__)
-
-# Проверка ролей пользователя
+from .debtors import top_debtors, get_biggest_debtor
+from .analytics import period_debt_report, period_total_debt
+from .external import aget_external_content
+from .charts import abuild_chart_data, build_chart_data, STEPS as CHART_STEPS
+from . import availability, dashboards, events, export, occupation, overdue, ownership
+from .page_cache import cached_page
+from .replica import reporting
+from .log import get_logger, lazy, user_label
+from .metrics import render_prometheus
+from .pagination import InvalidCursor, akeyset_paginate, keyset_paginate, page_size
+from .roles import aload_user, get_roles
+from .stats import aage_distribution, aget_most_profitable_spot, arental_distribution
+
+# Настройка логирования: аргументы форматируются только для включённых уровней,
+# записи лога не могут обращаться к базе (см. parking/log.py)
+logger = get_logger(__name__)
+
+def client_names(clients):
+    return [client.name for client in clients]
+
+# Проверка ролей пользователя (группы загружаются один раз за запрос, см. roles.py)
 def is_admin(user):
-    logger.debug(f"Checking is_admin for user {user.username if user.is_authenticated else 'Anonymous'}, is_superuser: {user.is_superuser if user.is_authenticated else 'N/A'}")
-    return user.is_authenticated and user.is_superuser
+    result = get_roles(user).is_admin
+    logger.debug("Checking is_admin for user %s: %s", user_label(user), result)
+    return result
 
 def is_employee(user):
-    logger.debug(f"Checking is_employee for user {user.username if user.is_authenticated else 'Anonymous'}, in Employee group: {user.groups.filter(name='Employee').exists() if user.is_authenticated else 'N/A'}")
-    return user.is_authenticated and user.groups.filter(name='Employee').exists()
+    roles = get_roles(user)
+    result = roles.is_employee
+    logger.debug("Checking is_employee for user %s, groups: %s", user_label(user), lazy(sorted, roles.group_names))
+    return result
 
 def is_client(user):
-    logger.debug(f"Checking is_client for user {user.username if user.is_authenticated else 'Anonymous'}, in Client group: {user.groups.filter(name='Client').exists() if user.is_authenticated else 'N/A'}")
-    return user.is_authenticated and user.groups.filter(name='Client').exists()
+    roles = get_roles(user)
+    result = roles.is_client
+    logger.debug("Checking is_client for user %s, groups: %s", user_label(user), lazy(sorted, roles.group_names))
+    return result
 
 def is_client_or_admin(user):
     return is_client(user) or is_admin(user)
 
+def is_admin_or_employee(user):
+    return is_admin(user) or is_employee(user)
+
+def has_dashboard(user):
+    return is_admin_or_employee(user) or is_client(user)
+
+# Async-представления: запросы к базе идут через асинхронный API ORM,
+# а шаблоны рендерятся в потоке, потому что контекстные процессоры
+# (роли, права) лениво обращаются к базе синхронно
+arender = sync_to_async(render)
+
+async def alist(queryset):
+    return [obj async for obj in queryset.aiterator()]
+
 # Кастомный LoginView для динамического перенаправления
 class CustomLoginView(LoginView):
     template_name = 'parking/login.html'
 
     def get_success_url(self):
         user = self.request.user
-        logger.debug(f"Login successful for user {user.username}, is_superuser: {user.is_superuser}, is_client: {is_client(user)}, is_employee: {is_employee(user)}")
+        logger.debug("Login successful for user %s, is_superuser: %s", user.username, user.is_superuser)
         if user.is_superuser:
             return '/admin_dashboard/'
         elif is_client(user):
@@ -53,7 +93,7 @@ class CustomLoginView(LoginView):
 
     def form_valid(self, form):
         user = form.get_user()
-        logger.debug(f"User {user.username} authenticated, is_superuser: {user.is_superuser}")
+        logger.debug("User %s authenticated, is_superuser: %s", user.username, user.is_superuser)
         if is_client(user):
             Client.objects.get_or_create(
                 user=user,
@@ -83,9 +123,11 @@ class SignUpView(CreateView):
         login(self.request, user)
         return response
 
-# Главная страница (доступна всем)
-def home(request):
-    logger.debug(f"Accessing home page, user: {request.user.username if request.user.is_authenticated else 'Anonymous'}, is_superuser: {request.user.is_superuser if request.user.is_authenticated else 'N/A'}")
+# Главная страница (доступна всем). Внешние виджеты загружаются
+# одновременно с запросами к базе
+async def home(request):
+    user = await aload_user(request)
+    logger.debug("Accessing home page, user: %s", user_label(user))
     categories = ServiceCategory.objects.all()
     services = Service.objects.all()
     promo_codes = PromoCode.objects.filter(valid_until__gte=timezone.now())
@@ -99,62 +141,44 @@ def home(request):
     if price_sort:
         services = services.order_by('price' if price_sort == 'asc' else '-price')
 
-    try:
-        joke_response = requests.get('https://official-joke-api.appspot.com/random_joke')
-        joke = joke_response.json() if joke_response.status_code == 200 else {'setup': 'Не удалось загрузить шутку', 'punchline': ''}
-    except requests.RequestException:
-        joke = {'setup': 'Не удалось загрузить шутку', 'punchline': ''}
-
-    try:
-        quote_response = requests.get('https://favqs.com/api/qotd')
-        quote = quote_response.json()['quote'] if quote_response.status_code == 200 else {'body': 'Не удалось загрузить цитату', 'author': 'Неизвестен'}
-    except requests.RequestException:
-        quote = {'body': 'Не удалось загрузить цитату', 'author': 'Неизвестен'}
-
-    total_profit = Invoice.objects.aggregate(total=Sum('spot_price'))['total'] or 0
-    parking_rentals = Invoice.objects.values('parking_spot').annotate(total=Sum('spot_price')).order_by('-total')
-    most_profitable_spot = parking_rentals.first()['parking_spot'] if parking_rentals.exists() else None
-    most_profitable_spot_profit = parking_rentals.first()['total'] if parking_rentals.exists() else 0
-
-    rental_amounts = list(Invoice.objects.values_list('spot_price', flat=True))
-    if rental_amounts:
-        avg_rental = sum(rental_amounts) / len(rental_amounts)
-        sorted_rentals = sorted(rental_amounts)
-        median_rental = (sorted_rentals[len(sorted_rentals) // 2 - 1] + sorted_rentals[len(sorted_rentals) // 2]) / 2 if len(sorted_rentals) % 2 == 0 else sorted_rentals[len(sorted_rentals) // 2]
-        mode_rental = max(set(rental_amounts), key=rental_amounts.count)
-    else:
-        avg_rental = median_rental = mode_rental = 0
-
-    client_ages = list(Client.objects.values_list('age', flat=True))
-    avg_age = sum(client_ages) / len(client_ages) if client_ages else 0
-    sorted_ages = sorted(client_ages)
-    median_age = (sorted_ages[len(sorted_ages) // 2 - 1] + sorted_ages[len(sorted_ages) // 2]) / 2 if len(sorted_ages) % 2 == 0 and sorted_ages else sorted_ages[len(sorted_ages) // 2] if sorted_ages else 0
-
-    return render(request, 'parking/home.html', {
+    (
+        external_content, categories, services, promo_codes, coupons, rentals, ages,
+        (most_profitable_spot, most_profitable_spot_profit),
+    ) = await asyncio.gather(
+        aget_external_content(),
+        alist(categories),
+        alist(services),
+        alist(promo_codes),
+        alist(coupons),
+        arental_distribution(),
+        aage_distribution(),
+        aget_most_profitable_spot(),
+    )
+    joke = external_content['joke']
+    quote = external_content['quote']
+
+    return await arender(request, 'parking/home.html', {
         'categories': categories,
         'services': services,
         'promo_codes': promo_codes,
         'coupons': coupons,
         'joke': joke,
         'quote': quote,
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
-        'total_profit': total_profit,
+        'total_profit': rentals.total,
         'most_profitable_spot': most_profitable_spot,
         'most_profitable_spot_profit': most_profitable_spot_profit,
-        'avg_rental': avg_rental,
-        'median_rental': median_rental,
-        'mode_rental': mode_rental,
-        'avg_age': avg_age,
-        'median_age': median_age,
+        'avg_rental': rentals.mean,
+        'median_rental': rentals.median,
+        'mode_rental': rentals.mode,
+        'avg_age': ages.mean,
+        'median_age': ages.median,
         'category_filter': category_filter,
         'price_sort': price_sort,
     })
 
 # Кастомный выход
 def custom_logout(request):
-    logger.debug(f"Logging out user {request.user.username if request.user.is_authenticated else 'Anonymous'}")
+    logger.debug("Logging out user %s", user_label(request.user))
     logout(request)
     return redirect('home')
 
@@ -163,10 +187,10 @@ def custom_logout(request):
 @user_passes_test(is_client)
 def client_dashboard(request):
     if not is_client(request.user):
-        logger.warning(f"User {request.user.username} failed client check in client_dashboard")
+        logger.warning("User %s failed client check in client_dashboard", request.user.username)
         return redirect('home')
 
-    logger.debug(f"Accessing client_dashboard, user: {request.user.username}, is_superuser: {request.user.is_superuser}")
+    logger.debug("Accessing client_dashboard, user: %s, is_superuser: %s", request.user.username, request.user.is_superuser)
     try:
         client = Client.objects.get(user=request.user)
     except Client.DoesNotExist:
@@ -177,9 +201,9 @@ def client_dashboard(request):
             age=18,
             timezone='Europe/Minsk'
         )
-    cars = client.cars.all()
-    invoices = Invoice.objects.filter(car__in=cars).order_by('-issue_date')
-    parking_spots = ParkingSpot.objects.all()
+    cars = dashboards.head(dashboards.cars_with_owners(client.cars.all()))
+    invoices = dashboards.head(dashboards.invoice_list(Invoice.objects.filter(car__clients=client)))
+    parking_spots = dashboards.head(availability.index.free_in_range(limit=dashboards.LIST_LIMIT + 1))
 
     now_utc = datetime.utcnow()
     today = now_utc.date()
@@ -201,86 +225,86 @@ def client_dashboard(request):
         'month': today.month,
         'year': today.year,
         'today_day': today.day,
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
     })
 
 # Страница "О компании"
+@cached_page('about')
 def about_company(request):
-    logger.debug(f"Accessing about_company, user: {request.user.username if request.user.is_authenticated else 'Anonymous'}")
-    return render(request, 'parking/about_company.html', {
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
-    })
+    logger.debug("Accessing about_company, user: %s", user_label(request.user))
+    return render(request, 'parking/about_company.html')
 
 # Страница новостей
-def news(request):
-    logger.debug(f"Accessing news, user: {request.user.username if request.user.is_authenticated else 'Anonymous'}")
-    articles = Article.objects.all().order_by('-created_at')
-    return render(request, 'parking/news.html', {
-        'articles': articles,
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
+@cached_page('news', Article, 'created_at')
+async def news(request):
+    logger.debug("Accessing news, user: %s", user_label(await aload_user(request)))
+    try:
+        page = await akeyset_paginate(Article.objects.all(), 'created_at', request.GET.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Некорректный курсор')
+    return await arender(request, 'parking/news.html', {
+        'articles': page.items,
+        'page': page,
     })
 
 # Страница словаря терминов
+@cached_page('terms', Term, 'added_date')
 def terms_dictionary(request):
-    logger.debug(f"Accessing terms_dictionary, user: {request.user.username if user.is_authenticated else 'Anonymous'}")
-    terms = Term.objects.all().order_by('-added_date')
+    logger.debug("Accessing terms_dictionary, user: %s", user_label(request.user))
+    try:
+        page = keyset_paginate(Term.objects.all(), 'added_date', request.GET.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Некорректный курсор')
     return render(request, 'parking/terms_dictionary.html', {
-        'terms': terms,
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
+        'terms': page.items,
+        'page': page,
     })
 
 # Страница контактов
-def contacts(request):
-    logger.debug(f"Accessing contacts, user: {request.user.username if request.user.is_authenticated else 'Anonymous'}")
-    employees = EmployeeContact.objects.all()
-    return render(request, 'parking/contacts.html', {
+@cached_page('contacts')
+async def contacts(request):
+    logger.debug("Accessing contacts, user: %s", user_label(await aload_user(request)))
+    employees = await alist(EmployeeContact.objects.all())
+    return await arender(request, 'parking/contacts.html', {
         'employees': employees,
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
     })
 
 # Страница политики конфиденциальности
+@cached_page('privacy')
 def privacy_policy(request):
-    logger.debug(f"Accessing privacy_policy, user: {request.user.username if request.user.is_authenticated else 'Anonymous'}")
-    return render(request, 'parking/privacy_policy.html', {
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
-    })
+    logger.debug("Accessing privacy_policy, user: %s", user_label(request.user))
+    return render(request, 'parking/privacy_policy.html')
 
 # Страница вакансий
-def vacancies(request):
-    logger.debug(f"Accessing vacancies, user: {request.user.username if request.user.is_authenticated else 'Anonymous'}")
-    jobs = JobVacancy.objects.all().order_by('-posted_date')
-    return render(request, 'parking/vacancies.html', {
-        'jobs': jobs,
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
+@cached_page('vacancies', JobVacancy, 'posted_date')
+async def vacancies(request):
+    logger.debug("Accessing vacancies, user: %s", user_label(await aload_user(request)))
+    try:
+        page = await akeyset_paginate(JobVacancy.objects.all(), 'posted_date', request.GET.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Некорректный курсор')
+    return await arender(request, 'parking/vacancies.html', {
+        'jobs': page.items,
+        'page': page,
     })
 
+def visible_reviews(user):
+    # Админ видит все отзывы, клиент — только свои
+    reviews = Review.objects.select_related('user')
+    return reviews if is_admin(user) else reviews.filter(user=user)
+
 # Страница отзывов (доступна клиентам и админам)
 @login_required
 @user_passes_test(is_client_or_admin)
 def reviews(request):
     if not is_client_or_admin(request.user):
-        logger.warning(f"User {request.user.username} failed client_or_admin check in reviews")
+        logger.warning("User %s failed client_or_admin check in reviews", request.user.username)
         return redirect('home')
 
-    logger.debug(f"Accessing reviews, user: {request.user.username}, is_superuser: {request.user.is_superuser}")
-    if is_admin(request.user):
-        reviews = Review.objects.all().order_by('-created_at')
-    else:
-        reviews = Review.objects.filter(user=request.user).order_by('-created_at')
+    logger.debug("Accessing reviews, user: %s, is_superuser: %s", request.user.username, request.user.is_superuser)
+    try:
+        page = keyset_paginate(visible_reviews(request.user), 'created_at', request.GET.get('cursor'))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Некорректный курсор')
 
     if request.method == 'POST':
         if is_client(request.user):
@@ -292,10 +316,8 @@ def reviews(request):
         else:
             return render(request, 'parking/error.html', {'message': 'Только клиенты могут добавлять отзывы'})
     return render(request, 'parking/reviews.html', {
-        'reviews': reviews,
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
+        'reviews': page.items,
+        'page': page,
     })
 
 # Обновление профиля клиента
@@ -316,19 +338,12 @@ class ClientUpdateView(UpdateView):
         response = super().form_valid(form)
         return redirect('client_dashboard')
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['is_admin'] = is_admin(self.request.user)
-        context['is_client'] = is_client(self.request.user)
-        context['is_employee'] = is_employee(self.request.user)
-        return context
-
 # Оплата счета клиентом
 @login_required
 @user_passes_test(is_client)
 def pay_invoice(request, invoice_id):
     if not is_client(request.user):
-        logger.warning(f"User {request.user.username} failed client check in pay_invoice")
+        logger.warning("User %s failed client check in pay_invoice", request.user.username)
         return redirect('home')
 
     invoice = get_object_or_404(Invoice, id=invoice_id)
@@ -342,154 +357,17 @@ def pay_invoice(request, invoice_id):
         return redirect('client_dashboard')
     return render(request, 'parking/pay_invoice_confirm.html', {
         'invoice': invoice,
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
     })
 
-# Функция для получения данных для графиков
-def get_chart_data(step='month'):
-    logger.debug(f"Generating chart data with step: {step}")
-    try:
-        now = timezone.now().date()
-        steps = {
-            'day': ('%Y-%m-%d', timedelta(days=1), 6),
-            'month': ('%Y-%m', timedelta(days=31), 6)
-        }
-        if step not in steps:
-            step = 'month'
-        label_format, delta, range_days = steps[step]
-        start_date = now - timedelta(days=range_days)
-        date_field = TruncDate('issue_date')
-
-        # Инициализация данных
-        profit_labels = []
-        profit_values = []
-        new_clients_labels = []
-        new_clients_values = []
-        all_clients_labels = []
-        all_clients_values = []
-        unpaid_invoices_labels = []
-        unpaid_invoices_values = []
-        debt_labels = []
-        debt_values = []
-
-        # Генерация меток
-        current_date = start_date
-        while current_date <= now:
-            label = current_date.strftime(label_format)
-            profit_labels.append(label)
-            new_clients_labels.append(label)
-            all_clients_labels.append(label)
-            unpaid_invoices_labels.append(label)
-            debt_labels.append(label)
-            current_date += delta
-            if step == 'month':
-                current_date = current_date.replace(day=1)
-
-        # Проверка данных перед запросами
-        logger.debug(f"Date range: {start_date} to {now}")
-        logger.debug(f"Total clients: {Client.objects.count()}")
-        logger.debug(f"Total invoices: {Invoice.objects.count()}")
-
-        # Заполнение пустых значений
-        if not profit_labels:
-            profit_labels = [now.strftime(label_format) for _ in range(range_days + 1)]
-        profit_values = [0] * len(profit_labels)
-        new_clients_labels = profit_labels
-        new_clients_values = [0] * len(new_clients_labels)
-        all_clients_labels = profit_labels
-        all_clients_values = [Client.objects.count()] * len(all_clients_labels)  # Все клиенты
-        unpaid_invoices_labels = profit_labels
-        unpaid_invoices_values = [0] * len(unpaid_invoices_labels)
-        debt_labels = profit_labels
-        debt_values = [0] * len(debt_labels)
-
-        # Прибыль
-        profit_data = Invoice.objects.filter(
-            payment_date__isnull=False,
-            issue_date__gte=start_date,
-            issue_date__lte=now
-        ).annotate(date=date_field).values('date').annotate(total_profit=Sum('spot_price')).order_by('date')
-        logger.debug(f"Profit data: {list(profit_data)}")
-        if profit_data.exists():
-            for i, label in enumerate(profit_labels):
-                value = next((item['total_profit'] for item in profit_data if item['date'].strftime(label_format) == label), 0)
-                profit_values[i] = value or 0
-        else:
-            logger.warning("No profit data found in the date range")
-
-        # Новые клиенты
-        new_clients_data = Client.objects.filter(
-            user__date_joined__gte=start_date,
-            user__date_joined__lte=now
-        ).annotate(date=TruncDate('user__date_joined')).values('date').annotate(count=Count('id')).order_by('date')
-        logger.debug(f"New clients data: {list(new_clients_data)}")
-        if new_clients_data.exists():
-            for i, label in enumerate(new_clients_labels):
-                value = next((item['count'] for item in new_clients_data if item['date'].strftime(label_format) == label), 0)
-                new_clients_values[i] = value or 0
-        else:
-            logger.warning("No new clients data found in the date range")
-
-        # Неоплаченные счета
-        unpaid_invoices_data = Invoice.objects.filter(
-            payment_date__isnull=True,
-            issue_date__gte=start_date,
-            issue_date__lte=now
-        ).annotate(date=date_field).values('date').annotate(count=Count('id')).order_by('date')
-        logger.debug(f"Unpaid invoices data: {list(unpaid_invoices_data)}")
-        if unpaid_invoices_data.exists():
-            for i, label in enumerate(unpaid_invoices_labels):
-                value = next((item['count'] for item in unpaid_invoices_data if item['date'].strftime(label_format) == label), 0)
-                unpaid_invoices_values[i] = value or 0
-        else:
-            logger.warning("No unpaid invoices data found in the date range")
-
-        # Долги
-        debt_data = Invoice.objects.filter(
-            debt__gt=0,
-            issue_date__gte=start_date,
-            issue_date__lte=now
-        ).annotate(date=date_field).values('date').annotate(total_debt=Sum('debt')).order_by('date')
-        logger.debug(f"Debt data: {list(debt_data)}")
-        if debt_data.exists():
-            for i, label in enumerate(debt_labels):
-                value = next((item['total_debt'] for item in debt_data if item['date'].strftime(label_format) == label), 0)
-                debt_values[i] = value or 0
-        else:
-            logger.warning("No debt data found in the date range")
-
-        return {
-            'profit': {'labels': profit_labels, 'values': profit_values},
-            'new_clients': {'labels': new_clients_labels, 'values': new_clients_values},
-            'all_clients': {'labels': all_clients_labels, 'values': all_clients_values},
-            'unpaid_invoices': {'labels': unpaid_invoices_labels, 'values': unpaid_invoices_values},
-            'debt': {'labels': debt_labels, 'values': debt_values},
-        }
-
-    except Exception as e:
-        logger.error(f"Error in get_chart_data for step {step}: {str(e)}", exc_info=True)
-        # Возвращаем пустые данные в случае ошибки
-        empty_labels = [now.strftime(label_format) for _ in range(range_days + 1)]
-        empty_values = [0] * len(empty_labels)
-        return {
-            'profit': {'labels': empty_labels, 'values': empty_values},
-            'new_clients': {'labels': empty_labels, 'values': empty_values},
-            'all_clients': {'labels': empty_labels, 'values': empty_values},
-            'unpaid_invoices': {'labels': empty_labels, 'values': empty_values},
-            'debt': {'labels': empty_labels, 'values': empty_values},
-        }
-
 # Страница сотрудника (доступна только сотрудникам)
 @login_required
 @user_passes_test(is_employee)
 def employee_dashboard(request):
     if not is_employee(request.user):
-        logger.warning(f"User {request.user.username} failed employee check in employee_dashboard")
+        logger.warning("User %s failed employee check in employee_dashboard", request.user.username)
         return redirect('home')
 
-    logger.debug(f"Accessing employee_dashboard, user: {request.user.username}, is_superuser: {request.user.is_superuser}")
+    logger.debug("Accessing employee_dashboard, user: %s, is_superuser: %s", request.user.username, request.user.is_superuser)
     try:
         employee = Employee.objects.get(user=request.user)
     except Employee.DoesNotExist:
@@ -498,16 +376,16 @@ def employee_dashboard(request):
             name=request.user.username,
             email=request.user.email or f"{request.user.username}@example.com"
         )
-    clients = Client.objects.all()
-    invoices = Invoice.objects.all()
-    occupied_spots = ParkingSpot.objects.filter(is_occupied=True).select_related('car').prefetch_related('car__clients')
-    clients_with_debt = Client.objects.filter(cars__invoice__debt__gt=0).annotate(total_debt=Sum('cars__invoice__debt')).distinct()
+    clients = dashboards.head(dashboards.client_list())
+    invoices = dashboards.head(dashboards.invoice_list())
+    occupied_spots = dashboards.head(dashboards.occupied_spots())
+    clients_with_debt = dashboards.head(dashboards.clients_with_debt())
 
     step = request.GET.get('step', 'month')
-    if step not in ['day', 'month']:
+    if step not in CHART_STEPS:
         step = 'month'
 
-    chart_data = get_chart_data(step)
+    chart_data = build_chart_data(step)
 
     return render(request, 'parking/employee_dashboard.html', {
         'employee': employee,
@@ -517,9 +395,6 @@ def employee_dashboard(request):
         'clients_with_debt': clients_with_debt,
         'chart_data': chart_data,
         'step': step,
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
     })
 
 # Страница админа (доступна только админу)
@@ -527,21 +402,21 @@ def employee_dashboard(request):
 @user_passes_test(is_admin)
 def admin_dashboard(request):
     if not is_admin(request.user):
-        logger.warning(f"User {request.user.username} failed admin check in admin_dashboard")
+        logger.warning("User %s failed admin check in admin_dashboard", request.user.username)
         return redirect('home')
 
-    logger.debug(f"Accessing admin_dashboard, user: {request.user.username}, is_superuser: {request.user.is_superuser}")
-    clients = Client.objects.all()
-    cars = Car.objects.all()
-    parking_spots = ParkingSpot.objects.all()
-    occupied_spots = ParkingSpot.objects.filter(is_occupied=True).select_related('car').prefetch_related('car__clients')
-    clients_with_debt = Client.objects.filter(cars__invoice__debt__gt=0).annotate(total_debt=Sum('cars__invoice__debt')).distinct()
+    logger.debug("Accessing admin_dashboard, user: %s, is_superuser: %s", request.user.username, request.user.is_superuser)
+    clients = dashboards.head(dashboards.client_list())
+    cars = dashboards.head(dashboards.cars_with_owners())
+    parking_spots = dashboards.head(dashboards.spots_with_cars())
+    occupied_spots = dashboards.head(dashboards.occupied_spots())
+    clients_with_debt = dashboards.head(dashboards.clients_with_debt())
 
     step = request.GET.get('step', 'month')
-    if step not in ['day', 'month']:
+    if step not in CHART_STEPS:
         step = 'month'
 
-    chart_data = get_chart_data(step)
+    chart_data = build_chart_data(step)
 
     return render(request, 'parking/admin_dashboard.html', {
         'clients': clients,
@@ -551,9 +426,6 @@ def admin_dashboard(request):
         'clients_with_debt': clients_with_debt,
         'chart_data': chart_data,
         'step': step,
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
     })
 
 # CRUD для Client
@@ -564,20 +436,13 @@ class ClientListView(ListView):
 
     def get_queryset(self):
         user = self.request.user
-        logger.debug(f"ClientListView for user {user.username}, is_superuser: {user.is_superuser}")
+        logger.debug("ClientListView for user %s, is_superuser: %s", user.username, user.is_superuser)
         if is_admin(user):
             return Client.objects.all()
         elif is_client(user):
             return Client.objects.filter(user=user)
         return Client.objects.none()
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['is_admin'] = is_admin(self.request.user)
-        context['is_client'] = is_client(self.request.user)
-        context['is_employee'] = is_employee(self.request.user)
-        return context
-
 class ClientCreateView(CreateView):
     model = Client
     fields = ['user', 'name', 'email', 'age', 'timezone']
@@ -586,17 +451,10 @@ class ClientCreateView(CreateView):
 
     def dispatch(self, request, *args, **kwargs):
         if not is_admin(request.user):
-            logger.warning(f"User {request.user.username} failed admin check in ClientCreateView")
+            logger.warning("User %s failed admin check in ClientCreateView", request.user.username)
             return redirect('home')
         return super().dispatch(request, *args, **kwargs)
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['is_admin'] = is_admin(self.request.user)
-        context['is_client'] = is_client(self.request.user)
-        context['is_employee'] = is_employee(self.request.user)
-        return context
-
 class ClientDeleteView(DeleteView):
     model = Client
     template_name = 'parking/client_confirm_delete.html'
@@ -604,17 +462,10 @@ class ClientDeleteView(DeleteView):
 
     def dispatch(self, request, *args, **kwargs):
         if not is_admin(request.user):
-            logger.warning(f"User {request.user.username} failed admin check in ClientDeleteView")
+            logger.warning("User %s failed admin check in ClientDeleteView", request.user.username)
             return redirect('home')
         return super().dispatch(request, *args, **kwargs)
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['is_admin'] = is_admin(self.request.user)
-        context['is_client'] = is_client(self.request.user)
-        context['is_employee'] = is_employee(self.request.user)
-        return context
-
 # CRUD для Car (админ и клиент)
 class CarCreateView(CreateView):
     model = Car
@@ -626,7 +477,7 @@ class CarCreateView(CreateView):
         if not request.user.is_authenticated:
             return redirect('login')
         if not (is_admin(request.user) or is_client(request.user)):
-            logger.warning(f"User {request.user.username} failed admin/client check in CarCreateView")
+            logger.warning("User %s failed admin/client check in CarCreateView", request.user.username)
             return redirect('home')
         return super().dispatch(request, *args, **kwargs)
 
@@ -652,22 +503,15 @@ class CarCreateView(CreateView):
                 current_client = Client.objects.get(user=self.request.user)
                 if current_client not in selected_clients:
                     selected_clients = list(selected_clients) + [current_client]
-                logger.debug(f"Creating car with clients: {[client.name for client in selected_clients]}")
+                logger.debug("Creating car with clients: %s", lazy(client_names, selected_clients))
             car.clients.set(selected_clients)
-            logger.debug(f"Car {car.id} saved with clients: {[client.name for client in car.clients.all()]}")
+            logger.debug("Car %s saved with clients: %s", car.id, lazy(client_names, selected_clients))
             return super().form_valid(form)
         except Exception as e:
-            logger.error(f"Error creating car: {str(e)}")
+            logger.error("Error creating car: %s", e)
             form.add_error(None, f"Ошибка при создании автомобиля: {str(e)}")
             return self.form_invalid(form)
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['is_admin'] = is_admin(self.request.user)
-        context['is_client'] = is_client(self.request.user)
-        context['is_employee'] = is_employee(self.request.user)
-        return context
-
 class CarListView(ListView):
     model = Car
     template_name = 'parking/car_list.html'
@@ -682,13 +526,6 @@ class CarListView(ListView):
             return Car.objects.filter(clients=client)
         return Car.objects.none()
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['is_admin'] = is_admin(self.request.user)
-        context['is_client'] = is_client(self.request.user)
-        context['is_employee'] = is_employee(self.request.user)
-        return context
-
 class CarUpdateView(UpdateView):
     model = Car
     fields = ['license_plate', 'brand', 'model', 'clients']
@@ -699,7 +536,7 @@ class CarUpdateView(UpdateView):
         if not request.user.is_authenticated:
             return redirect('login')
         if not (is_admin(request.user) or is_client(request.user)):
-            logger.warning(f"User {request.user.username} failed admin/client check in CarUpdateView")
+            logger.warning("User %s failed admin/client check in CarUpdateView", request.user.username)
             return redirect('home')
         return super().dispatch(request, *args, **kwargs)
 
@@ -731,23 +568,16 @@ class CarUpdateView(UpdateView):
                 current_client = Client.objects.get(user=self.request.user)
                 if current_client not in selected_clients:
                     selected_clients = list(selected_clients) + [current_client]
-                logger.debug(f"Updating car with clients: {[client.name for client in selected_clients]}")
+                logger.debug("Updating car with clients: %s", lazy(client_names, selected_clients))
             car.clients.set(selected_clients)
             car.save()
-            logger.debug(f"Car {car.id} updated with clients: {[client.name for client in car.clients.all()]}")
+            logger.debug("Car %s updated with clients: %s", car.id, lazy(client_names, selected_clients))
             return super().form_valid(form)
         except Exception as e:
-            logger.error(f"Error updating car: {str(e)}")
+            logger.error("Error updating car: %s", e)
             form.add_error(None, f"Ошибка при обновлении автомобиля: {str(e)}")
             return self.form_invalid(form)
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['is_admin'] = is_admin(self.request.user)
-        context['is_client'] = is_client(self.request.user)
-        context['is_employee'] = is_employee(self.request.user)
-        return context
-
 class CarDeleteView(DeleteView):
     model = Car
     template_name = 'parking/car_confirm_delete.html'
@@ -757,7 +587,7 @@ class CarDeleteView(DeleteView):
         if not request.user.is_authenticated:
             return redirect('login')
         if not (is_admin(request.user) or is_client(request.user)):
-            logger.warning(f"User {request.user.username} failed admin/client check in CarDeleteView")
+            logger.warning("User %s failed admin/client check in CarDeleteView", request.user.username)
             return redirect('home')
         return super().dispatch(request, *args, **kwargs)
 
@@ -768,13 +598,6 @@ class CarDeleteView(DeleteView):
             return obj
         raise Http404("У вас нет доступа к удалению этого автомобиля")
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['is_admin'] = is_admin(self.request.user)
-        context['is_client'] = is_client(self.request.user)
-        context['is_employee'] = is_employee(self.request.user)
-        return context
-
     def delete(self, request, *args, **kwargs):
         obj = self.get_object()
         ParkingSpot.objects.filter(car=obj, is_occupied=True).update(car=None, is_occupied=False)
@@ -791,7 +614,7 @@ class ParkingSpotCreateView(CreateView):
         if not request.user.is_authenticated:
             return redirect('login')
         if not is_admin(request.user):
-            logger.warning(f"User {request.user.username} failed admin check in ParkingSpotCreateView")
+            logger.warning("User %s failed admin check in ParkingSpotCreateView", request.user.username)
             return redirect('home')
         return super().dispatch(request, *args, **kwargs)
 
@@ -804,13 +627,6 @@ class ParkingSpotCreateView(CreateView):
             form.add_error(None, f"Ошибка при создании парковочного места: {str(e)}")
             return self.form_invalid(form)
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['is_admin'] = is_admin(self.request.user)
-        context['is_client'] = is_client(self.request.user)
-        context['is_employee'] = is_employee(self.request.user)
-        return context
-
 class ParkingSpotListView(ListView):
     model = ParkingSpot
     template_name = 'parking/parkingspot_list.html'
@@ -820,17 +636,10 @@ class ParkingSpotListView(ListView):
         if not request.user.is_authenticated:
             return redirect('login')
         if not is_admin(request.user):
-            logger.warning(f"User {request.user.username} failed admin check in ParkingSpotListView")
+            logger.warning("User %s failed admin check in ParkingSpotListView", request.user.username)
             return redirect('home')
         return super().dispatch(request, *args, **kwargs)
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['is_admin'] = is_admin(self.request.user)
-        context['is_client'] = is_client(self.request.user)
-        context['is_employee'] = is_employee(self.request.user)
-        return context
-
 class ParkingSpotUpdateView(UpdateView):
     model = ParkingSpot
     fields = ['number', 'price', 'is_occupied']
@@ -841,7 +650,7 @@ class ParkingSpotUpdateView(UpdateView):
         if not request.user.is_authenticated:
             return redirect('login')
         if not is_admin(request.user):
-            logger.warning(f"User {request.user.username} failed admin check in ParkingSpotUpdateView")
+            logger.warning("User %s failed admin check in ParkingSpotUpdateView", request.user.username)
             return redirect('home')
         return super().dispatch(request, *args, **kwargs)
 
@@ -856,13 +665,6 @@ class ParkingSpotUpdateView(UpdateView):
             form.add_error(None, f"Ошибка при обновлении парковочного места: {str(e)}")
             return self.form_invalid(form)
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['is_admin'] = is_admin(self.request.user)
-        context['is_client'] = is_client(self.request.user)
-        context['is_employee'] = is_employee(self.request.user)
-        return context
-
 class ParkingSpotDeleteView(DeleteView):
     model = ParkingSpot
     template_name = 'parking/parkingspot_confirm_delete.html'
@@ -872,17 +674,10 @@ class ParkingSpotDeleteView(DeleteView):
         if not request.user.is_authenticated:
             return redirect('login')
         if not is_admin(request.user):
-            logger.warning(f"User {request.user.username} failed admin check in ParkingSpotDeleteView")
+            logger.warning("User %s failed admin check in ParkingSpotDeleteView", request.user.username)
             return redirect('home')
         return super().dispatch(request, *args, **kwargs)
 
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['is_admin'] = is_admin(self.request.user)
-        context['is_client'] = is_client(self.request.user)
-        context['is_employee'] = is_employee(self.request.user)
-        return context
-
     def delete(self, request, *args, **kwargs):
         obj = self.get_object()
         Invoice.objects.filter(parking_spot=obj).delete()
@@ -893,7 +688,7 @@ class ParkingSpotDeleteView(DeleteView):
 @user_passes_test(is_client)
 def occupy_spot(request, spot_id):
     if not is_client(request.user):
-        logger.warning(f"User {request.user.username} failed client check in occupy_parking_spot")
+        logger.warning("User %s failed client check in occupy_parking_spot", request.user.username)
         return redirect('home')
 
     spot = get_object_or_404(ParkingSpot, id=spot_id)
@@ -901,43 +696,19 @@ def occupy_spot(request, spot_id):
     if spot.is_occupied:
         return render(request, 'parking/error.html', {
             'message': 'Место уже занято',
-            'is_admin': is_admin(request.user),
-            'is_client': is_client(request.user),
-            'is_employee': is_employee(request.user),
         })
     if request.method == 'POST':
         car_id = request.POST.get('car')
-        car = Car.objects.get(id=car_id)
-        if client in car.clients.all():
-            if ParkingSpot.objects.filter(car=car, is_occupied=True).exists():
-                return render(request, 'parking/error.html', {
-                    'message': 'Этот автомобиль уже занимает парковочное место',
-                    'is_admin': is_admin(request.user),
-                    'is_client': is_client(request.user),
-                    'is_employee': is_employee(request.user),
-                })
-            ParkingSpot.objects.filter(car=car, is_occupied=True).update(car=None, is_occupied=False)
-            spot.is_occupied = True
-            spot.car = car
-            spot.save()
-            from django.utils.crypto import get_random_string
-            invoice_code = get_random_string(length=8)
-            Invoice.objects.create(
-                code=invoice_code,
-                car=car,
-                parking_spot=spot,
-                spot_price=spot.price,
-                issue_date=timezone.now().date(),
-                payment_date=None,
-                debt=0
-            )
-            return redirect('client_dashboard')
+        if not str(car_id).isdigit():
+            return render(request, 'parking/error.html', {'message': 'Выберите автомобиль'})
+        try:
+            occupation.occupy(spot.id, int(car_id), client=client)
+        except occupation.OccupationError as e:
+            return render(request, 'parking/error.html', {'message': e.message})
+        return redirect('client_dashboard')
     return render(request, 'parking/occupy_spot.html', {
         'spot': spot,
         'cars': client.cars.all(),
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
     })
 
 # Освобождение парковочного места клиентом
@@ -945,7 +716,7 @@ def occupy_spot(request, spot_id):
 @user_passes_test(is_client)
 def free_parking_spot(request, spot_id):
     if not is_client(request.user):
-        logger.warning(f"User {request.user.username} failed client check in free_parking_spot")
+        logger.warning("User %s failed client check in free_parking_spot", request.user.username)
         return redirect('home')
 
     spot = get_object_or_404(ParkingSpot, id=spot_id)
@@ -953,9 +724,6 @@ def free_parking_spot(request, spot_id):
     if not spot.is_occupied or spot.car not in client.cars.all():
         return render(request, 'parking/error.html', {
             'message': 'Это место не занято вашим автомобилем',
-            'is_admin': is_admin(request.user),
-            'is_client': is_client(request.user),
-            'is_employee': is_employee(request.user),
         })
     if request.method == 'POST':
         spot.is_occupied = False
@@ -963,10 +731,9 @@ def free_parking_spot(request, spot_id):
         spot.save()
         invoice = Invoice.objects.filter(parking_spot=spot, payment_date__isnull=True).first()
         if invoice:
-            issue_datetime = timezone.make_aware(datetime.combine(invoice.issue_date, time.min), timezone.get_current_timezone())
-            now = timezone.now()
-            days_passed = (now - issue_datetime).days
-            if days_passed > 30:
+            # Долги по просроченным счетам выставляет mark_overdue_invoices,
+            # здесь — только если место освобождают раньше его запуска
+            if overdue.is_overdue(invoice):
                 invoice.debt = invoice.spot_price
                 invoice.save()
             else:
@@ -975,9 +742,79 @@ def free_parking_spot(request, spot_id):
     return render(request, 'parking/free_spot_confirm.html', {
         'spot': spot,
         'car': spot.car,
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
+    })
+
+# Пакетное занятие и освобождение мест для клиентов с автопарком.
+# Тело запроса — JSON: {"items": [{"car": 1, "spot": 2}, ...], "mode": "atomic"}
+# или {"spots": [2, 3], "mode": "partial"}; mode по умолчанию atomic
+def batch_payload(request, key):
+    try:
+        payload = json.loads(request.body)
+        mode = payload.get('mode', 'atomic')
+        items = payload[key]
+        if mode not in ('atomic', 'partial') or not isinstance(items, list) or not 0 < len(items) <= occupation.BATCH_LIMIT:
+            raise ValueError
+        return items, mode == 'atomic'
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return None, None
+
+def batch_response(results):
+    ok = all(result.ok for result in results)
+    return JsonResponse({
+        'ok': ok,
+        'results': [asdict(result) for result in results],
+    }, status=200 if ok or any(result.ok for result in results) else 409)
+
+def batch_client(request):
+    # Админ действует от имени любых владельцев
+    if is_admin(request.user):
+        return None
+    return Client.objects.get(user=request.user)
+
+@login_required
+@user_passes_test(is_client_or_admin)
+@require_POST
+def occupy_spots_api(request):
+    items, atomic = batch_payload(request, 'items')
+    try:
+        pairs = [(int(item['car']), int(item['spot'])) for item in items]
+    except (KeyError, TypeError, ValueError):
+        return JsonResponse({'error': f'Ожидается {{"items": [{{"car": id, "spot": id}}, ...]}}, не больше {occupation.BATCH_LIMIT}'}, status=400)
+    return batch_response(occupation.occupy_many(pairs, client=batch_client(request), atomic=atomic))
+
+@login_required
+@user_passes_test(is_client_or_admin)
+@require_POST
+def release_spots_api(request):
+    items, atomic = batch_payload(request, 'spots')
+    try:
+        spot_ids = [int(spot_id) for spot_id in items]
+    except (TypeError, ValueError):
+        return JsonResponse({'error': f'Ожидается {{"spots": [id, ...]}}, не больше {occupation.BATCH_LIMIT}'}, status=400)
+    return batch_response(occupation.release_many(spot_ids, client=batch_client(request), atomic=atomic))
+
+# Свободные места из индекса доступности: ?order=price|number, ?limit=,
+# ?from= и ?to= (диапазон номеров), ?max_price=
+def free_spots_api(request):
+    try:
+        limit = page_size(request.GET.get('limit'))
+        low = int(request.GET.get('from', 0))
+        high = int(request.GET['to']) if request.GET.get('to') else None
+        max_price = Decimal(request.GET['max_price']) if request.GET.get('max_price') else None
+        if low < 0:
+            raise ValueError
+    except (ValueError, InvalidOperation):
+        return JsonResponse({'error': 'Некорректные параметры from/to/max_price'}, status=400)
+
+    index = availability.index
+    if request.GET.get('order', 'price') == 'number':
+        spots = [spot for spot in index.free_in_range(low, high, limit) if max_price is None or spot.price <= max_price]
+    else:
+        spots = [spot for spot in index.cheapest_free(limit if low == 0 and high is None else None, max_price)
+                 if low <= spot.number and (high is None or spot.number <= high)][:limit]
+    return JsonResponse({
+        'free': index.count_free(),
+        'spots': [{'id': spot.id, 'number': spot.number, 'price': spot.price} for spot in spots],
     })
 
 # Изменение цены парковочного места (админ)
@@ -985,7 +822,7 @@ def free_parking_spot(request, spot_id):
 @user_passes_test(is_admin)
 def update_spot_price(request, spot_id):
     if not is_admin(request.user):
-        logger.warning(f"User {request.user.username} failed admin check in update_spot_price")
+        logger.warning("User %s failed admin check in update_spot_price", request.user.username)
         return redirect('home')
 
     spot = get_object_or_404(ParkingSpot, id=spot_id)
@@ -996,64 +833,111 @@ def update_spot_price(request, spot_id):
         return redirect('admin_dashboard')
     return render(request, 'parking/update_spot_price.html', {
         'spot': spot,
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
     })
 
 # Клиент с наибольшим долгом (админ)
 @login_required
 @user_passes_test(is_admin)
+@reporting()
 def biggest_debtor(request):
     if not is_admin(request.user):
-        logger.warning(f"User {request.user.username} failed admin check in biggest_debtor")
+        logger.warning("User %s failed admin check in biggest_debtor", request.user.username)
         return redirect('home')
 
-    clients = Client.objects.all()
-    debtor = None
-    max_debt = float('-inf')
-    last_payment = None
-
-    for client in clients:
-        invoices = Invoice.objects.filter(car__in=client.cars.all())
-        total_debt = sum(invoice.debt for invoice in invoices)
-        if total_debt > max_debt:
-            max_debt = total_debt
-            debtor = client
-            last_payment = invoices.filter(payment_date__isnull=False).order_by('-payment_date').first()
+    debtor = get_biggest_debtor()
 
     return render(request, 'parking/biggest_debtor.html', {
         'debtor': debtor,
-        'max_debt': max_debt,
-        'last_payment': last_payment.payment_date if last_payment else None,
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
+        'max_debt': debtor.total_debt if debtor else 0,
+        'last_payment': debtor.last_payment if debtor else None,
+    })
+
+# Рейтинг должников в JSON (админ)
+@login_required
+@user_passes_test(is_admin)
+def debtors_api(request):
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), 100)
+        threshold = request.GET.get('threshold')
+        threshold = Decimal(threshold) if threshold else None
+    except (ValueError, InvalidOperation):
+        return JsonResponse({'error': 'Некорректные параметры limit/threshold'}, status=400)
+
+    debtors = top_debtors(limit=limit, threshold=threshold)
+    return JsonResponse({
+        'debtors': [
+            {
+                'rank': debtor.debt_rank,
+                'client_id': debtor.id,
+                'name': debtor.name,
+                'total_debt': debtor.total_debt,
+                'last_payment': debtor.last_payment,
+            }
+            for debtor in debtors
+        ],
+    })
+
+# Поток занятости мест для панелей (Server-Sent Events, см. parking/events.py).
+# Соединение долгое, поэтому поток отдаётся только под ASGI, где ожидание
+# событий не занимает поток; под WSGI — 204, после которого EventSource
+# не переподключается (шаблоны под WSGI скрипт и не подключают)
+@login_required
+@user_passes_test(has_dashboard)
+async def spot_events(request):
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    last_event_id = events.parse_last_event_id(request.headers.get('Last-Event-ID'))
+    response = StreamingHttpResponse(events.stream(last_event_id), content_type='text/event-stream; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# Сводка и графики панелей администратора и сотрудника в JSON (?step=)
+@login_required
+@user_passes_test(is_admin_or_employee)
+async def dashboard_api(request):
+    step = request.GET.get('step', 'month')
+    if step not in CHART_STEPS:
+        step = 'month'
+    chart_data, clients, occupied, debt, free = await asyncio.gather(
+        abuild_chart_data(step),
+        Client.objects.acount(),
+        ParkingSpot.objects.filter(is_occupied=True).acount(),
+        Invoice.objects.aaggregate(total=Sum('debt')),
+        sync_to_async(availability.index.count_free)(),
+    )
+    return JsonResponse({
+        'step': step,
+        'charts': chart_data,
+        'summary': {
+            'clients': clients,
+            'occupied_spots': occupied,
+            'free_spots': free,
+            'total_debt': debt['total'] or 0,
+        },
     })
 
 # Автомобили с несколькими владельцами (админ)
 @login_required
 @user_passes_test(is_admin)
+@reporting()
 def cars_with_multiple_owners(request):
     if not is_admin(request.user):
-        logger.warning(f"User {request.user.username} failed admin check in cars_with_multiple_owners")
+        logger.warning("User %s failed admin check in cars_with_multiple_owners", request.user.username)
         return redirect('home')
 
-    cars = Car.objects.annotate(num_owners=Count('clients')).filter(num_owners__gt=1)
-    car_owners = [(car, car.clients.all()) for car in cars]
+    car_owners = [(car, car.owners) for car in ownership.multi_owner_cars()]
     return render(request, 'parking/cars_with_multiple_owners.html', {
         'car_owners': car_owners,
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
     })
 
 # Автомобиль с наименьшим долгом за период (админ)
 @login_required
 @user_passes_test(is_admin)
+@reporting()
 def car_with_min_debt(request):
     if not is_admin(request.user):
-        logger.warning(f"User {request.user.username} failed admin check in car_with_min_debt")
+        logger.warning("User %s failed admin check in car_with_min_debt", request.user.username)
         return redirect('home')
 
     if request.method == 'POST':
@@ -1062,38 +946,23 @@ def car_with_min_debt(request):
         start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
         end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
 
-        cars = Car.objects.all()
-        min_debt = float('inf')
-        min_debt_car = None
-
-        for car in cars:
-            invoices = Invoice.objects.filter(car=car, issue_date__range=[start_date, end_date])
-            total_debt = sum(invoice.debt for invoice in invoices)
-            if total_debt < min_debt:
-                min_debt = total_debt
-                min_debt_car = car
+        min_debt_car = period_debt_report(start_date, end_date).min_car()
 
         return render(request, 'parking/car_with_min_debt.html', {
             'car': min_debt_car,
-            'min_debt': min_debt,
+            'min_debt': min_debt_car.total if min_debt_car else None,
             'start_date': start_date,
             'end_date': end_date,
-            'is_admin': is_admin(request.user),
-            'is_client': is_client(request.user),
-            'is_employee': is_employee(request.user),
         })
-    return render(request, 'parking/car_with_min_debt_form.html', {
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
-    })
+    return render(request, 'parking/car_with_min_debt_form.html')
 
 # Сумма долгов за период (админ)
 @login_required
 @user_passes_test(is_admin)
+@reporting()
 def total_debt(request):
     if not is_admin(request.user):
-        logger.warning(f"User {request.user.username} failed admin check in total_debt")
+        logger.warning("User %s failed admin check in total_debt", request.user.username)
         return redirect('home')
 
     if request.method == 'POST':
@@ -1102,44 +971,120 @@ def total_debt(request):
         start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
         end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
 
-        invoices = Invoice.objects.filter(issue_date__range=[start_date, end_date])
-        total_debt = sum(invoice.debt for invoice in invoices)
+        total_debt = period_total_debt(start_date, end_date)
 
         return render(request, 'parking/total_debt.html', {
             'total_debt': total_debt,
             'start_date': start_date,
             'end_date': end_date,
-            'is_admin': is_admin(request.user),
-            'is_client': is_client(request.user),
-            'is_employee': is_employee(request.user),
         })
-    return render(request, 'parking/total_debt_form.html', {
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
-    })
+    return render(request, 'parking/total_debt_form.html')
 
 # Автомобили по марке (админ)
 @login_required
 @user_passes_test(is_admin)
+@reporting()
 def cars_by_brand(request):
     if not is_admin(request.user):
-        logger.warning(f"User {request.user.username} failed admin check in cars_by_brand")
+        logger.warning("User %s failed admin check in cars_by_brand", request.user.username)
         return redirect('home')
 
     if request.method == 'POST':
         brand = request.POST.get('brand')
-        cars = Car.objects.filter(brand__iexact=brand)
-        car_owners = [(car, car.clients.all()) for car in cars]
+        car_owners = [(car, car.owners) for car in ownership.cars_of_brand(brand or '')]
         return render(request, 'parking/cars_by_brand.html', {
             'brand': brand,
             'car_owners': car_owners,
-            'is_admin': is_admin(request.user),
-            'is_client': is_client(request.user),
-            'is_employee': is_employee(request.user),
         })
-    return render(request, 'parking/cars_by_brand_form.html', {
-        'is_admin': is_admin(request.user),
-        'is_client': is_client(request.user),
-        'is_employee': is_employee(request.user),
-    })
\ No newline at end of file
+    return render(request, 'parking/cars_by_brand_form.html')
+
+# Поиск марок по началу названия в JSON (?q= и ?limit=, админ)
+@login_required
+@user_passes_test(is_admin)
+@reporting()
+def brands_api(request):
+    brands = ownership.find_brands(request.GET.get('q', ''), limit=page_size(request.GET.get('limit')))
+    return JsonResponse({
+        'brands': [
+            {'brand': brand['brand'], 'key': brand['brand_key'], 'cars': brand['cars']}
+            for brand in brands
+        ],
+    })
+
+# Постраничные списки в JSON (?cursor= и ?limit=)
+def keyset_json(request, queryset, date_field, serialize):
+    try:
+        page = keyset_paginate(queryset, date_field, request.GET.get('cursor'), page_size(request.GET.get('limit')))
+    except InvalidCursor:
+        return JsonResponse({'error': 'Некорректный курсор'}, status=400)
+    return JsonResponse({
+        'results': [serialize(item) for item in page.items],
+        'next_cursor': page.next_cursor,
+    })
+
+def news_api(request):
+    return keyset_json(request, Article.objects.all(), 'created_at', lambda article: {
+        'id': article.id,
+        'title': article.title,
+        'summary': article.summary,
+        'image_url': article.image_url,
+        'created_at': article.created_at,
+    })
+
+def terms_api(request):
+    return keyset_json(request, Term.objects.all(), 'added_date', lambda term: {
+        'id': term.id,
+        'term': term.term,
+        'definition': term.definition,
+        'added_date': term.added_date,
+    })
+
+def vacancies_api(request):
+    return keyset_json(request, JobVacancy.objects.all(), 'posted_date', lambda job: {
+        'id': job.id,
+        'title': job.title,
+        'description': job.description,
+        'posted_date': job.posted_date,
+    })
+
+@login_required
+@user_passes_test(is_client_or_admin)
+def reviews_api(request):
+    return keyset_json(request, visible_reviews(request.user), 'created_at', lambda review: {
+        'id': review.id,
+        'user': review.user.username,
+        'rating': review.rating,
+        'text': review.text,
+        'created_at': review.created_at,
+    })
+
+# Потоковая выгрузка счетов, клиентов и доходов для бухгалтерии
+# (?format=csv|jsonl&start=ГГГГ-ММ-ДД&end=ГГГГ-ММ-ДД&status=)
+@login_required
+@user_passes_test(is_admin)
+def export_api(request, name):
+    fmt = request.GET.get('format', 'csv')
+    try:
+        rows = export.rows(
+            name,
+            start=export.parse_day(request.GET.get('start')),
+            end=export.parse_day(request.GET.get('end')),
+            status=request.GET.get('status'),
+        )
+        content = export.stream(name, rows, fmt, finished=lambda report: logger.info(
+            "Export finished", export=name, format=fmt, rows=report.rows, bytes=report.bytes,
+            seconds=round(report.seconds, 3), rows_per_second=round(report.rows_per_second),
+        ))
+    except export.ExportError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if isinstance(request, ASGIRequest):
+        content = export.aiterate(content)
+    response = StreamingHttpResponse(content, content_type=export.FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{name}.{fmt}"'
+    return response
+
+# Метрики запросов в формате Prometheus (только с локальных адресов)
+def metrics(request):
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1', '::1']):
+        raise Http404
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')